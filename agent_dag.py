@@ -0,0 +1,205 @@
+import os
+import json
+import hashlib
+import asyncio
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import settings  # noqa: F401  (reads .env once per process)
+from llm_cache import make_key
+from similarity_index import SIMILAR
+import analyst_agent
+import vc_agent
+import critic_agent
+
+# Results kept in memory per DAG (least recently used dropped first; override in .env)
+MEMO_MAX_ENTRIES = int(os.getenv("AGENT_DAG_MEMO_ENTRIES", "512"))
+
+# A node's coroutine gets its projected schema, the results of the nodes it depends on,
+# and the bypass_cache flag.
+NodeFn = Callable[[Dict[str, Any], Dict[str, Any], bool], Awaitable[Dict[str, Any]]]
+
+
+@dataclass(frozen=True)
+class AgentNode:
+    """
+    One agent in the validation DAG. `fields` are the only IdeaSchema fields it is shown,
+    so its result can be reused until one of them (or an upstream result) changes.
+    `signature` identifies the prompt/model, so editing the agent invalidates old results.
+    """
+    name: str
+    run: NodeFn
+    fields: Tuple[str, ...]
+    depends_on: Tuple[str, ...] = ()
+    signature: str = ""
+
+    def inputs(self, schema: Dict[str, Any]) -> Dict[str, Any]:
+        return {f: schema.get(f) for f in self.fields}
+
+
+class AgentDAG:
+    """
+    Runs agents in dependency order (independent ones concurrently) and memoizes each
+    result by a fingerprint of the node's own fields, its signature and its upstream
+    fingerprints. Failed results are never memoized. With a similarity index, a node
+    without dependencies whose fields closely match a past run reuses that result too.
+    """
+
+    def __init__(self, nodes: List[AgentNode], max_entries: int = MEMO_MAX_ENTRIES, index=None):
+        self.nodes: Dict[str, AgentNode] = {n.name: n for n in nodes}
+        self.index = index
+        for n in nodes:
+            unknown = [d for d in n.depends_on if d not in self.nodes]
+            if unknown:
+                raise ValueError(f"{n.name} depends on unknown node(s): {', '.join(unknown)}")
+        self.order = self._toposort()
+        self._memo: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def _toposort(self) -> List[str]:
+        order, state = [], {}
+
+        def visit(name: str):
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                raise ValueError(f"Cycle in agent DAG at {name}")
+            state[name] = "visiting"
+            for dep in self.nodes[name].depends_on:
+                visit(dep)
+            state[name] = "done"
+            order.append(name)
+
+        for name in self.nodes:
+            visit(name)
+        return order
+
+    def with_dependencies(self, names) -> List[str]:
+        """The requested nodes plus everything upstream of them, in run order."""
+        wanted = set()
+
+        def add(name: str):
+            if name not in wanted:
+                wanted.add(name)
+                for dep in self.nodes[name].depends_on:
+                    add(dep)
+
+        for name in names:
+            if name in self.nodes:
+                add(name)
+        return [n for n in self.order if n in wanted]
+
+    def fingerprints(self, schema: Dict[str, Any]) -> Dict[str, str]:
+        fps: Dict[str, str] = {}
+        for name in self.order:
+            node = self.nodes[name]
+            payload = {"node": name, "signature": node.signature, "inputs": node.inputs(schema),
+                       "upstream": [fps[d] for d in node.depends_on]}
+            fps[name] = hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+        return fps
+
+    def stale(self, schema: Dict[str, Any], names=None) -> List[str]:
+        """Nodes (of `names`, default all) that would have to run for this schema."""
+        fps = self.fingerprints(schema)
+        with self._lock:
+            missing = [n for n in self.with_dependencies(names or self.order) if fps[n] not in self._memo]
+        return [n for n in missing if not self._near(n, schema, record=False)]
+
+    def _near(self, name: str, schema: Dict[str, Any], record: bool = True) -> Optional[Dict[str, Any]]:
+        """A close enough past result from the similarity index (dependency-free nodes only)."""
+        node = self.nodes[name]
+        if self.index is None or node.depends_on:
+            return None
+        if record:
+            return self.index.reuse(node, schema)
+        match = self.index.lookup(node, schema)
+        return None if match is None else match.result
+
+    async def run_async(self, schema: Dict[str, Any], names=None, bypass_cache: bool = False,
+                        wrap: Optional[Callable[[str, Awaitable], Awaitable]] = None) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Return ({name: result}, [names that actually ran]). Only nodes whose fingerprint
+        changed are run; bypass_cache=True re-runs every requested node.
+        wrap(name, coro) can add a timeout / error handling around each node.
+        """
+        names = self.with_dependencies(names or self.order)
+        fps = self.fingerprints(schema)
+        results: Dict[str, Any] = {}
+        ran: List[str] = []
+        pending = list(names)
+        while pending:
+            # Everything whose dependencies are resolved runs in this wave
+            wave = [n for n in pending if all(d in results for d in self.nodes[n].depends_on)]
+            pending = [n for n in pending if n not in wave]
+
+            todo = []
+            for name in wave:
+                with self._lock:
+                    hit = None if bypass_cache else self._memo.get(fps[name])
+                    if hit is not None:
+                        self._memo.move_to_end(fps[name])
+                near = None if hit is not None or bypass_cache else self._near(name, schema)
+                if hit is not None:
+                    results[name] = hit
+                elif near is not None:
+                    results[name] = near
+                    with self._lock:
+                        self._memo[fps[name]] = near
+                else:
+                    todo.append(name)
+
+            outputs = await asyncio.gather(*[self._run_node(n, schema, results, bypass_cache, wrap) for n in todo])
+            for name, output in zip(todo, outputs):
+                results[name] = output
+                ran.append(name)
+                if isinstance(output, dict) and "error" not in output:
+                    with self._lock:
+                        self._memo[fps[name]] = output
+                        while len(self._memo) > self.max_entries:
+                            self._memo.popitem(last=False)
+                    if self.index is not None and not self.nodes[name].depends_on:
+                        self.index.add(self.nodes[name], schema, output)
+        return results, ran
+
+    async def _run_node(self, name, schema, results, bypass_cache, wrap):
+        node = self.nodes[name]
+        upstream = {d: results[d] for d in node.depends_on}
+        coro = node.run(node.inputs(schema), upstream, bypass_cache)
+        return await (wrap(name, coro) if wrap else coro)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memo.clear()
+
+
+def _signature(request_kwargs: Callable[[Dict[str, Any]], Dict[str, Any]]) -> str:
+    """Prompt + model + parameters of an agent, taken from its request for an empty schema."""
+    return make_key(**request_kwargs({}))
+
+
+# Which schema fields each downstream agent reasons about
+VALIDATION_DAG = AgentDAG([
+    AgentNode(
+        "analyst",
+        lambda inputs, upstream, bypass: analyst_agent.run_analyst_agent_async(inputs, bypass_cache=bypass),
+        fields=("idea_title", "one_liner", "problem", "target_customer", "solution", "business_model",
+                "gtm", "competition"),
+        signature=_signature(analyst_agent._request_kwargs),
+    ),
+    AgentNode(
+        "vc",
+        lambda inputs, upstream, bypass: vc_agent.run_vc_agent_async(inputs, bypass_cache=bypass),
+        fields=("idea_title", "one_liner", "target_customer", "solution", "business_model", "pricing",
+                "gtm", "competition", "moat"),
+        signature=_signature(vc_agent._request_kwargs),
+    ),
+    AgentNode(
+        "critic",
+        lambda inputs, upstream, bypass: critic_agent.run_critic_agent_async(inputs, bypass_cache=bypass),
+        fields=("idea_title", "one_liner", "problem", "target_customer", "solution", "gtm", "key_risks"),
+        signature=_signature(critic_agent._request_kwargs),
+    ),
+], index=SIMILAR)
@@ -1,22 +1,14 @@
-import os
 import json
-from anthropic import Anthropic
-from dotenv import load_dotenv
-
-# Load environment
-load_dotenv()
-
-client = Anthropic(api_key=os.getenv("CLAUDE_API_KEY"))
+import settings  # noqa: F401  (reads .env once per process)
+from llm_cache import cached_call, cached_call_async
+from streaming import stream_claude
+from output_models import AnalystReport, coerce, validator
+from model_router import route, route_async
+from structured_output import StructuredOutputError
+from prompt_prefix import panel_request
 
 SYSTEM = """You are the Analyst Agent. 
-Your job is to evaluate startup/business ideas and provide market validation insights."""
-
-def run_analyst_agent(schema_json: dict) -> dict:
-    prompt = f"""
-You are given a startup idea schema. Analyze it and return structured insights.
-
-Idea Schema:
-{json.dumps(schema_json, indent=2)}
+Your job is to evaluate startup/business ideas and provide market validation insights.
 
 Tasks:
 1. Market overview (size, demand, recent trends)
@@ -35,16 +27,51 @@ Return ONLY valid JSON with fields:
 - improvements
 """
 
-    resp = client.messages.create(
-        model="claude-3-5-sonnet-20240620",
-        max_tokens=1500,
-        messages=[{"role": "user", "content": prompt}]
-    )
+def _request_kwargs(schema_json: dict) -> dict:
+    # Shares its cached prompt prefix (system prompts + common schema fields) with the VC and Critic agents
+    return panel_request("analyst", schema_json, model="claude-3-5-sonnet-20240620", max_tokens=1500)
+
+def _parse_response(text: str) -> dict:
+    # Fences, trailing prose and truncated JSON are repaired locally before giving up
+    data, e = coerce(text, AnalystReport)
+    if data is not None:
+        return data
+    return {"error": f"Failed to parse Claude output: {e}", "raw": text}
 
+def run_analyst_agent(schema_json: dict, bypass_cache: bool = False) -> dict:
+    kwargs = _request_kwargs(schema_json)
     try:
-        return json.loads(resp.content[0].text)
-    except Exception:
-        return {"error": "Failed to parse Claude output", "raw": resp.content[0].text}
+        text = cached_call(
+            {"provider": "anthropic", **kwargs},
+            lambda: route("analyst", "anthropic", kwargs, AnalystReport),
+            bypass=bypass_cache, validate=validator(AnalystReport), name="analyst",
+        )
+    except StructuredOutputError as e:
+        text = e.raw   # never validated: reported as an error, not cached
+    return _parse_response(text)
+
+async def run_analyst_agent_async(schema_json: dict, bypass_cache: bool = False) -> dict:
+    """Async variant used by the parallel orchestrator."""
+    kwargs = _request_kwargs(schema_json)
+
+    async def fetch():
+        # Hedged against / fails over to the agent's other candidate models (model_router)
+        return await route_async("analyst", "anthropic", kwargs, AnalystReport)
+
+    try:
+        text = await cached_call_async({"provider": "anthropic", **kwargs}, fetch, bypass=bypass_cache,
+                                      validate=validator(AnalystReport), name="analyst")
+    except StructuredOutputError as e:
+        text = e.raw
+    return _parse_response(text)
+
+def stream_analyst_agent(schema_json: dict, bypass_cache: bool = False):
+    """
+    Streaming variant: yields ("token", text) as Claude writes, ("field", (key, value))
+    as each top-level field completes, then ("done", <same dict as run_analyst_agent>).
+    """
+    yield from stream_claude(_request_kwargs(schema_json), _parse_response, bypass_cache, name="analyst",
+                             validate=validator(AnalystReport))
 
 
 if __name__ == "__main__":
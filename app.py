@@ -1,13 +1,12 @@
-import os
 import json
 import streamlit as st
+import settings  # noqa: F401  (reads .env once per process)
 from schema_types import IdeaSchema
-from extractors import extract_text_from_pdf, extract_text_from_docx, transcribe_audio, consolidate_inputs
-from llm_agent import propose_next_step
-from dotenv import load_dotenv
-
-# Load .env file automatically
-load_dotenv()
+from llm_agent import next_local_question
+from session_store import get_session_store
+from job_queue import get_job_queue, save_upload, JOB_POLL_SECONDS
+from instrumentation import breakdown
+from context_compactor import compact_context, estimate_tokens, CONTEXT_TOKEN_BUDGET
 
 st.set_page_config(page_title="Listener Agent (Intake)", page_icon="📝", layout="centered")
 
@@ -24,9 +23,95 @@ if "pending_question" not in st.session_state:
     st.session_state.pending_question = None
 if "pending_field" not in st.session_state:
     st.session_state.pending_field = None
+if "pending_questions" not in st.session_state:
+    st.session_state.pending_questions = []   # batched mode: every question at once, ranked
+if "skipped_fields" not in st.session_state:
+    st.session_state.skipped_fields = []
+if "intake_job" not in st.session_state:
+    st.session_state.intake_job = None
+
+# ---- Persistence ----
+# Every turn is queued to a background writer (write-behind), so saving never slows a rerun.
+# Both live for the whole server process (st.cache_resource), not for one rerun or session.
+sessions = st.cache_resource(get_session_store)()
+# Slow steps (extraction, transcription, every Listener call) run as durable background jobs
+jobs = st.cache_resource(get_job_queue)()
+
+
+def persist_step():
+    """Queue the current schema and the next question for the session."""
+    sid = st.session_state.session_id
+    if not sid:
+        return
+    status = "collecting" if st.session_state.pending_question or st.session_state.pending_questions else "complete"
+    sessions.update_schema(sid, st.session_state.schema.model_dump(), status)
+    if st.session_state.pending_question:
+        sessions.record_message(sid, "agent", st.session_state.pending_question,
+                                {"kind": "question", "missing_field": st.session_state.pending_field})
+
+
+def submit_followup(**payload):
+    """Queue a clarification round (its LLM call) and poll it like intake; the worker saves the result."""
+    sid = st.session_state.session_id
+    sessions.flush()   # the answers just recorded come before the worker's question
+    payload.update(session_id=sid, schema=st.session_state.schema.model_dump())
+    st.session_state.intake_job = jobs.submit("followup", payload, session_id=sid)
+    st.query_params["job"] = st.session_state.intake_job
+    st.rerun()
+
+
+def restore_session(saved: dict):
+    """Rebuild the intake state from a persisted session (the inverse of what this page records)."""
+    st.session_state.session_id = saved["session"]["id"]
+    st.session_state.schema = IdeaSchema(**saved["session"]["idea_schema"])
+    agg, history, skipped, question, field, questions = "", [], [], None, None, []
+    for m in saved["messages"]:
+        kind = m["payload"].get("kind")
+        if kind == "intake":
+            agg = m["content"]
+        elif kind == "answer":
+            agg += f"\n\n[ANSWER to {m['payload'].get('field') or 'unknown'}]\n{m['content']}"
+            history.append({"role": "user", "content": m["content"]})
+        elif kind == "skip":
+            agg += f"\n\n[ANSWER skipped for {m['payload'].get('field') or 'unknown'}]"
+            history.append({"role": "user", "content": m["content"]})
+            if m["payload"].get("field"):
+                skipped.append(m["payload"]["field"])
+        elif kind == "question":
+            question, field, questions = m["content"], m["payload"].get("missing_field"), []
+        elif kind == "questions":
+            question, field, questions = None, None, m["payload"].get("questions") or []
+    if saved["session"]["status"] == "complete":
+        question, field, questions = None, None, []
+    st.session_state.aggregated_text = agg
+    st.session_state.chat_history = history
+    st.session_state.skipped_fields = skipped
+    st.session_state.pending_question = question
+    st.session_state.pending_field = field
+    st.session_state.pending_questions = questions
+
+
+# Resume with ?session=<id> (the URL is updated as soon as a session starts)
+resume_id = st.query_params.get("session")
+if resume_id and st.session_state.session_id != resume_id:
+    saved = sessions.load_session(resume_id)
+    if saved:
+        restore_session(saved)
+    else:
+        st.query_params.clear()
+# An intake job still running when the page was reloaded
+if st.query_params.get("job") and not st.session_state.intake_job:
+    st.session_state.intake_job = st.query_params["job"]
 
 st.title("Listener Agent (Intake) 📝")
-st.caption("Capture typed, voice, or document input. Clarify missing details one question at a time.")
+st.caption("Capture typed, voice, or document input. Clarify missing details one question at a time, or all at once.")
+
+# Delta follow-ups send only the schema + the new answer, so each clarification costs a small,
+# constant number of tokens however large the uploaded document was.
+delta_followups = st.sidebar.checkbox("Delta follow-ups (schema + answer only)", value=True)
+# Batched clarifications: the Listener's first pass also returns every question, ranked, and all the
+# answers are merged in one more call, so intake takes two LLM calls instead of one per field.
+batch_questions = st.sidebar.checkbox("Ask all clarifying questions at once", value=True)
 
 
 # ---- Input widgets ----
@@ -40,41 +125,102 @@ with col2:
     audio_file = st.file_uploader("Upload voice note (webm/wav/m4a/mp3)", type=["webm", "wav", "m4a", "mp3"])
 
 if st.button("Process Inputs ▶️", type="primary"):
-    doc_text = ""
-    audio_text = ""
-
-    if doc_file is not None:
-        data = doc_file.read()
-        if doc_file.type == "application/pdf" or doc_file.name.lower().endswith(".pdf"):
-            doc_text = extract_text_from_pdf(data)
-        else:
-            doc_text = extract_text_from_docx(data)
-
-    if audio_file is not None:
-        audio_bytes = audio_file.read()
-        try:
-            audio_text = transcribe_audio(audio_bytes, filename=audio_file.name)
-        except Exception as e:
-            st.error(f"Transcription error: {e}")
-            audio_text = ""
-
-    agg = consolidate_inputs(typed, doc_text, audio_text)
-    st.session_state.aggregated_text = agg
+    # Extraction and the Listener's first pass run on the job queue: this rerun returns at once,
+    # and a reload (or a restart) picks the job back up from ?job=<id>
+    if not st.session_state.session_id:
+        st.session_state.session_id = sessions.create_session()
+        st.query_params["session"] = st.session_state.session_id
+    sessions.flush()   # the worker may be another process reading the database
+    payload = {
+        "session_id": st.session_state.session_id,
+        "typed": typed,
+        "doc": save_upload(doc_file, doc_file.name) if doc_file is not None else None,
+        "audio": save_upload(audio_file, audio_file.name) if audio_file is not None else None,
+        "schema": st.session_state.schema.model_dump(),
+        "chat_history": st.session_state.chat_history,
+        "batch_questions": batch_questions,
+    }
+    st.session_state.intake_job = jobs.submit("intake", payload, session_id=st.session_state.session_id)
+    st.query_params["job"] = st.session_state.intake_job
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def watch_intake_job():
+    """Poll the intake (or follow-up) job; when it finishes, load its result and rerun the whole page."""
+    job = jobs.get(st.session_state.intake_job)
+    if job is None:
+        st.session_state.intake_job = None
+        st.query_params.pop("job", None)
+        return
+    if job["status"] in ("queued", "running"):
+        step = (job["partial"] or {}).get("progress") or ("⏳ Waiting for a worker…" if job["status"] == "queued"
+                                                         else "⚙️ Processing inputs…")
+        st.info(step)
+        return
+    st.session_state.intake_job = None
+    st.query_params.pop("job", None)
+    if job["status"] == "error":
+        st.session_state.intake_notice = {"failed": f"Processing failed: {job['error']}"}
+    else:
+        # The worker already saved the schema and question to the session; mirror them here
+        result = job["result"]
+        st.session_state.schema = IdeaSchema(**result["schema"])
+        st.session_state.pending_question = result["pending_question"]
+        st.session_state.pending_field = result["pending_field"]
+        st.session_state.pending_questions = result.get("pending_questions") or []
+        st.session_state.last_run = breakdown(result["spans"])
+        if job["kind"] == "intake":
+            st.session_state.aggregated_text = result["aggregated_text"]
+            st.session_state.intake_notice = result
+        elif result.get("error"):
+            st.session_state.intake_notice = {"failed": result["error"]}
+    st.rerun()
 
-    # First LLM pass — try extracting fields & asking the first follow-up
-    result = propose_next_step(agg, st.session_state.schema, st.session_state.chat_history)
-    st.session_state.schema = IdeaSchema(**result.get("current_schema", {}))
-    st.session_state.pending_question = result.get("question")
-    st.session_state.pending_field = result.get("missing_field")
 
+if st.session_state.intake_job:
+    watch_intake_job()
+
+# Outcome of the intake job that just finished (shown once)
+notice = st.session_state.pop("intake_notice", None)
+if notice and "failed" in notice:
+    st.error(notice["failed"])
+elif notice:
+    for note in notice["notes"]:
+        st.caption(note)
+    for error in notice["errors"]:
+        st.error(error)
+    agg = st.session_state.aggregated_text
+    if estimate_tokens(agg) > CONTEXT_TOKEN_BUDGET:
+        st.caption(f"✂️ Input is ~{estimate_tokens(agg):,} tokens; sending the most relevant "
+                   f"~{estimate_tokens(compact_context(agg)):,} to the Listener (typed text kept in full).")
     # Show progress
     missing = st.session_state.schema.missing_required_fields()
     st.success(f"Processed. Missing required fields: {', '.join(missing) if missing else 'None'}")
 
 # ---- Follow-up loop ----
-if st.session_state.aggregated_text:
+# (hidden while a job runs, so an answer can't be sent twice)
+if st.session_state.aggregated_text and not st.session_state.intake_job:
     st.subheader("2) Clarifications")
-    if st.session_state.pending_question:
+    if st.session_state.pending_questions:
+        # All questions together, most important first; blank answers count as skips
+        with st.form("clarifications"):
+            answers = {q["field"]: st.text_input(q["question"], key=f"batch_{q['field']}")
+                       for q in st.session_state.pending_questions}
+            submitted_answers = st.form_submit_button("Submit Answers ➤")
+        if submitted_answers:
+            sid = st.session_state.session_id
+            for field, ans in answers.items():
+                if ans.strip():
+                    st.session_state.chat_history.append({"role": "user", "content": ans.strip()})
+                    st.session_state.aggregated_text += f"\n\n[ANSWER to {field}]\n{ans.strip()}"
+                    sessions.record_message(sid, "user", ans.strip(), {"kind": "answer", "field": field})
+                else:
+                    st.session_state.aggregated_text += f"\n\n[ANSWER skipped for {field}]"
+                    st.session_state.skipped_fields.append(field)
+                    sessions.record_message(sid, "user", "(skip) I don't know yet.", {"kind": "skip", "field": field})
+            # One consolidation call for the whole round
+            submit_followup(mode="consolidate", answers=answers)
+    elif st.session_state.pending_question:
         st.info(st.session_state.pending_question)
         ans = st.text_input("Your answer", key="answer_box")
 
@@ -85,14 +231,16 @@ if st.session_state.aggregated_text:
                     # Append to history & aggregated_text
                     st.session_state.chat_history.append({"role": "user", "content": ans.strip()})
                     st.session_state.aggregated_text += f"\n\n[ANSWER to {st.session_state.pending_field or 'unknown'}]\n{ans.strip()}"
+                    sessions.record_message(st.session_state.session_id, "user", ans.strip(),
+                                            {"kind": "answer", "field": st.session_state.pending_field})
 
                     # Re-run agent
-                    result = propose_next_step(st.session_state.aggregated_text, st.session_state.schema, st.session_state.chat_history)
-                    st.session_state.schema = IdeaSchema(**result.get("current_schema", {}))
-                    st.session_state.pending_question = result.get("question")
-                    st.session_state.pending_field = result.get("missing_field")
-
-                    st.rerun()
+                    if delta_followups:
+                        submit_followup(mode="delta", field=st.session_state.pending_field, answer=ans.strip(),
+                                        skipped=st.session_state.skipped_fields)
+                    else:
+                        submit_followup(mode="full", aggregated_text=st.session_state.aggregated_text,
+                                        chat_history=st.session_state.chat_history)
                 else:
                     st.warning("Please enter an answer.")
         with colB:
@@ -100,11 +248,19 @@ if st.session_state.aggregated_text:
                 # Put a placeholder so agent tries next field
                 st.session_state.chat_history.append({"role": "user", "content": "(skip) I don't know yet."})
                 st.session_state.aggregated_text += f"\n\n[ANSWER skipped for {st.session_state.pending_field or 'unknown'}]"
-                result = propose_next_step(st.session_state.aggregated_text, st.session_state.schema, st.session_state.chat_history)
-                st.session_state.schema = IdeaSchema(**result.get("current_schema", {}))
-                st.session_state.pending_question = result.get("question")
-                st.session_state.pending_field = result.get("missing_field")
-                st.rerun()
+                sessions.record_message(st.session_state.session_id, "user", "(skip) I don't know yet.",
+                                        {"kind": "skip", "field": st.session_state.pending_field})
+                if delta_followups:
+                    # Nothing new to merge, so pick the next field locally without an LLM call
+                    if st.session_state.pending_field:
+                        st.session_state.skipped_fields.append(st.session_state.pending_field)
+                    result = next_local_question(st.session_state.schema, st.session_state.skipped_fields)
+                    st.session_state.pending_question = result.get("question")
+                    st.session_state.pending_field = result.get("missing_field")
+                    persist_step()
+                    st.rerun()
+                submit_followup(mode="full", aggregated_text=st.session_state.aggregated_text,
+                                chat_history=st.session_state.chat_history)
     else:
         st.success("No more questions. Required fields appear complete.")
 
@@ -127,10 +283,16 @@ if st.session_state.aggregated_text:
 
     st.download_button("Download JSON", data=schema_json, file_name="idea_schema.json", mime="application/json")
 
+# Time, tokens and cost of the last step (extraction + LLM calls); history in .data/metrics.jsonl
+if st.session_state.get("last_run"):
+    with st.expander("⏱️ Last step: time, tokens and cost"):
+        st.dataframe(st.session_state.last_run, use_container_width=True)
+
 st.divider()
 if st.button("🔄 Reset Session"):
-    for k in ["session_id", "aggregated_text", "schema", "chat_history", "pending_question", "pending_field"]:
+    for k in ["session_id", "aggregated_text", "schema", "chat_history", "pending_question", "pending_field", "pending_questions", "skipped_fields", "last_run", "intake_job"]:
         st.session_state.pop(k, None)
+    st.query_params.clear()
     st.rerun()
 
 st.caption("Tip: For live mic capture in Streamlit, integrate `streamlit-webrtc`. For now, upload your audio file.")
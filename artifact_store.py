@@ -0,0 +1,145 @@
+import os
+import json
+import uuid
+import shutil
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Optional
+
+import settings  # noqa: F401  (reads .env once per process)
+from extractors import spooled_upload, Source
+
+# Local stand-in for the Supabase tables in supabase_schema.sql
+INTAKE_DB_PATH = os.getenv("INTAKE_DB_PATH", os.path.join(".data", "intake.sqlite3"))
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", os.path.join(".data", "artifacts"))
+
+ARTIFACT_TYPES = ("audio", "pdf", "docx", "image", "other")
+
+# Same columns as intake_artifacts, plus the content hash used for de-duplication
+ARTIFACTS_DDL = """
+create table if not exists intake_artifacts (
+  id text primary key,
+  session_id text,
+  type text check (type in ('audio','pdf','docx','image','other')),
+  storage_path text,
+  text_extracted text,
+  meta text default '{}',
+  created_at text default (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
+  sha256 text unique
+)
+"""
+
+
+def sha256_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def artifact_type(filename: str) -> str:
+    ext = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    if ext in ("pdf", "docx"):
+        return ext
+    if ext in ("webm", "wav", "m4a", "mp3", "ogg", "mp4"):
+        return "audio"
+    if ext in ("png", "jpg", "jpeg", "gif", "webp"):
+        return "image"
+    return "other"
+
+
+class ArtifactStore:
+    """
+    Content-addressed store for uploads: each distinct file (by SHA-256 of its bytes) is
+    copied once under ARTIFACT_DIR and processed once; later uploads of the same bytes,
+    from any session, get the stored text_extracted back immediately.
+    """
+
+    def __init__(self, db_path: str = INTAKE_DB_PATH, artifact_dir: str = ARTIFACT_DIR):
+        self.db_path = db_path
+        self.artifact_dir = artifact_dir
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        os.makedirs(artifact_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("pragma journal_mode=wal")
+        self._conn.execute(ARTIFACTS_DDL)
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, threading.Lock] = {}
+
+    def _row(self, sha: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            cur = self._conn.execute(
+                "select id, session_id, type, storage_path, text_extracted, meta, created_at, sha256"
+                " from intake_artifacts where sha256 = ?", (sha,))
+            row = cur.fetchone()
+            if row is None:
+                return None
+            record = dict(zip([c[0] for c in cur.description], row))
+        record["meta"] = json.loads(record["meta"] or "{}")
+        return record
+
+    def get(self, sha: str) -> Optional[Dict[str, Any]]:
+        return self._row(sha)
+
+    def get_or_process(self, source: Source, filename: str, process: Callable[[str], str],
+                       kind: str = None, session_id: str = None, meta: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Return the intake_artifacts row for this upload, running process(storage_path) -> text
+        only the first time these exact bytes are seen. The row has "cached": True on a hash hit.
+        A failing process() stores nothing, so the next upload retries.
+        """
+        suffix = os.path.splitext(filename or "")[1]
+        with spooled_upload(source, suffix=suffix) as tmp_path:
+            sha = sha256_file(tmp_path)
+            hit = self._row(sha)
+            if hit is not None:
+                return {**hit, "cached": True}
+
+            # One processor per hash, even if several sessions upload the same file at once
+            with self._lock:
+                gate = self._inflight.setdefault(sha, threading.Lock())
+            try:
+                with gate:
+                    hit = self._row(sha)
+                    if hit is not None:
+                        return {**hit, "cached": True}
+
+                    storage_path = os.path.join(self.artifact_dir, sha[:2], sha + suffix)
+                    os.makedirs(os.path.dirname(storage_path), exist_ok=True)
+                    if not os.path.exists(storage_path):
+                        shutil.copyfile(tmp_path, storage_path + ".part")
+                        os.replace(storage_path + ".part", storage_path)
+
+                    text = process(storage_path)
+                    row_meta = {"filename": filename, "size_bytes": os.path.getsize(storage_path), **(meta or {})}
+                    with self._lock:
+                        self._conn.execute(
+                            "insert or ignore into intake_artifacts"
+                            " (id, session_id, type, storage_path, text_extracted, meta, sha256)"
+                            " values (?, ?, ?, ?, ?, ?, ?)",
+                            (str(uuid.uuid4()), session_id, kind or artifact_type(filename), storage_path,
+                             text, json.dumps(row_meta, ensure_ascii=False), sha),
+                        )
+            finally:
+                # Dropped even when process() raises (failed hashes would pile up); never a newer caller's gate
+                with self._lock:
+                    if self._inflight.get(sha) is gate:
+                        del self._inflight[sha]
+        return {**self._row(sha), "cached": False}
+
+
+_store: Optional[ArtifactStore] = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    """Process-wide store, opened on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ArtifactStore()
+    return _store
@@ -0,0 +1,173 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, Set, Tuple
+
+from orchestrator import run_orchestrator_async, PARALLEL_AGENTS
+from clients import aclose_clients
+
+
+def idea_id(record: Dict) -> str:
+    """Use the record's own id when present, otherwise a stable hash of the idea text."""
+    if record.get("id") is not None:
+        return str(record["id"])
+    return hashlib.sha256(idea_text(record).encode("utf-8")).hexdigest()[:16]
+
+
+def idea_text(record: Dict) -> str:
+    return (record.get("idea") or record.get("text") or record.get("raw_idea") or "").strip()
+
+
+def iter_ideas(path: str) -> Iterator[Tuple[int, Dict]]:
+    """Stream (line_no, record) from a JSONL file without loading it all into memory."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"⚠️  line {line_no}: invalid JSON ({e}), skipped", file=sys.stderr)
+                continue
+            if isinstance(record, str):
+                record = {"idea": record}
+            yield line_no, record
+
+
+def load_checkpoint(path: str, retry_failed: bool = False) -> Set[str]:
+    """IDs already processed by a previous run (failed ones too, unless retry_failed)."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a torn last line from a crash
+            if entry.get("ok") or not retry_failed:
+                done.add(entry["id"])
+            else:
+                done.discard(entry["id"])
+    return done
+
+
+def _run_ok(results: Dict) -> bool:
+    return "listener" in results and all(
+        isinstance(v, dict) and "error" not in v for v in results.values()
+    )
+
+
+async def run_batch(input_path: str, output_path: str, checkpoint_path: str, workers: int = 4,
+                    agents=tuple(PARALLEL_AGENTS), timeout: float = None, retry_failed: bool = False,
+                    progress_every: int = 10, bypass_cache: bool = False) -> Dict:
+    """
+    Validate every idea in input_path with a pool of `workers` concurrent pipelines.
+    Results are appended to output_path as they finish; finished IDs go to checkpoint_path,
+    so re-running the same command resumes where a crashed run stopped.
+    """
+    done = load_checkpoint(checkpoint_path, retry_failed=retry_failed)
+    timeouts = {name: timeout for name in ("listener", *agents)} if timeout else None
+
+    # The Listener runs in a thread; size the default executor to match the worker pool
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=max(workers, 4)))
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+    stats = {"processed": 0, "ok": 0, "failed": 0, "skipped": 0}
+    started = time.perf_counter()
+
+    out_f = open(output_path, "a", encoding="utf-8")
+    ckpt_f = open(checkpoint_path, "a", encoding="utf-8")
+
+    def report_progress(final: bool = False):
+        elapsed = time.perf_counter() - started
+        rate = stats["processed"] / elapsed * 60 if elapsed > 0 else 0.0
+        prefix = "✅ Done" if final else "…"
+        print(f"{prefix} processed={stats['processed']} ok={stats['ok']} failed={stats['failed']} "
+              f"skipped={stats['skipped']} elapsed={elapsed:.1f}s throughput={rate:.1f} ideas/min",
+              file=sys.stderr)
+
+    async def producer():
+        for line_no, record in iter_ideas(input_path):
+            rid = idea_id(record)
+            if rid in done or not idea_text(record):
+                stats["skipped"] += 1
+                continue
+            done.add(rid)  # guards against duplicate IDs within the same file
+            await queue.put((rid, record))
+        for _ in range(workers):
+            await queue.put(None)
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            rid, record = item
+            t0 = time.perf_counter()
+            try:
+                results = await run_orchestrator_async(idea_text(record), agents=agents, timeouts=timeouts,
+                                                       bypass_cache=bypass_cache)
+            except Exception as e:
+                results = {"error": f"pipeline failed: {e}"}
+            ok = _run_ok(results)
+
+            # Output first, checkpoint second: a crash in between re-runs the idea rather than losing it
+            out_f.write(json.dumps({"id": rid, "idea": idea_text(record), "ok": ok,
+                                    "elapsed_s": round(time.perf_counter() - t0, 3),
+                                    "results": results}, ensure_ascii=False) + "\n")
+            out_f.flush()
+            ckpt_f.write(json.dumps({"id": rid, "ok": ok}) + "\n")
+            ckpt_f.flush()
+
+            stats["processed"] += 1
+            stats["ok" if ok else "failed"] += 1
+            if progress_every and stats["processed"] % progress_every == 0:
+                report_progress()
+
+    try:
+        await asyncio.gather(producer(), *[worker() for _ in range(workers)])
+    finally:
+        out_f.close()
+        ckpt_f.close()
+        await aclose_clients()
+
+    report_progress(final=True)
+    elapsed = time.perf_counter() - started
+    stats["elapsed_s"] = round(elapsed, 3)
+    stats["ideas_per_min"] = round(stats["processed"] / elapsed * 60, 2) if elapsed > 0 else 0.0
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Validate ideas from a JSONL file ({\"id\": ..., \"idea\": ...} per line).")
+    parser.add_argument("input", help="Input JSONL of ideas")
+    parser.add_argument("-o", "--output", default="validations.jsonl", help="Output JSONL (appended)")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <output>.checkpoint)")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="Concurrent pipelines")
+    parser.add_argument("--agents", default=",".join(PARALLEL_AGENTS),
+                        help="Downstream agents to run after the Listener (comma-separated)")
+    parser.add_argument("--timeout", type=float, help="Per-agent timeout in seconds")
+    parser.add_argument("--retry-failed", action="store_true", help="Re-run ideas that failed last time")
+    parser.add_argument("--progress-every", type=int, default=10, help="Print progress every N ideas")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the LLM response cache")
+    args = parser.parse_args()
+
+    agents = tuple(a.strip() for a in args.agents.split(",") if a.strip())
+    unknown = [a for a in agents if a not in PARALLEL_AGENTS]
+    if unknown:
+        parser.error(f"unknown agents: {', '.join(unknown)} (choose from {', '.join(PARALLEL_AGENTS)})")
+
+    summary = asyncio.run(run_batch(
+        args.input, args.output, args.checkpoint or f"{args.output}.checkpoint",
+        workers=args.workers, agents=agents, timeout=args.timeout, retry_failed=args.retry_failed,
+        progress_every=args.progress_every, bypass_cache=args.no_cache,
+    ))
+    print(json.dumps(summary, indent=2))
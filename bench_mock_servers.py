@@ -0,0 +1,449 @@
+import sys
+import json
+import hashlib
+import time
+import random
+import threading
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+# Canned agent outputs, chosen by the system prompt / prompt text of each request
+LISTENER_REPLY = {
+    "idea_title": "Greetings Generator",
+    "one_liner": "Personalised greetings in seconds.",
+    "problem": "Ready-made greetings feel generic.",
+    "target_customer": "Individuals and small businesses",
+    "solution": "AI-written greetings tuned to the recipient",
+    "business_model": "Freemium with subscription (please confirm)",
+    "pricing": "$5/month premium (please confirm)",
+    "gtm": "Social media and event partnerships",
+    "competition": "Canva, greeting card apps",
+    "moat": "Personalisation data",
+    "key_risks": "Retention",
+}
+FOLLOWUP_REPLY = {"field": "pricing", "value": "$4/month", "question": None, "missing_field": None}
+ANALYST_REPLY = {
+    "market": "Growing demand for personalised content.",
+    "competition": "Template tools dominate; few do personalisation well.",
+    "business_model": "Freemium is realistic with a low-cost premium tier.",
+    "opportunities": ["Seasonal campaigns", "SMB bulk greetings"],
+    "risks": ["Low switching cost", "Seasonality"],
+    "improvements": ["Add scheduling", "Partner with e-card platforms"],
+}
+VC_REPLY = {
+    "scalability": "Global, multi-language.",
+    "revenue_potential": "Niche; low millions ARR at best.",
+    "unit_economics": "Cheap inference, modest ARPU.",
+    "risks": ["Commoditisation", "Retention", "Paid acquisition cost"],
+    "fundability_score": 2,
+    "rationale": "Nice product, hard to build a moat.",
+}
+CRITIC_REPLY = {
+    "regulatory": "Content moderation for generated text.",
+    "technical": "Low risk.",
+    "gtm": "Crowded channel, hard differentiation.",
+    "operational": "Seasonal load spikes.",
+    "data_privacy": "Recipient names and relationships are PII.",
+    "severity_ranking": ["gtm", "operational", "data_privacy", "regulatory", "technical"],
+    "mitigation": {"items": [{"issue": "gtm", "actions": ["Niche down to SMBs"]}]},
+}
+TRANSCRIPT = "I want to build a greetings generator so anyone can send customised greetings."
+
+
+def classify(body: Dict[str, Any]) -> str:
+    """Which pipeline stage sent this request (used for canned replies and per-stage stats)."""
+    messages = json.dumps(body.get("messages", []))
+    text = json.dumps(body.get("system", "")) + messages
+    if "updating ONE field" in text:
+        return "followup"
+    if "Idea Validation & Enrichment Agent" in text:
+        return "listener"
+    # Panel agents share one system prompt naming all three roles; the user message says which one
+    for stage, role in (("analyst", "Analyst Agent"), ("vc", "VC Agent"), ("critic", "Critic Agent")):
+        if f"acting as the {role}" in messages:
+            return stage
+    if "VC Agent" in text:
+        return "vc"
+    if "Critic Agent" in text:
+        return "critic"
+    if "Analyst Agent" in text or "Analyze it and return structured insights" in text:
+        return "analyst"
+    return "unknown"
+
+
+REPLIES = {
+    "listener": LISTENER_REPLY,
+    "followup": FOLLOWUP_REPLY,
+    "analyst": ANALYST_REPLY,
+    "vc": VC_REPLY,
+    "critic": CRITIC_REPLY,
+    "unknown": {},
+}
+
+
+@dataclass
+class MockConfig:
+    """
+    Behaviour of the stand-in servers. Latency is time to first byte; tokens_per_second
+    paces the body (about 4 characters per token), so long answers take longer, as upstream.
+    """
+    latency: float = 0.2
+    latency_jitter: float = 0.05
+    tokens_per_second: float = 400.0
+    error_rate: float = 0.0           # fraction of requests answered 500
+    rate_limit_rate: float = 0.0      # fraction of requests answered 429
+    retry_after: float = 0.5          # Retry-After seconds sent with each 429
+    malformed_rate: float = 0.0       # fraction of replies sent as fenced JSON with trailing prose
+    prefill_tokens_per_second: float = 0.0   # uncached prompt tokens add to time to first byte (0 = off)
+    cache_min_tokens: int = 1024      # shortest prefix Anthropic will cache (Sonnet)
+    cache_ttl: float = 300.0          # seconds a cached prefix lives after its last use
+    slow_provider: str = ""           # "openai" or "anthropic": that provider gets a latency tail
+    slow_rate: float = 0.0            # fraction of its requests that stall ...
+    slow_delay: float = 0.0           # ... for this many extra seconds before the first byte
+    seed: Optional[int] = None
+
+
+@dataclass
+class RequestRecord:
+    stage: str
+    status: int
+    bytes_in: int
+    bytes_out: int
+    seconds: float
+
+
+@dataclass
+class MockStats:
+    records: List[RequestRecord] = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def add(self, record: RequestRecord) -> None:
+        with self.lock:
+            self.records.append(record)
+
+    def drain(self) -> List[RequestRecord]:
+        with self.lock:
+            records, self.records = self.records, []
+        return records
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "MockLLMServer"
+
+    def log_message(self, format, *args):
+        pass   # keep benchmark output clean
+
+    # ---- plumbing ----
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status: int, payload: bytes, content_type: str = "application/json",
+              headers: Dict[str, str] = None) -> int:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(payload)
+        return len(payload)
+
+    def _stream(self, events: List[bytes]) -> int:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        sent = 0
+        for event in events:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(event), event))
+            sent += len(event)
+            self._pace(event)
+        self.wfile.write(b"0\r\n\r\n")
+        return sent
+
+    def _pace(self, text: bytes) -> None:
+        cfg = self.server.config
+        if cfg.tokens_per_second > 0:
+            time.sleep(len(text) / 4 / cfg.tokens_per_second)
+
+    def _injected_failure(self) -> Optional[int]:
+        """Send a 429/500 if this request was drawn to fail; returns the bytes sent."""
+        cfg, rng = self.server.config, self.server.rng
+        with self.server.rng_lock:
+            roll = rng.random()
+        if roll < cfg.rate_limit_rate:
+            body = json.dumps({"error": {"type": "rate_limit_error", "message": "Rate limited (mock)"}}).encode()
+            return self._send(429, body, headers={"Retry-After": f"{cfg.retry_after:g}"})
+        if roll < cfg.rate_limit_rate + cfg.error_rate:
+            body = json.dumps({"error": {"type": "api_error", "message": "Internal error (mock)"}}).encode()
+            return self._send(500, body)
+        return None
+
+    # ---- routes ----
+    def do_POST(self):
+        started = time.perf_counter()
+        raw = self._read_body()
+        path = self.path.split("?")[0].rstrip("/")
+        cfg = self.server.config
+        with self.server.rng_lock:
+            delay = max(0.0, cfg.latency + self.server.rng.uniform(-cfg.latency_jitter, cfg.latency_jitter))
+            provider = "anthropic" if path.endswith("/messages") else "openai"
+            if provider == cfg.slow_provider and self.server.rng.random() < cfg.slow_rate:
+                delay += cfg.slow_delay
+        time.sleep(delay)
+
+        stage, status = "unknown", 200
+        failed = self._injected_failure()
+        if failed is not None:
+            sent, status = failed, self._status_sent
+            if path.endswith("/chat/completions") or path.endswith("/messages"):
+                stage = classify(json.loads(raw or b"{}"))
+            elif path.endswith("/audio/transcriptions"):
+                stage = "transcribe"
+        elif path.endswith("/chat/completions"):
+            body = json.loads(raw or b"{}")
+            stage = classify(body)
+            sent = self._openai_chat(body, stage)
+        elif path.endswith("/messages"):
+            body = json.loads(raw or b"{}")
+            stage = classify(body)
+            sent = self._anthropic_messages(body, stage)
+        elif path.endswith("/audio/transcriptions"):
+            stage = "transcribe"
+            self._pace(TRANSCRIPT.encode())
+            sent = self._send(200, json.dumps({"text": TRANSCRIPT}).encode())
+        else:
+            status = 404
+            sent = self._send(404, b'{"error": {"message": "not found"}}')
+
+        self.server.stats.add(RequestRecord(stage, status, len(raw), sent, time.perf_counter() - started))
+
+    def send_response(self, code, message=None):
+        self._status_sent = code
+        super().send_response(code, message)
+
+    def _reply_text(self, stage: str) -> str:
+        text = json.dumps(REPLIES[stage], ensure_ascii=False)
+        with self.server.rng_lock:
+            malformed = self.server.rng.random() < self.server.config.malformed_rate
+        return f"```json\n{text}\n```\nLet me know if you need more detail." if malformed else text
+
+    def _openai_chat(self, body: Dict[str, Any], stage: str) -> int:
+        text = self._reply_text(stage)
+        tool = _forced_tool(body)
+        model = body.get("model", "gpt-4o-mini")
+        usage = {"prompt_tokens": len(json.dumps(body.get("messages", []))) // 4,
+                 "completion_tokens": len(text) // 4}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        if not body.get("stream"):
+            self._pace(text.encode())
+            if tool:
+                message = {"role": "assistant", "content": None, "tool_calls": [
+                    {"id": "call_mock", "type": "function", "function": {"name": tool, "arguments": text}}]}
+            else:
+                message = {"role": "assistant", "content": text}
+            return self._send(200, json.dumps({
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "finish_reason": "tool_calls" if tool else "stop", "message": message}],
+                "usage": usage,
+            }).encode())
+
+        def chunk(delta, finish=None):
+            return b"data: " + json.dumps({
+                "id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+            }).encode() + b"\n\n"
+
+        if tool:
+            events = [chunk({"role": "assistant", "content": None, "tool_calls": [
+                {"index": 0, "id": "call_mock", "type": "function", "function": {"name": tool, "arguments": ""}}]})]
+            events += [chunk({"tool_calls": [{"index": 0, "function": {"arguments": piece}}]}) for piece in _pieces(text)]
+        else:
+            events = [chunk({"role": "assistant", "content": ""})]
+            events += [chunk({"content": piece}) for piece in _pieces(text)]
+        events += [chunk({}, "tool_calls" if tool else "stop")]
+        if (body.get("stream_options") or {}).get("include_usage"):
+            events.append(b"data: " + json.dumps({
+                "id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": model, "choices": [], "usage": usage}).encode() + b"\n\n")
+        events.append(b"data: [DONE]\n\n")
+        return self._stream(events)
+
+    def _anthropic_messages(self, body: Dict[str, Any], stage: str) -> int:
+        tool = _forced_tool(body)
+        # A forced tool call always carries a JSON object, so only text replies can be malformed
+        text = json.dumps(REPLIES[stage], ensure_ascii=False) if tool else self._reply_text(stage)
+        model = body.get("model", "claude-3-5-sonnet-20240620")
+        try:
+            usage = {**self.server.prompt_cache_usage(body), "output_tokens": len(text) // 4}
+        except ValueError as e:
+            return self._send(400, json.dumps({"type": "error", "error": {
+                "type": "invalid_request_error", "message": str(e)}}).encode())
+        cfg = self.server.config
+        if cfg.prefill_tokens_per_second > 0:
+            time.sleep((usage["input_tokens"] + usage["cache_creation_input_tokens"]) / cfg.prefill_tokens_per_second)
+        if tool:
+            block = {"type": "tool_use", "id": "toolu_mock", "name": tool, "input": REPLIES[stage]}
+        else:
+            block = {"type": "text", "text": text}
+        message = {"id": "msg_mock", "type": "message", "role": "assistant", "model": model,
+                   "content": [block], "stop_reason": "tool_use" if tool else "end_turn",
+                   "stop_sequence": None, "usage": usage}
+        if not body.get("stream"):
+            self._pace(text.encode())
+            return self._send(200, json.dumps(message).encode())
+
+        def event(name, data):
+            return f"event: {name}\ndata: {json.dumps(data)}\n\n".encode()
+
+        start = {**message, "content": [], "stop_reason": None, "usage": {**usage, "output_tokens": 0}}
+        if tool:
+            opening = {"type": "tool_use", "id": "toolu_mock", "name": tool, "input": {}}
+            delta_type, delta_key = "input_json_delta", "partial_json"
+        else:
+            opening = {"type": "text", "text": ""}
+            delta_type, delta_key = "text_delta", "text"
+        events = [event("message_start", {"type": "message_start", "message": start}),
+                  event("content_block_start", {"type": "content_block_start", "index": 0,
+                                                "content_block": opening})]
+        events += [event("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": delta_type, delta_key: piece}})
+                   for piece in _pieces(text)]
+        events += [event("content_block_stop", {"type": "content_block_stop", "index": 0}),
+                   event("message_delta", {"type": "message_delta",
+                                           "delta": {"stop_reason": message["stop_reason"], "stop_sequence": None},
+                                           "usage": {"output_tokens": usage["output_tokens"]}}),
+                   event("message_stop", {"type": "message_stop"})]
+        return self._stream(events)
+
+
+def _forced_tool(body: Dict[str, Any]) -> Optional[str]:
+    """Name of the tool the request forces (structured-output mode), if any."""
+    choice = body.get("tool_choice") or {}
+    if choice.get("type") == "tool":                  # Anthropic
+        return choice.get("name")
+    if choice.get("type") == "function":              # OpenAI
+        return (choice.get("function") or {}).get("name")
+    return None
+
+
+def _pieces(text: str, size: int = 16) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def _prompt_blocks(body: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """The prompt in Anthropic's cache order (tools, system, messages) as a flat list of blocks."""
+    system = body.get("system") or []
+    blocks = list(body.get("tools") or [])
+    blocks += [{"type": "text", "text": system}] if isinstance(system, str) else list(system)
+    for m in body.get("messages") or []:
+        content = m.get("content")
+        blocks += [{"type": "text", "text": content}] if isinstance(content, str) else list(content or [])
+    return blocks
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the OpenAI (chat completions, audio transcriptions) and Anthropic
+    (messages) HTTP APIs, streaming and non-streaming. Point the SDKs at it with
+    OPENAI_BASE_URL=<url>/v1 and ANTHROPIC_BASE_URL=<url>.
+    """
+    daemon_threads = True
+
+    def __init__(self, config: MockConfig = None, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _Handler)
+        self.config = config or MockConfig()
+        self.rng = random.Random(self.config.seed)
+        self.rng_lock = threading.Lock()
+        self.stats = MockStats()
+        self.prompt_cache: Dict[str, Tuple[float, float]] = {}   # prefix hash -> (readable from, expiry)
+        self.cache_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def handle_error(self, request, client_address):
+        # Clients hang up mid-reply on purpose (cancelled hedges, abandoned streams)
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def prompt_cache_usage(self, body: Dict[str, Any]) -> Dict[str, int]:
+        """
+        Anthropic-style usage for this prompt: checks the cache_control markers the way the API
+        does (ephemeral, at most 4) and reports tokens read from / written to the prefix cache.
+        """
+        blocks = _prompt_blocks(body)
+        marks = [i for i, b in enumerate(blocks) if "cache_control" in b]
+        if len(marks) > 4:
+            raise ValueError(f"A maximum of 4 blocks with cache_control may be provided. Found {len(marks)}.")
+        for i in marks:
+            if (blocks[i]["cache_control"] or {}).get("type") != "ephemeral":
+                raise ValueError("cache_control.type: Input should be 'ephemeral'")
+        total = len(json.dumps(blocks)) // 4
+        model = body.get("model", "")
+        prefixes = [(len(json.dumps(blocks[:i + 1])) // 4,
+                     hashlib.sha256((model + json.dumps(blocks[:i + 1], sort_keys=True)).encode()).hexdigest())
+                    for i in marks]
+        prefixes = [(tokens, key) for tokens, key in prefixes if tokens >= self.config.cache_min_tokens]
+        read = written = 0
+        now = time.monotonic()
+        # As upstream, an entry can be read only once the response that wrote it has started,
+        # so requests sent together all miss (and all write)
+        rate = self.config.prefill_tokens_per_second
+        with self.cache_lock:
+            for tokens, key in prefixes:
+                readable, expiry = self.prompt_cache.get(key, (0.0, 0.0))
+                if readable <= now < expiry:
+                    read = tokens
+            ready_at = now + ((total - read) / rate if rate else 0.0)
+            for tokens, key in prefixes:
+                readable, expiry = self.prompt_cache.get(key, (0.0, 0.0))
+                if tokens > read:
+                    written = tokens - read
+                if now >= expiry:
+                    readable = ready_at
+                self.prompt_cache[key] = (readable, now + self.config.cache_ttl)
+        return {"input_tokens": total - read - written, "cache_read_input_tokens": read,
+                "cache_creation_input_tokens": written}
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-llm-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve mock OpenAI/Anthropic endpoints for local testing.")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=MockConfig.latency)
+    parser.add_argument("--tokens-per-second", type=float, default=MockConfig.tokens_per_second)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = MockLLMServer(MockConfig(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                                      error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate),
+                           port=args.port)
+    print(f"Mock LLM server on {server.url}")
+    print(f"  OPENAI_BASE_URL={server.url}/v1  ANTHROPIC_BASE_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,243 @@
+import io
+import os
+import sys
+import json
+import time
+import wave
+import asyncio
+import argparse
+import contextlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from bench_mock_servers import MockLLMServer, MockConfig
+
+# Stages in pipeline order: what a user session does end to end
+STAGES = ("transcribe", "listener", "followup", "analyst", "vc", "critic", "report")
+
+IDEA = ("I want to build a microsaas product Greetings Generator so that anyone can send "
+        "customized greetings instead of readymade ones.")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile (no numpy needed)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), int(round(pct / 100 * len(ordered) + 0.5))))
+    return ordered[rank - 1]
+
+
+def silent_wav(seconds: float, rate: int = 16000) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b"\x00\x00" * int(seconds * rate))
+    return buf.getvalue()
+
+
+def point_clients_at(server: MockLLMServer) -> None:
+    """Must run before the pipeline modules are imported (they read the env on first use)."""
+    os.environ["OPENAI_BASE_URL"] = server.url + "/v1"
+    os.environ["ANTHROPIC_BASE_URL"] = server.url
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+    os.environ.setdefault("CLAUDE_API_KEY", "mock")
+    os.environ["LLM_CACHE_DISABLED"] = "1"   # every call must reach the (mock) network
+
+
+async def run_pipeline(audio: bytes, timings: Dict[str, List[float]], failures: Dict[str, int],
+                       report_bytes: List[int]) -> None:
+    """One session: transcribe -> Listener -> one follow-up -> Analyst/VC/Critic -> report."""
+    from extractors import transcribe_audio
+    from llm_agent import propose_next_step, apply_followup
+    from schema_types import IdeaSchema
+    from orchestrator import PARALLEL_AGENTS, DEFAULT_TIMEOUT, _run_with_timeout
+    from report_renderer import render_report
+
+    async def stage(name, coro):
+        started = time.perf_counter()
+        try:
+            result = await coro
+        except Exception as e:
+            result = {"error": str(e)}
+        timings[name].append(time.perf_counter() - started)
+        if isinstance(result, dict) and "error" in result:
+            failures[name] += 1
+        return result
+
+    text = IDEA
+    if audio:
+        transcript = await stage("transcribe", asyncio.to_thread(transcribe_audio, audio, "note.wav"))
+        if isinstance(transcript, str):
+            text = f"[TYPED]\n{IDEA}\n\n[AUDIO]\n{transcript}"
+
+    listener = await stage("listener", asyncio.to_thread(propose_next_step, text, IdeaSchema(), []))
+    if "current_schema" not in listener:
+        return
+    schema = IdeaSchema(**{k: v for k, v in listener["current_schema"].items() if k in IdeaSchema.model_fields})
+    followup = await stage("followup", asyncio.to_thread(apply_followup, schema, "pricing", "$4/month"))
+    schema_data = followup.get("current_schema", schema.model_dump())
+
+    reports = await asyncio.gather(*[
+        stage(name, _run_with_timeout(name, fn(schema_data), DEFAULT_TIMEOUT))
+        for name, fn in PARALLEL_AGENTS.items()
+    ])
+    analyst, vc, critic = reports
+
+    def render():
+        return len(render_report({"listener": schema_data, "analyst": analyst, "vc": vc, "critic": critic}, "docx"))
+
+    size = await stage("report", asyncio.to_thread(render))
+    if isinstance(size, int):
+        report_bytes.append(size)
+
+
+async def run_level(concurrency: int, sessions: int, audio: bytes) -> Dict[str, Any]:
+    from clients import aclose_clients
+
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=concurrency * 2 + 4))
+    timings: Dict[str, List[float]] = defaultdict(list)
+    failures: Dict[str, int] = defaultdict(int)
+    report_bytes: List[int] = []
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with gate:
+            started = time.perf_counter()
+            await run_pipeline(audio, timings, failures, report_bytes)
+            timings["pipeline"].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*[one() for _ in range(sessions)])
+    finally:
+        await aclose_clients()
+    return {"wall": time.perf_counter() - started, "timings": timings, "failures": failures,
+            "report_bytes": report_bytes}
+
+
+def summarize(concurrency: int, run: Dict[str, Any], records) -> Dict[str, Any]:
+    wall = run["wall"]
+    by_stage = defaultdict(lambda: {"requests": 0, "bytes_in": 0, "bytes_out": 0, "http_429": 0, "http_5xx": 0})
+    for r in records:
+        s = by_stage[r.stage]
+        s["requests"] += 1
+        s["bytes_in"] += r.bytes_in
+        s["bytes_out"] += r.bytes_out
+        s["http_429"] += r.status == 429
+        s["http_5xx"] += r.status >= 500
+    by_stage["report"]["bytes_out"] = sum(run["report_bytes"])
+
+    stages = {}
+    for name in (*STAGES, "pipeline"):
+        values = run["timings"].get(name, [])
+        if not values:
+            continue
+        stages[name] = {
+            "count": len(values),
+            "errors": run["failures"].get(name, 0),
+            "p50_ms": round(percentile(values, 50) * 1000, 1),
+            "p95_ms": round(percentile(values, 95) * 1000, 1),
+            "p99_ms": round(percentile(values, 99) * 1000, 1),
+            "per_min": round(len(values) / wall * 60, 1),
+            **({k: v for k, v in by_stage[name].items()} if name in by_stage else {}),
+        }
+    return {"concurrency": concurrency, "wall_seconds": round(wall, 2), "stages": stages}
+
+
+def print_level(summary: Dict[str, Any]) -> None:
+    print(f"\n== concurrency {summary['concurrency']}  ({summary['wall_seconds']}s wall)")
+    print(f"{'stage':<11}{'n':>5}{'err':>5}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'/min':>8}"
+          f"{'req':>6}{'429':>5}{'KB in':>9}{'KB out':>9}")
+    for name, s in summary["stages"].items():
+        print(f"{name:<11}{s['count']:>5}{s['errors']:>5}{s['p50_ms']:>9}{s['p95_ms']:>9}{s['p99_ms']:>9}"
+              f"{s['per_min']:>8}{s.get('requests', ''):>6}{s.get('http_429', ''):>5}"
+              f"{_kb(s, 'bytes_in'):>9}{_kb(s, 'bytes_out'):>9}")
+
+
+def _kb(stage: Dict[str, Any], key: str) -> str:
+    return f"{stage[key] / 1024:.1f}" if key in stage else ""
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float) -> List[str]:
+    """p95 regressions beyond tolerance, per concurrency level and stage."""
+    old = {(b["concurrency"], name): s for b in baseline for name, s in b["stages"].items()}
+    problems = []
+    for level in results:
+        for name, s in level["stages"].items():
+            ref = old.get((level["concurrency"], name))
+            if ref and ref["p95_ms"] > 0 and s["p95_ms"] > ref["p95_ms"] * (1 + tolerance):
+                problems.append(f"c={level['concurrency']} {name}: p95 {s['p95_ms']}ms vs baseline {ref['p95_ms']}ms")
+    return problems
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline load benchmark of the validation pipeline against mock LLM servers.")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--sessions", type=int, default=4, help="Pipelines per level = sessions x concurrency")
+    parser.add_argument("--latency", type=float, default=MockConfig.latency, help="Mock time to first byte (s)")
+    parser.add_argument("--jitter", type=float, default=MockConfig.latency_jitter)
+    parser.add_argument("--tokens-per-second", type=float, default=MockConfig.tokens_per_second)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of mock responses that are 500s")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of mock responses that are 429s")
+    parser.add_argument("--retry-after", type=float, default=MockConfig.retry_after)
+    parser.add_argument("--malformed-rate", type=float, default=0.0,
+                        help="Fraction of text replies sent as fenced JSON + prose (exercises local repair)")
+    parser.add_argument("--prefill-tokens-per-second", type=float, default=0.0,
+                        help="Uncached prompt tokens add to mock time to first byte (shows prompt caching); 0 = off")
+    parser.add_argument("--slow", metavar="PROVIDER:RATE:SECONDS", default="",
+                        help="Give one provider a latency tail, e.g. anthropic:0.1:5 (shows hedged requests)")
+    parser.add_argument("--audio-seconds", type=float, default=5.0, help="Voice note length; 0 skips transcription")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Write the results as JSON to this path")
+    parser.add_argument("--baseline", help="Fail if any p95 regresses against this earlier --json output")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p95 slowdown vs baseline (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+    slow_provider, slow_rate, slow_delay = (args.slow.split(":") if args.slow else ("", 0, 0))
+
+    config = MockConfig(latency=args.latency, latency_jitter=args.jitter, tokens_per_second=args.tokens_per_second,
+                        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                        retry_after=args.retry_after, malformed_rate=args.malformed_rate,
+                        prefill_tokens_per_second=args.prefill_tokens_per_second, slow_provider=slow_provider,
+                        slow_rate=float(slow_rate), slow_delay=float(slow_delay), seed=args.seed)
+    audio = silent_wav(args.audio_seconds) if args.audio_seconds > 0 else b""
+    results = []
+    with MockLLMServer(config) as server:
+        point_clients_at(server)
+        print(f"Mock OpenAI/Anthropic on {server.url} (latency {args.latency}s, "
+              f"{args.tokens_per_second:g} tok/s, 429 {args.rate_limit_rate:.0%}, 5xx {args.error_rate:.0%})")
+        for level in [int(c) for c in args.concurrency.split(",") if c.strip()]:
+            server.stats.drain()
+            # Agents print as they work; keep the benchmark table readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                run = asyncio.run(run_level(level, args.sessions * level, audio))
+            summary = summarize(level, run, server.stats.drain())
+            results.append(summary)
+            print_level(summary)
+        if slow_provider:
+            from model_router import ROUTER
+            print("\nModel routing: " + "; ".join(
+                f"{m['model']} calls={m['calls']} err={m['errors']} hedge wins={m['hedges_won']} p95={m['p95_s'] or '-'}s"
+                for m in ROUTER.snapshot()))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        if problems:
+            print("\nRegressions vs baseline:")
+            for p in problems:
+                print(f"  - {p}")
+            return 1
+        print(f"\nNo p95 regressions beyond {args.tolerance:.0%} of baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
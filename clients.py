@@ -0,0 +1,142 @@
+import os
+import asyncio
+import threading
+import weakref
+from typing import Any, Dict
+
+import settings  # noqa: F401  (reads .env once per process)
+
+# Connection pool tuning shared by every provider client (override in .env)
+HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "120"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT = float(os.getenv("LLM_HTTP_READ_TIMEOUT", "180"))
+HTTP2_ENABLED = os.getenv("LLM_HTTP2", "1").lower() not in ("0", "false", "no")
+
+_lock = threading.Lock()
+_sync_clients: Dict[str, Any] = {}
+# Async clients are bound to the event loop that created them (asyncio.run makes a new loop
+# each time, e.g. on every Streamlit click), so they are kept per loop.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+
+
+def _http2() -> bool:
+    """HTTP/2 needs the optional `h2` package (pip install httpx[http2])."""
+    if not HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _pool_kwargs(provider: str, async_: bool = False) -> Dict[str, Any]:
+    # httpx, the transports and the SDKs load with the first client, not with this module (every agent imports it)
+    import httpx
+    from rate_limiter import RateLimitedTransport, AsyncRateLimitedTransport
+    # Every request goes through the shared rate limiter, which also does the retrying
+    # (and counts each attempt on the current instrumentation span)
+    transport = AsyncRateLimitedTransport if async_ else RateLimitedTransport
+    return dict(
+        transport=transport(
+            provider,
+            http2=_http2(),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+        ),
+        timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+    )
+
+
+def _openai_kwargs() -> Dict[str, Any]:
+    return dict(api_key=os.getenv("OPENAI_API_KEY"), base_url=os.getenv("OPENAI_BASE_URL") or None, max_retries=0)
+
+
+def _anthropic_kwargs() -> Dict[str, Any]:
+    return dict(
+        api_key=os.getenv("CLAUDE_API_KEY") or os.getenv("ANTHROPIC_API_KEY"),
+        base_url=os.getenv("ANTHROPIC_BASE_URL") or None,
+        max_retries=0,
+    )
+
+
+def _build_sync(provider: str):
+    import httpx
+    if provider == "openai":
+        from openai import OpenAI
+        return OpenAI(http_client=httpx.Client(**_pool_kwargs(provider)), **_openai_kwargs())
+    if provider == "anthropic":
+        from anthropic import Anthropic
+        return Anthropic(http_client=httpx.Client(**_pool_kwargs(provider)), **_anthropic_kwargs())
+    raise ValueError(f"Unknown provider: {provider}")
+
+
+def _build_async(provider: str):
+    import httpx
+    if provider == "openai":
+        from openai import AsyncOpenAI
+        return AsyncOpenAI(http_client=httpx.AsyncClient(**_pool_kwargs(provider, async_=True)), **_openai_kwargs())
+    if provider == "anthropic":
+        from anthropic import AsyncAnthropic
+        return AsyncAnthropic(http_client=httpx.AsyncClient(**_pool_kwargs(provider, async_=True)), **_anthropic_kwargs())
+    raise ValueError(f"Unknown provider: {provider}")
+
+
+def get_sync_client(provider: str):
+    """One sync client per provider per process, created on first use."""
+    client = _sync_clients.get(provider)
+    if client is None:
+        with _lock:
+            client = _sync_clients.get(provider)
+            if client is None:
+                client = _sync_clients[provider] = _build_sync(provider)
+    return client
+
+
+def get_async_client(provider: str):
+    """One async client per provider for the running event loop, created on first use."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        per_loop = _async_clients.setdefault(loop, {})
+        client = per_loop.get(provider)
+        if client is None:
+            client = per_loop[provider] = _build_async(provider)
+    return client
+
+
+def get_openai_client():
+    return get_sync_client("openai")
+
+
+def get_anthropic_client():
+    return get_sync_client("anthropic")
+
+
+def get_async_openai_client():
+    return get_async_client("openai")
+
+
+def get_async_anthropic_client():
+    return get_async_client("anthropic")
+
+
+def close_clients() -> None:
+    """Close the sync pools (see aclose_clients for the async ones)."""
+    with _lock:
+        for client in _sync_clients.values():
+            client.close()
+        _sync_clients.clear()
+
+
+async def aclose_clients() -> None:
+    """Close the async clients of the running loop; call before the loop shuts down."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        per_loop = _async_clients.pop(loop, {})
+    for client in per_loop.values():
+        await client.close()
@@ -0,0 +1,160 @@
+import os
+import re
+import math
+from collections import Counter
+from typing import List, Tuple
+
+import settings  # noqa: F401  (reads .env once per process)
+from schema_types import IdeaSchema
+
+# Token budget for the aggregated intake text sent to the Listener (override in .env)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("LISTENER_CONTEXT_TOKENS", "6000"))
+CHUNK_TOKENS = 180
+
+# Blocks written by extractors.consolidate_inputs and the app.py answer log
+BLOCK_RE = re.compile(r"^\[(TYPED|DOC|AUDIO|ANSWER[^\]]*)\]\s*$", re.MULTILINE)
+# Always sent whole: what the user typed and what they answered
+PRESERVED = ("TYPED", "ANSWER")
+
+STOPWORDS = set("""
+a an and are as at be by for from has have how in is it its of on or that the this to was what
+when where which who why will with you your we our they their it's i me my can do does not
+""".split())
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English) - no tokenizer dependency."""
+    return max(1, len(text) // 4) if text else 0
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in re.findall(r"[a-z0-9]+", text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def split_blocks(aggregated_text: str) -> List[Tuple[str, str]]:
+    """[(label, body)] in order; text without any block header counts as TYPED."""
+    matches = list(BLOCK_RE.finditer(aggregated_text))
+    if not matches:
+        return [("TYPED", aggregated_text.strip())] if aggregated_text.strip() else []
+    blocks = []
+    if aggregated_text[:matches[0].start()].strip():
+        blocks.append(("TYPED", aggregated_text[:matches[0].start()].strip()))
+    for m, nxt in zip(matches, matches[1:] + [None]):
+        body = aggregated_text[m.end():nxt.start() if nxt else len(aggregated_text)].strip()
+        blocks.append((m.group(1), body))
+    return blocks
+
+
+def _hard_split(text: str, max_chars: int) -> List[str]:
+    """Cut text with no usable sentence breaks (unpunctuated transcripts, table dumps) on word boundaries."""
+    parts = []
+    while len(text) > max_chars:
+        cut = text.rfind(" ", 0, max_chars)
+        cut = cut if cut > max_chars // 2 else max_chars
+        parts.append(text[:cut].strip())
+        text = text[cut:].strip()
+    if text:
+        parts.append(text)
+    return parts
+
+
+def chunk_text(text: str, chunk_tokens: int = CHUNK_TOKENS) -> List[str]:
+    """Group paragraphs (or sentences of long paragraphs) into ~chunk_tokens pieces; none is larger."""
+    pieces = []
+    for para in re.split(r"\n\s*\n|\n(?=\s*[-•*\d])", text):
+        para = para.strip()
+        if not para:
+            continue
+        if estimate_tokens(para) <= chunk_tokens:
+            pieces.append(para)
+            continue
+        for sentence in re.split(r"(?<=[.!?])\s+", para):
+            sentence = sentence.strip()
+            if estimate_tokens(sentence) <= chunk_tokens:
+                pieces += [sentence] if sentence else []
+            else:   # an oversized piece would never fit the budget and its whole block would be dropped
+                pieces += _hard_split(sentence, chunk_tokens * 4)
+
+    chunks, current = [], []
+    for piece in pieces:
+        if current and estimate_tokens(" ".join(current + [piece])) > chunk_tokens:
+            chunks.append("\n".join(current))
+            current = []
+        current.append(piece)
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def bm25_scores(chunks: List[str], query: List[str], k1: float = 1.5, b: float = 0.75) -> List[float]:
+    docs = [tokenize(c) for c in chunks]
+    if not docs:
+        return []
+    avg_len = sum(len(d) for d in docs) / len(docs) or 1.0
+    df = Counter(t for d in docs for t in set(d))
+    n = len(docs)
+    scores = []
+    for d in docs:
+        tf = Counter(d)
+        score = 0.0
+        for term in set(query):
+            if term not in tf:
+                continue
+            idf = math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5))
+            score += idf * tf[term] * (k1 + 1) / (tf[term] + k1 * (1 - b + b * len(d) / avg_len))
+        scores.append(score)
+    return scores
+
+
+def schema_query() -> List[str]:
+    """Query terms: every IdeaSchema field name and description."""
+    terms = []
+    for name, info in IdeaSchema.model_fields.items():
+        terms += tokenize(name.replace("_", " "))
+        terms += tokenize(info.description or "")
+    return terms
+
+
+def compact_context(aggregated_text: str, budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+    """
+    Bound the Listener prompt: if the aggregated text is over budget, keep TYPED/ANSWER
+    blocks whole and fill the remaining budget with the DOC/AUDIO chunks that score highest
+    (BM25 against the IdeaSchema field descriptions plus the typed text), in original order.
+    """
+    if estimate_tokens(aggregated_text) <= budget:
+        return aggregated_text
+
+    blocks = split_blocks(aggregated_text)
+    kept_tokens = sum(estimate_tokens(body) for label, body in blocks if label.startswith(PRESERVED))
+    remaining = max(0, budget - kept_tokens)
+
+    query = schema_query() + [t for label, body in blocks if label == "TYPED" for t in tokenize(body)]
+    candidates = []  # (block index, chunk index, text)
+    for bi, (label, body) in enumerate(blocks):
+        if not label.startswith(PRESERVED):
+            candidates += [(bi, ci, c) for ci, c in enumerate(chunk_text(body))]
+    scores = bm25_scores([c for _, _, c in candidates], query)
+
+    chosen = set()
+    for idx in sorted(range(len(candidates)), key=lambda i: scores[i], reverse=True):
+        cost = estimate_tokens(candidates[idx][2])
+        if cost <= remaining:
+            chosen.add(idx)
+            remaining -= cost
+
+    out = []
+    for bi, (label, body) in enumerate(blocks):
+        if label.startswith(PRESERVED):
+            out.append(f"[{label}]\n{body}")
+            continue
+        parts, last_ci = [], -1
+        for idx, (cbi, ci, text) in enumerate(candidates):
+            if cbi != bi or idx not in chosen:
+                continue
+            if ci != last_ci + 1:
+                parts.append("[…]")
+            parts.append(text)
+            last_ci = ci
+        if parts:
+            out.append(f"[{label}]\n" + "\n".join(parts))
+    return "\n\n".join(out).strip()
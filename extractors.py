@@ -1,67 +1,368 @@
-from io import BytesIO
-from typing import Tuple
-from openai import OpenAI
-from pypdf import PdfReader
-from docx import Document
-from openai import OpenAI
+from typing import Tuple, Iterator, List, Union, BinaryIO, Callable, Optional
+from contextlib import contextmanager
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from array import array
+import multiprocessing
+import subprocess
+import wave
+import io
+import threading
+import tempfile
+import shutil
+import settings  # noqa: F401  (reads .env once per process)
+from llm_cache import cached_call
+from instrumentation import span, current_span, bind_context, record_usage
+import hashlib
 import os
 
+# Extraction budgets (override in .env). Uploads above MAX_UPLOAD_BYTES are rejected;
+# page and text budgets stop extraction early instead of failing.
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+MAX_PDF_PAGES = int(os.getenv("MAX_PDF_PAGES", "300"))
+MAX_TEXT_BYTES = int(os.getenv("MAX_EXTRACTED_TEXT_BYTES", str(2 * 1024 * 1024)))
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(min(8, os.cpu_count() or 1))))
+PAGES_PER_TASK = 8
+PARALLEL_MIN_PAGES = 24    # below this a process pool costs more than it saves
+SPOOL_CHUNK_BYTES = 1024 * 1024
+
+# Transcription: models are tried in order and the first one that works is remembered.
+# Long recordings are split into ~SEGMENT_SECONDS pieces (cut at the quietest point nearby)
+# and transcribed concurrently.
+TRANSCRIBE_MODELS = [m.strip() for m in os.getenv("TRANSCRIBE_MODELS", "gpt-4o-transcribe,whisper-1").split(",") if m.strip()]
+SEGMENT_SECONDS = float(os.getenv("TRANSCRIBE_SEGMENT_SECONDS", "120"))
+SILENCE_SEARCH_SECONDS = 5.0
+TRANSCRIBE_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", "6"))
+
+Source = Union[bytes, bytearray, memoryview, BinaryIO, str]
+
+
+class ExtractionLimitError(ValueError):
+    """Raised when an upload exceeds MAX_UPLOAD_BYTES."""
+
 def get_client():
-    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    from clients import get_openai_client
+    return get_openai_client()
+
+_working_model: Optional[str] = None
+_model_lock = threading.Lock()
+
+
+def _transcribe_segment(filename: str, data: bytes) -> str:
+    """One transcription request, starting from the model that last worked."""
+    global _working_model
+    from openai import NotFoundError, PermissionDeniedError
 
-def transcribe_audio(file_bytes: bytes, filename: str = "audio.webm") -> str:
     client = get_client()
-    try:
-        transcript = client.audio.transcriptions.create(
-            model="gpt-4o-transcribe",
-            file=(filename, file_bytes)
-        )
+    start = TRANSCRIBE_MODELS.index(_working_model) if _working_model in TRANSCRIBE_MODELS else 0
+    error = None
+    for model in TRANSCRIBE_MODELS[start:]:
+        try:
+            transcript = record_usage(client.audio.transcriptions.create(model=model, file=(filename, data)))
+        except (NotFoundError, PermissionDeniedError) as e:
+            error = e   # model not available on this account -> try the next one (a bad segment just fails)
+            continue
+        if current_span() is not None:
+            current_span().model = model
+        if model != _working_model:
+            with _model_lock:
+                _working_model = model
         return transcript.text.strip()
-    except Exception:
-        transcript = client.audio.transcriptions.create(
-            model="whisper-1",
-            file=(filename, file_bytes)
+    raise error
+
+
+def _wav_bytes(params, frames: bytes) -> bytes:
+    out = io.BytesIO()
+    with wave.open(out, "wb") as w:
+        w.setnchannels(params.nchannels)
+        w.setsampwidth(params.sampwidth)
+        w.setframerate(params.framerate)
+        w.writeframes(frames)
+    return out.getvalue()
+
+
+def _quietest_frame(frames: bytes, params, lo: int, hi: int) -> int:
+    """Frame index in [lo, hi) where a 50 ms window has the lowest energy (16-bit PCM only)."""
+    if params.sampwidth != 2:
+        return (lo + hi) // 2
+    samples = array("h", frames[lo * params.nchannels * 2:hi * params.nchannels * 2])
+    window = max(1, params.framerate // 20) * params.nchannels
+    best, best_energy = (lo + hi) // 2, None
+    for i in range(0, max(1, len(samples) - window), window):
+        energy = sum(abs(x) for x in samples[i:i + window])
+        if best_energy is None or energy < best_energy:
+            best, best_energy = lo + (i + window // 2) // params.nchannels, energy
+    return best
+
+
+def _split_wav(data: bytes, segment_seconds: float) -> List[bytes]:
+    with wave.open(io.BytesIO(data), "rb") as r:
+        params = r.getparams()
+        frames = r.readframes(params.nframes)
+    # Count frames from the data itself: WAV piped out of ffmpeg carries a placeholder length
+    total = len(frames) // (params.nchannels * params.sampwidth)
+    seg = int(segment_seconds * params.framerate)
+    if total <= seg * 1.2:
+        return [data]
+
+    search = min(int(SILENCE_SEARCH_SECONDS * params.framerate), seg // 4)
+    frame_bytes = params.nchannels * params.sampwidth
+    cuts, pos = [0], 0
+    while total - pos > seg * 1.2:
+        target = pos + seg
+        cut = _quietest_frame(frames, params, max(pos + 1, target - search), min(total - 1, target + search))
+        cuts.append(cut)
+        pos = cut
+    cuts.append(total)
+    return [_wav_bytes(params, frames[a * frame_bytes:b * frame_bytes]) for a, b in zip(cuts, cuts[1:])]
+
+
+def split_audio(file_bytes: bytes, filename: str, segment_seconds: float = SEGMENT_SECONDS) -> List[Tuple[str, bytes]]:
+    """
+    Split a recording into (filename, bytes) segments of about segment_seconds, cutting at
+    the quietest point near each boundary. WAV is split natively; other formats are decoded
+    to 16 kHz mono WAV with ffmpeg when it is installed, otherwise sent as one segment.
+    """
+    base, ext = os.path.splitext(filename or "audio.webm")
+    data = file_bytes
+    if ext.lower() != ".wav":
+        if not shutil.which("ffmpeg"):
+            return [(filename, file_bytes)]
+        proc = subprocess.run(
+            ["ffmpeg", "-loglevel", "error", "-i", "pipe:0", "-ac", "1", "-ar", "16000", "-f", "wav", "pipe:1"],
+            input=file_bytes, capture_output=True,
         )
-        return transcript.text.strip()
+        if proc.returncode != 0 or not proc.stdout:
+            return [(filename, file_bytes)]
+        data = proc.stdout
+
+    try:
+        parts = _split_wav(data, segment_seconds)
+    except (wave.Error, EOFError):
+        return [(filename, file_bytes)]
+    if len(parts) == 1:
+        return [(filename, file_bytes)]
+    return [(f"{base}_{i:03d}.wav", part) for i, part in enumerate(parts)]
 
-def extract_text_from_pdf(file_bytes: bytes) -> str:
-    """Extract text from a PDF file using pypdf."""
-    reader = PdfReader(BytesIO(file_bytes))
-    chunks = []
-    for page in reader.pages:
-        try:
-            text = page.extract_text()
-            if text:
-                chunks.append(text)
-        except Exception:
-            continue
-    return "\n".join(chunks).strip()
 
-def extract_text_from_docx(file_bytes: bytes) -> str:
-    """Extract text from a DOCX file."""
-    bio = BytesIO(file_bytes)
-    doc = Document(bio)
-    return "\n".join([p.text for p in doc.paragraphs if p.text.strip()]).strip()
+def _transcript_key(data: bytes) -> dict:
+    return {
+        "provider": "openai",
+        "endpoint": "audio.transcriptions",
+        "models": TRANSCRIBE_MODELS,
+        "audio_sha256": hashlib.sha256(data).hexdigest(),
+    }
 
-def transcribe_audio(file_bytes: bytes, filename: str = "audio.webm") -> str:
+
+def transcribe_audio(file_bytes: bytes, filename: str = "audio.webm", bypass_cache: bool = False,
+                     on_progress: Callable[[int, int], None] = None) -> str:
     """
     Uses OpenAI's transcription.
     Models commonly available:
     - "whisper-1"
     - "gpt-4o-transcribe" (if your account has it)
+    Long recordings are split into segments transcribed concurrently and stitched back in
+    order; on_progress(done, total) is called from the calling thread after each segment.
+    Results (whole file and each segment) are cached by the SHA-256 of the audio.
     """
+    def fetch() -> str:
+        with span("split_audio", kind="extract", bytes=len(file_bytes)) as s:
+            segments = split_audio(file_bytes, filename)
+            s.attrs["segments"] = len(segments)
+        if len(segments) == 1:
+            with span("transcribe_segment", provider="openai"):
+                text = _transcribe_segment(*segments[0])
+            if on_progress:
+                on_progress(1, 1)
+            return text
+
+        def run(i: int) -> str:
+            name, data = segments[i]
+            return cached_call(_transcript_key(data), lambda: _transcribe_segment(name, data), bypass_cache,
+                               name="transcribe_segment")
+
+        texts = [""] * len(segments)
+        done = 0
+        pending = list(range(len(segments)))
+        if _working_model is None:
+            # Find the working model on one segment before fanning out, so the rest skip the probe
+            texts[0] = run(pending.pop(0))
+            done += 1
+            if on_progress:
+                on_progress(done, len(segments))
+
+        with ThreadPoolExecutor(max_workers=min(TRANSCRIBE_WORKERS, len(segments))) as pool:
+            futures = {pool.submit(bind_context(run), i): i for i in pending}
+            for future in as_completed(futures):
+                texts[futures[future]] = future.result()
+                done += 1
+                if on_progress:
+                    on_progress(done, len(segments))
+        return " ".join(t for t in texts if t).strip()
+
+    return cached_call(_transcript_key(file_bytes), fetch, bypass=bypass_cache, name="transcribe", kind="extract")
+
+@contextmanager
+def spooled_upload(source: Source, suffix: str = "", max_bytes: int = MAX_UPLOAD_BYTES):
+    """
+    Yield a filesystem path for an upload (bytes, file-like, or an existing path).
+    File-likes are copied to a temp file in 1 MB chunks, so large uploads are never
+    duplicated in memory and worker processes can open the file themselves.
+    """
+    if isinstance(source, str):
+        if os.path.getsize(source) > max_bytes:
+            raise ExtractionLimitError(f"Upload is larger than {max_bytes / (1024 * 1024):g} MB")
+        yield source
+        return
+
+    tmp = tempfile.NamedTemporaryFile(prefix="upload_", suffix=suffix, delete=False)
     try:
-        transcript = _client.audio.transcriptions.create(
-            model="gpt-4o-transcribe",
-            file=(filename, file_bytes)
-        )
-        return transcript.text.strip()
-    except Exception:
-        transcript = _client.audio.transcriptions.create(
-            model="whisper-1",
-            file=(filename, file_bytes)
-        )
-        return transcript.text.strip()
+        with tmp:
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                if len(source) > max_bytes:
+                    raise ExtractionLimitError(f"Upload is larger than {max_bytes / (1024 * 1024):g} MB")
+                tmp.write(source)
+            else:
+                if hasattr(source, "seek"):
+                    source.seek(0)
+                written = 0
+                while True:
+                    chunk = source.read(SPOOL_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    written += len(chunk)
+                    if written > max_bytes:
+                        raise ExtractionLimitError(f"Upload is larger than {max_bytes / (1024 * 1024):g} MB")
+                    tmp.write(chunk)
+        yield tmp.name
+    finally:
+        os.unlink(tmp.name)
+
+
+def _extract_page_range(path: str, start: int, stop: int) -> List[str]:
+    """Worker: extract pages [start, stop) of the PDF at path (runs in a child process)."""
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    texts = []
+    for i in range(start, stop):
+        try:
+            texts.append(reader.pages[i].extract_text() or "")
+        except Exception:
+            texts.append("")
+    return texts
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Long-lived page-extraction pool; spawn avoids forking a threaded Streamlit server."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def iter_pdf_pages(source: Source, max_pages: int = MAX_PDF_PAGES, max_text_bytes: int = MAX_TEXT_BYTES,
+                   workers: int = EXTRACT_WORKERS, max_bytes: int = MAX_UPLOAD_BYTES) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (page number, text) for each non-empty PDF page, in order, as it becomes available.
+    Page numbers are 1-based and count the empty pages that are skipped.
+    Large documents are split into page ranges extracted in parallel by a process pool.
+    Stops after max_pages pages or max_text_bytes of text.
+    """
+    from pypdf import PdfReader   # parsers load on first use, so importing this module stays cheap
+    with span("extract_pdf", kind="extract", activate=False) as s, \
+            spooled_upload(source, suffix=".pdf", max_bytes=max_bytes) as path:
+        n_pages = min(len(PdfReader(path).pages), max_pages)
+        s.attrs.update(pages=n_pages, parallel=workers > 1 and n_pages >= PARALLEL_MIN_PAGES)
+        ranges = [(i, min(i + PAGES_PER_TASK, n_pages)) for i in range(0, n_pages, PAGES_PER_TASK)]
+
+        if workers <= 1 or n_pages < PARALLEL_MIN_PAGES:
+            batches = (_extract_page_range(path, a, b) for a, b in ranges)
+            futures = []
+        else:
+            futures = [_get_pool().submit(_extract_page_range, path, a, b) for a, b in ranges]
+            batches = (f.result() for f in futures)
+
+        budget = max_text_bytes
+        try:
+            for (first, _), batch in zip(ranges, batches):
+                for page_no, text in enumerate(batch, start=first + 1):
+                    text = text.strip()
+                    if not text:
+                        continue
+                    size = len(text.encode("utf-8"))
+                    if size > budget:
+                        # Cut at the budget on a character boundary, then stop
+                        text = text.encode("utf-8")[:budget].decode("utf-8", errors="ignore")
+                        if text:
+                            yield page_no, text
+                        return
+                    budget -= size
+                    yield page_no, text
+        finally:
+            for f in futures:
+                f.cancel()
+
+
+def extract_text_from_pdf(file_bytes: Source) -> str:
+    """Extract text from a PDF file using pypdf."""
+    return "\n".join(text for _, text in iter_pdf_pages(file_bytes)).strip()
+
+
+def iter_docx_blocks(source: Source, max_text_bytes: int = MAX_TEXT_BYTES,
+                     max_bytes: int = MAX_UPLOAD_BYTES) -> Iterator[str]:
+    """
+    Yield DOCX text in document order: headers, body paragraphs and tables (one row per
+    line, cells separated by " | "), then footers. Stops after max_text_bytes of text.
+    """
+    def table_rows(table):
+        for row in table.rows:
+            cells = []
+            for cell in row.cells:
+                value = cell.text.strip()
+                if value and (not cells or cells[-1] != value):   # merged cells repeat their text
+                    cells.append(value)
+            if cells:
+                yield " | ".join(cells)
+
+    def blocks(container):
+        for item in container.iter_inner_content():
+            if hasattr(item, "rows"):
+                yield from table_rows(item)
+            elif item.text.strip():
+                yield item.text.strip()
+
+    from docx import Document
+    with span("extract_docx", kind="extract", activate=False), \
+            spooled_upload(source, suffix=".docx", max_bytes=max_bytes) as path:
+        doc = Document(path)
+        seen_parts = set()
+
+        def header_footer_blocks(attr):
+            for section in doc.sections:
+                part = getattr(section, attr)
+                if part.is_linked_to_previous or id(part.part) in seen_parts:
+                    continue
+                seen_parts.add(id(part.part))
+                yield from blocks(part)
+
+        budget = max_text_bytes
+        for text in chain(header_footer_blocks("header"), blocks(doc), header_footer_blocks("footer")):
+            size = len(text.encode("utf-8"))
+            if size > budget:
+                return
+            budget -= size
+            yield text
+
+
+def extract_text_from_docx(file_bytes: Source) -> str:
+    """Extract text from a DOCX file, including tables, headers and footers."""
+    return "\n".join(iter_docx_blocks(file_bytes)).strip()
 
 def consolidate_inputs(typed_text: str, doc_text: str, audio_text: str) -> str:
     """Merge typed, doc, and audio text into one aggregated string."""
@@ -0,0 +1,95 @@
+import os
+import re
+import ast
+import sys
+import json
+import argparse
+import subprocess
+from typing import Dict, List, Tuple
+
+# Heavy SDKs and parsers the pages must not import up front (they load on first use)
+DEFERRED = ("openai", "anthropic", "pypdf", "docx", "numpy", "httpx")
+# The Streamlit pages; their local imports are what a cold start (and a new session) pays for
+PAGES = ("app.py", "streamlit_orchestrator.py")
+ROOT = os.path.dirname(os.path.abspath(__file__))
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def page_imports(path: str) -> List[str]:
+    """Repo modules a script imports at top level (streamlit itself is not ours to slim down)."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    names = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names += [a.name.split(".")[0] for a in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.append(node.module.split(".")[0])
+    local = [n for n in names if os.path.exists(os.path.join(ROOT, n + ".py"))]
+    return list(dict.fromkeys(local))
+
+
+def _importtime(code: str) -> List[Tuple[str, int, int, int]]:
+    """(module, self µs, cumulative µs, depth) for every module imported by `python -c code`."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                          capture_output=True, text=True, check=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            rows.append((m.group(4), int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2))
+    return rows
+
+
+def measure(modules: List[str], repeat: int = 3) -> Dict[str, object]:
+    """Import modules in a fresh interpreter (best of `repeat`); interpreter startup is excluded."""
+    startup = {name for name, *_ in _importtime("pass")}
+    best = None
+    for _ in range(max(1, repeat)):
+        rows = [r for r in _importtime("import " + ", ".join(modules)) if r[0] not in startup]
+        total = sum(cum for _, _, cum, depth in rows if depth == 0)
+        if best is None or total < best[0]:
+            best = (total, rows)
+    total, rows = best
+    loaded = {name for name, *_ in rows}
+    return {
+        "modules": modules,
+        "total_ms": round(total / 1000, 1),
+        "loaded": len(rows),
+        "eager_heavy": [m for m in DEFERRED if m in loaded],
+        "slowest": [{"module": name, "self_ms": round(own / 1000, 1), "cumulative_ms": round(cum / 1000, 1)}
+                    for name, own, cum, _ in sorted(rows, key=lambda r: r[1], reverse=True)],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Import-time report (python -X importtime) for the Streamlit pages or given modules.")
+    parser.add_argument("targets", nargs="*", default=list(PAGES),
+                        help="Page scripts (.py: their top-level repo imports are measured) or module names")
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to list (by own time)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--budget-ms", type=float, help="Exit 1 if a target takes longer than this to import")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    failed = False
+    reports = []
+    for target in args.targets:
+        modules = page_imports(os.path.join(ROOT, target)) if target.endswith(".py") else [target]
+        report = measure(modules, repeat=args.repeat)
+        report["target"] = target
+        report["slowest"] = report["slowest"][:args.top]
+        failed |= bool(report["eager_heavy"]) or (args.budget_ms is not None and report["total_ms"] > args.budget_ms)
+        reports.append(report)
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        for r in reports:
+            print(f"{r['target']}: {r['total_ms']:.1f} ms, {r['loaded']} modules ({', '.join(r['modules'])})")
+            if r["eager_heavy"]:
+                print(f"  ⚠️  imported eagerly: {', '.join(r['eager_heavy'])}")
+            for row in r["slowest"]:
+                print(f"  {row['self_ms']:>8.1f} ms  {row['cumulative_ms']:>8.1f} ms  {row['module']}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,325 @@
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import settings  # noqa: F401  (reads .env once per process)
+
+# Every finished span is appended here as one JSON line (override in .env)
+METRICS_PATH = os.getenv("LLM_METRICS_PATH", os.path.join(".data", "metrics.jsonl"))
+METRICS_DISABLED = os.getenv("LLM_METRICS_DISABLED", "").lower() in ("1", "true", "yes")
+
+# USD per 1M tokens: (input, output, cached input). Prefix match on the model name.
+PRICES_PER_MTOK = {
+    "gpt-4o-mini": (0.15, 0.60, 0.075),
+    "gpt-4o": (2.50, 10.00, 1.25),
+    "gpt-4.1-mini": (0.40, 1.60, 0.10),
+    "text-embedding-3-small": (0.02, 0.0, 0.02),
+    "text-embedding-3-large": (0.13, 0.0, 0.13),
+    "claude-3-5-haiku": (0.80, 4.00, 0.08),
+    "claude-3-5-sonnet": (3.00, 15.00, 0.30),
+    "claude-3-7-sonnet": (3.00, 15.00, 0.30),
+    "claude-sonnet-4": (3.00, 15.00, 0.30),
+    "claude-3-opus": (15.00, 75.00, 1.50),
+}
+
+# Anthropic bills prompt-cache writes at 1.25x the input price (reads use the cached price above)
+CACHE_WRITE_MULTIPLIER = 1.25
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+
+@dataclass
+class Span:
+    """One timed step: an LLM call (kind="llm") or an extractor step (kind="extract")."""
+    name: str
+    kind: str = "llm"
+    provider: Optional[str] = None
+    model: Optional[str] = None
+    run_id: Optional[str] = None
+    started_at: float = field(default_factory=time.time)
+    seconds: float = 0.0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0         # prompt tokens read from the provider's prompt cache
+    cache_write_tokens: int = 0    # prompt tokens written to it (Anthropic cache_control prefixes)
+    attempts: int = 0              # HTTP requests sent; retries = attempts - 1
+    cache_hit: bool = False        # served from the local response cache, no request made
+    parse_error: bool = False
+    error: Optional[str] = None
+    cost_usd: Optional[float] = None
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def retries(self) -> int:
+        return max(0, self.attempts - 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "retries": self.retries}
+
+
+@dataclass
+class Run:
+    """Spans recorded inside one collect() block (a validation run, an intake turn, ...)."""
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    spans: List[Span] = field(default_factory=list)
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+_current_run: contextvars.ContextVar[Optional[Run]] = contextvars.ContextVar("current_run", default=None)
+_file_lock = threading.Lock()
+
+
+def estimate_cost(model: Optional[str], input_tokens: int, output_tokens: int, cached_tokens: int = 0,
+                  cache_write_tokens: int = 0) -> Optional[float]:
+    """USD for one call, or None for models missing from PRICES_PER_MTOK. input_tokens includes cached ones."""
+    if not model:
+        return None
+    for prefix in sorted(PRICES_PER_MTOK, key=len, reverse=True):
+        if model.startswith(prefix):
+            p_in, p_out, p_cached = PRICES_PER_MTOK[prefix]
+            uncached = max(0, input_tokens - cached_tokens - cache_write_tokens)
+            return round((uncached * p_in + cache_write_tokens * p_in * CACHE_WRITE_MULTIPLIER
+                          + cached_tokens * p_cached + output_tokens * p_out) / 1_000_000, 6)
+    return None
+
+
+def _export(span: Span) -> None:
+    if METRICS_DISABLED:
+        return
+    try:
+        if os.path.dirname(METRICS_PATH):
+            os.makedirs(os.path.dirname(METRICS_PATH), exist_ok=True)
+        line = json.dumps(span.to_dict(), ensure_ascii=False)
+        with _file_lock, open(METRICS_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except OSError:
+        pass   # metrics must never break a run
+
+
+@contextmanager
+def span(name: str, kind: str = "llm", provider: str = None, model: str = None, activate: bool = True,
+         **attrs) -> Iterator[Span]:
+    """
+    Time the enclosed block as a span. Usage and HTTP attempts made inside it are attached
+    automatically (see record_usage and the client hooks); an exception marks the span failed.
+    Pass activate=False inside generators, which must not leave their span current between yields.
+    """
+    run = _current_run.get()
+    s = Span(name=name, kind=kind, provider=provider, model=model, run_id=run.id if run else None, attrs=attrs)
+    token = _current_span.set(s) if activate else None
+    started = time.perf_counter()
+    try:
+        yield s
+    except BaseException as e:
+        if not isinstance(e, GeneratorExit):
+            s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        s.seconds = time.perf_counter() - started
+        if token is not None:
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                pass   # an abandoned generator finalised in another context
+        if s.kind == "llm" and not s.cache_hit:
+            s.cost_usd = estimate_cost(s.model, s.input_tokens, s.output_tokens, s.cached_tokens,
+                                       s.cache_write_tokens)
+        elif s.cache_hit:
+            s.cost_usd = 0.0
+        if run is not None:
+            run.spans.append(s)
+        _export(s)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def use_span(s: Span) -> Iterator[Span]:
+    """Make an inactive span (span(..., activate=False)) current for the enclosed block only."""
+    token = _current_span.set(s)
+    try:
+        yield s
+    finally:
+        _current_span.reset(token)
+
+
+def record_usage(response: Any, target: Optional[Span] = None) -> Any:
+    """
+    Copy token usage from an OpenAI or Anthropic response (or final stream chunk/message)
+    onto target, or the current span. Returns the response so it can wrap a create() call inline.
+    """
+    s = target or _current_span.get()
+    usage = getattr(response, "usage", None)
+    if s is None or usage is None:
+        return response
+    if hasattr(usage, "input_tokens"):   # Anthropic: input_tokens excludes cache reads and writes
+        read = getattr(usage, "cache_read_input_tokens", 0) or 0
+        written = getattr(usage, "cache_creation_input_tokens", 0) or 0
+        s.input_tokens += (usage.input_tokens or 0) + read + written
+        s.output_tokens += usage.output_tokens or 0
+        s.cached_tokens += read
+        s.cache_write_tokens += written
+    else:                                # OpenAI
+        s.input_tokens += getattr(usage, "prompt_tokens", 0) or 0
+        s.output_tokens += getattr(usage, "completion_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        s.cached_tokens += getattr(details, "cached_tokens", 0) or 0
+    if getattr(response, "model", None):
+        s.model = response.model
+    return response
+
+
+# Called by the rate-limited transport (rate_limiter.py) for every request sent, so
+# retries show up as attempts > 1 on the span that made them.
+def count_attempt(request) -> None:
+    s = _current_span.get()
+    if s is not None:
+        s.attempts += 1
+
+
+@contextmanager
+def collect() -> Iterator[Run]:
+    """Gather every span recorded in this block (including worker threads and async tasks started in it)."""
+    run = Run()
+    token = _current_run.set(run)
+    try:
+        yield run
+    finally:
+        _current_run.reset(token)
+
+
+def bind_context(fn):
+    """
+    Bind fn to a copy of the caller's context, for ThreadPoolExecutor.submit(bind_context(fn), ...),
+    so spans recorded in the worker thread reach the caller's run. Bind once per submit.
+    """
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.run(fn, *args, **kwargs)
+
+
+# ---- reporting ----
+def breakdown(spans: Iterable[Any]) -> List[Dict[str, Any]]:
+    """Per-name totals for a run, slowest first (accepts Span objects or exported dicts)."""
+    rows: Dict[str, Dict[str, Any]] = {}
+    for s in spans:
+        d = s.to_dict() if isinstance(s, Span) else s
+        row = rows.setdefault(d["name"], {
+            "step": d["name"], "kind": d["kind"], "model": d.get("model"), "calls": 0, "seconds": 0.0,
+            "input_tokens": 0, "output_tokens": 0, "cached_tokens": 0, "cache_write_tokens": 0, "retries": 0,
+            "cache_hits": 0, "parse_errors": 0, "errors": 0, "cost_usd": 0.0,
+        })
+        row["calls"] += 1
+        row["seconds"] = round(row["seconds"] + d["seconds"], 3)
+        for k in ("input_tokens", "output_tokens", "cached_tokens", "cache_write_tokens", "retries"):
+            row[k] += d.get(k) or 0
+        row["cache_hits"] += bool(d.get("cache_hit"))
+        row["parse_errors"] += bool(d.get("parse_error"))
+        row["errors"] += bool(d.get("error"))
+        row["cost_usd"] = round(row["cost_usd"] + (d.get("cost_usd") or 0.0), 6)
+        row["model"] = row["model"] or d.get("model")
+    return sorted(rows.values(), key=lambda r: r["seconds"], reverse=True)
+
+
+def format_breakdown(spans: Iterable[Any]) -> str:
+    rows = breakdown(spans)
+    lines = [f"{'step':<20}{'calls':>6}{'seconds':>9}{'in tok':>9}{'out tok':>9}{'cached':>8}{'cache wr':>9}"
+             f"{'retries':>8}{'errors':>7}{'cost $':>10}"]
+    for r in rows:
+        lines.append(f"{r['step']:<20}{r['calls']:>6}{r['seconds']:>9.2f}{r['input_tokens']:>9}"
+                     f"{r['output_tokens']:>9}{r['cached_tokens']:>8}{r.get('cache_write_tokens', 0):>9}{r['retries']:>8}"
+                     f"{r['errors'] + r['parse_errors']:>7}{r['cost_usd']:>10.4f}")
+    return "\n".join(lines)
+
+
+def load_spans(path: str = METRICS_PATH) -> List[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def prometheus_text(spans: Iterable[Dict[str, Any]]) -> str:
+    """Prometheus text exposition (counters + latency histogram) aggregated over exported spans."""
+    counters: Dict[str, Dict[tuple, float]] = defaultdict(lambda: defaultdict(float))
+    buckets: Dict[tuple, List[int]] = defaultdict(lambda: [0] * len(LATENCY_BUCKETS))
+    for d in spans:
+        labels = (("step", d["name"]), ("kind", d["kind"]), ("model", d.get("model") or ""))
+        counters["llm_calls_total"][labels] += 1
+        counters["llm_errors_total"][labels] += bool(d.get("error"))
+        counters["llm_parse_failures_total"][labels] += bool(d.get("parse_error"))
+        counters["llm_cache_hits_total"][labels] += bool(d.get("cache_hit"))
+        counters["llm_retries_total"][labels] += d.get("retries") or 0
+        counters["llm_cost_usd_total"][labels] += d.get("cost_usd") or 0.0
+        for kind in ("input", "output", "cached", "cache_write"):
+            counters["llm_tokens_total"][labels + (("type", kind),)] += d.get(f"{kind}_tokens") or 0
+        counters["llm_duration_seconds_sum"][labels] += d["seconds"]
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if d["seconds"] <= bound:
+                buckets[labels][i] += 1
+
+    def fmt(labels) -> str:
+        return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+    out = []
+    for metric, series in counters.items():
+        if metric == "llm_duration_seconds_sum":
+            continue
+        out.append(f"# TYPE {metric} counter")
+        out += [f"{metric}{fmt(labels)} {value:g}" for labels, value in series.items()]
+    out.append("# TYPE llm_duration_seconds histogram")
+    for labels, counts in buckets.items():
+        for bound, count in zip(LATENCY_BUCKETS, counts):
+            out.append(f"llm_duration_seconds_bucket{fmt(labels + (('le', f'{bound:g}'),))} {count}")
+        total = counters["llm_calls_total"][labels]
+        out.append(f"llm_duration_seconds_bucket{fmt(labels + (('le', '+Inf'),))} {total:g}")
+        out.append(f"llm_duration_seconds_sum{fmt(labels)} {counters['llm_duration_seconds_sum'][labels]:g}")
+        out.append(f"llm_duration_seconds_count{fmt(labels)} {total:g}")
+    return "\n".join(out) + "\n"
+
+
+def serve_prometheus(port: int, path: str = METRICS_PATH) -> None:
+    """Serve /metrics from the metrics file, so it covers every process that writes to it."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = prometheus_text(load_spans(path)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    print(f"Serving Prometheus metrics from {path} on http://0.0.0.0:{port}/metrics")
+    ThreadingHTTPServer(("0.0.0.0", port), Handler).serve_forever()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarise or serve the recorded LLM/extractor spans.")
+    parser.add_argument("--serve", type=int, metavar="PORT", help="Serve Prometheus text on this port")
+    parser.add_argument("--run", help="Only show spans from this run id")
+    parser.add_argument("--path", default=METRICS_PATH)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve_prometheus(args.serve, args.path)
+    else:
+        spans = [s for s in load_spans(args.path) if not args.run or s.get("run_id") == args.run]
+        print(format_breakdown(spans) if spans else f"No spans recorded in {args.path}")
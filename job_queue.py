@@ -0,0 +1,433 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import socket
+import sqlite3
+import argparse
+import threading
+import traceback
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import settings  # noqa: F401  (reads .env once per process)
+from artifact_store import INTAKE_DB_PATH
+from instrumentation import collect
+
+# Worker threads started in each process that opens the queue (0 = submit only; run `python job_queue.py`)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# A running job's lease is renewed every LEASE/3 s; if its process dies, another worker picks it up after this
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "30"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "0.5"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(".data", "uploads"))
+
+JOBS_DDL = """
+create table if not exists jobs (
+  id text primary key,
+  kind text not null,
+  key text,
+  session_id text,
+  status text check (status in ('queued','running','done','error')) default 'queued',
+  payload text default '{}',
+  partial text default '{}',
+  result text,
+  error text,
+  attempts integer default 0,
+  lease_owner text,
+  lease_expires real,
+  created_at text,
+  updated_at text
+)
+"""
+JOBS_INDEXES = (
+    "create index if not exists jobs_status_created on jobs (status, created_at)",
+    "create index if not exists jobs_key on jobs (key, status)",
+)
+
+# kind -> handler(payload, report) -> result dict; report(name, value) publishes a partial result
+Handler = Callable[[Dict[str, Any], Callable[[str, Any], None]], Dict[str, Any]]
+HANDLERS: Dict[str, Handler] = {}
+
+
+def handler(kind: str):
+    """Register the function that runs jobs of this kind."""
+    def register(fn: Handler) -> Handler:
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class JobQueue:
+    """
+    Durable local job queue in the intake SQLite database. Jobs are claimed with a lease
+    that the owning process keeps renewing; a job whose process died (or was restarted)
+    becomes claimable again once its lease expires, so work survives page reloads and
+    restarts. Any number of processes (Streamlit instances, `python job_queue.py`
+    workers) can share one database file.
+    """
+
+    def __init__(self, db_path: str = INTAKE_DB_PATH, workers: int = JOB_WORKERS,
+                 lease_seconds: float = JOB_LEASE_SECONDS):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("pragma journal_mode=wal")
+        self._conn.execute("pragma busy_timeout=5000")
+        self._conn.execute(JOBS_DDL)
+        for ddl in JOBS_INDEXES:
+            self._conn.execute(ddl)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.start(workers)
+
+    # ---- producer API ----
+    def submit(self, kind: str, payload: Dict[str, Any], session_id: str = None, key: str = None) -> str:
+        """
+        Queue a job and return its id. With a key, an identical job that is still queued or
+        running is joined instead (double clicks, several users submitting the same idea).
+        """
+        if kind not in HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id, now = str(uuid.uuid4()), _now()
+        with self._lock:
+            self._conn.execute("begin immediate")
+            try:
+                if key:
+                    row = self._conn.execute("select id from jobs where key = ? and status in ('queued','running')",
+                                             (key,)).fetchone()
+                    if row:
+                        self._conn.execute("commit")
+                        return row[0]
+                self._conn.execute(
+                    "insert into jobs (id, kind, key, session_id, payload, created_at, updated_at)"
+                    " values (?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, kind, key, session_id, json.dumps(payload, ensure_ascii=False), now, now))
+                self._conn.execute("commit")
+            except BaseException:
+                self._conn.execute("rollback")
+                raise
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """The job row with payload / partial / result decoded, or None if unknown."""
+        with self._lock:
+            cur = self._conn.execute(
+                "select id, kind, session_id, status, payload, partial, result, error, attempts, created_at, updated_at"
+                " from jobs where id = ?", (job_id,))
+            row = cur.fetchone()
+            if row is None:
+                return None
+            job = dict(zip([c[0] for c in cur.description], row))
+        for k in ("payload", "partial", "result"):
+            job[k] = json.loads(job[k]) if job[k] else None
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("select status, count(*) from jobs group by status").fetchall()
+        return {"queued": 0, "running": 0, "done": 0, "error": 0, **dict(rows)}
+
+    # ---- workers ----
+    def start(self, workers: int) -> None:
+        if workers <= 0 or self._threads:
+            return
+        for i in range(workers):
+            t = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        t = threading.Thread(target=self._heartbeat, name="job-lease", daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop taking jobs; running ones finish (or are re-run elsewhere once their lease lapses)."""
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "update jobs set status = 'running', attempts = attempts + 1, lease_owner = ?, lease_expires = ?,"
+                " updated_at = ? where id = (select id from jobs where status = 'queued'"
+                " or (status = 'running' and lease_expires < ?) order by created_at limit 1)"
+                " returning id, kind, payload, partial, attempts",
+                (self.owner, now + self.lease_seconds, _now(), now)).fetchone()
+        if row is None:
+            return None
+        return {"id": row[0], "kind": row[1], "payload": json.loads(row[2] or "{}"),
+                "partial": json.loads(row[3] or "{}"), "attempts": row[4]}
+
+    def _update(self, job_id: str, sql: str, params: tuple) -> bool:
+        """Write to a job we still own (a job re-claimed after a lapsed lease is left to its new owner)."""
+        with self._lock:
+            cur = self._conn.execute(f"update jobs set {sql}, updated_at = ? where id = ? and lease_owner = ?",
+                                     (*params, _now(), job_id, self.owner))
+        return cur.rowcount > 0
+
+    def _finish(self, job: Dict[str, Any], sql: str, params: tuple) -> None:
+        """Final status for a job we own. Its uploads are deleted only now: a job re-run after
+        its worker died (or its lease lapsed) still needs them."""
+        if self._update(job["id"], sql, params):
+            remove_uploads(job["payload"])
+
+    def _heartbeat(self) -> None:
+        while not self._stop.wait(self.lease_seconds / 3):
+            with self._lock:
+                self._conn.execute("update jobs set lease_expires = ? where lease_owner = ? and status = 'running'",
+                                   (time.time() + self.lease_seconds, self.owner))
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            try:
+                job = self._claim()
+            except sqlite3.Error as e:
+                print(f"⚠️  job queue: claim failed ({e})")
+                job = None
+            if job is None:
+                self._wake.wait(JOB_POLL_SECONDS)
+                self._wake.clear()
+                continue
+            self._run(job)
+
+    def _run(self, job: Dict[str, Any]) -> None:
+        job_id, partial = job["id"], job["partial"]
+        if job["attempts"] > JOB_MAX_ATTEMPTS:
+            self._finish(job, "status = 'error', error = ?",
+                         (f"Gave up after {JOB_MAX_ATTEMPTS} attempts (the worker running it kept stopping)",))
+            return
+
+        def report(name: str, value: Any) -> None:
+            partial[name] = value
+            self._update(job_id, "partial = ?", (json.dumps(partial, ensure_ascii=False),))
+
+        try:
+            with collect() as run:
+                result = HANDLERS[job["kind"]](job["payload"], report)
+            # Spans go along as dicts so the UI can show the time / tokens / cost breakdown
+            result = {**result, "spans": [s.to_dict() for s in run.spans]}
+            self._finish(job, "status = 'done', result = ?", (json.dumps(result, ensure_ascii=False),))
+        except Exception as e:
+            traceback.print_exc()
+            self._finish(job, "status = 'error', error = ?", (f"{type(e).__name__}: {e}",))
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Process-wide queue (and its worker threads), opened on first use."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue()
+    return _queue
+
+
+def save_upload(upload, filename: str) -> Dict[str, str]:
+    """Copy an uploaded file where a worker (in any process) can read it; the job deletes it when done."""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(UPLOAD_DIR, uuid.uuid4().hex + os.path.splitext(filename or "")[1])
+    if hasattr(upload, "seek"):
+        upload.seek(0)
+    with open(path, "wb") as f:
+        shutil.copyfileobj(upload, f)
+    return {"path": path, "name": filename}
+
+
+def remove_uploads(payload: Dict[str, Any]) -> None:
+    """Delete the save_upload() files a job payload refers to (nothing outside UPLOAD_DIR)."""
+    root = os.path.abspath(UPLOAD_DIR)
+    for value in (payload or {}).values():
+        path = value.get("path") if isinstance(value, dict) else None
+        if path and os.path.dirname(os.path.abspath(path)) == root and os.path.exists(path):
+            os.remove(path)
+
+
+# ---- job kinds (heavy modules imported on first run) ----
+
+@handler("intake")
+def run_intake(payload: Dict[str, Any], report: Callable[[str, Any], None]) -> Dict[str, Any]:
+    """Extraction (document / voice note) and the Listener's first pass for app.py."""
+    from extractors import iter_pdf_pages, extract_text_from_docx, transcribe_audio, consolidate_inputs, \
+        ExtractionLimitError
+    from llm_agent import propose_next_step, next_local_question
+    from schema_types import IdeaSchema
+    from artifact_store import get_artifact_store
+    from session_store import get_session_store
+
+    store, sessions, session_id = get_artifact_store(), get_session_store(), payload["session_id"]
+    doc, audio = payload.get("doc"), payload.get("audio")
+    notes, errors, doc_text, audio_text = [], [], "", ""
+    if doc:
+        is_pdf = doc["name"].lower().endswith(".pdf")
+
+        def extract_doc(path: str) -> str:
+            if not is_pdf:
+                return extract_text_from_docx(path)
+            pages = []
+            for _, page_text in iter_pdf_pages(path):
+                pages.append(page_text)
+                report("progress", f"📄 Extracted {len(pages)} pages…")
+            return "\n".join(pages).strip()
+
+        try:
+            with open(doc["path"], "rb") as f:
+                artifact = store.get_or_process(f, doc["name"], extract_doc, session_id=session_id)
+            doc_text = artifact["text_extracted"] or ""
+            sessions.link_artifact(session_id, artifact)
+            if artifact["cached"]:
+                notes.append(f"♻️ {doc['name']}: same file processed before, reused its text.")
+        except ExtractionLimitError as e:
+            errors.append(f"Document not processed: {e}")
+
+    if audio:
+        def transcribe_file(path: str) -> str:
+            with open(path, "rb") as f:
+                return transcribe_audio(
+                    f.read(), filename=audio["name"],
+                    on_progress=lambda done, total: report("progress", f"🎙️ Transcribed {done}/{total} segments…"),
+                )
+
+        try:
+            with open(audio["path"], "rb") as f:
+                artifact = store.get_or_process(f, audio["name"], transcribe_file, session_id=session_id)
+            audio_text = artifact["text_extracted"] or ""
+            sessions.link_artifact(session_id, artifact)
+            if artifact["cached"]:
+                notes.append(f"♻️ {audio['name']}: same recording transcribed before, reused the transcript.")
+        except Exception as e:
+            errors.append(f"Transcription error: {e}")
+
+    agg = consolidate_inputs(payload.get("typed", ""), doc_text, audio_text)
+    sessions.record_message(session_id, "system", agg, {"kind": "intake"})
+    report("progress", "🧠 Listener is structuring your idea…")
+
+    # First LLM pass — try extracting fields & asking the first follow-up (or, batched, every question at once)
+    batch = payload.get("batch_questions", False)
+    schema = IdeaSchema(**(payload.get("schema") or {}))
+    result = propose_next_step(agg, schema, payload.get("chat_history") or [], batch_questions=batch)
+    schema = IdeaSchema(**result.get("current_schema", {}))
+    questions = result.get("questions") or []
+    question, field = result.get("question"), result.get("missing_field")
+    if batch:
+        question, field = None, None
+    elif not question:
+        nxt = next_local_question(schema)
+        question, field = nxt["question"], nxt["missing_field"]
+    sessions.update_schema(session_id, schema.model_dump(), "collecting" if question or questions else "complete")
+    if question:
+        sessions.record_message(session_id, "agent", question, {"kind": "question", "missing_field": field})
+    if questions:
+        sessions.record_message(session_id, "agent", "\n".join(q["question"] for q in questions),
+                                {"kind": "questions", "questions": questions})
+    return {"aggregated_text": agg, "schema": schema.model_dump(), "pending_question": question,
+            "pending_field": field, "pending_questions": questions, "notes": notes, "errors": errors}
+
+
+@handler("followup")
+def run_followup(payload: Dict[str, Any], report: Callable[[str, Any], None]) -> Dict[str, Any]:
+    """
+    One clarification round for app.py: merge the answers into the schema ("consolidate" for a
+    batched round, "delta" for one answer, "full" to re-run the Listener on the whole text),
+    then save the schema and the next question to the session.
+    """
+    from llm_agent import propose_next_step, apply_followup, consolidate_answers
+    from schema_types import IdeaSchema
+    from session_store import get_session_store
+
+    sessions, session_id, mode = get_session_store(), payload["session_id"], payload["mode"]
+    schema = IdeaSchema(**(payload.get("schema") or {}))
+    report("progress", "🧠 Listener is updating your idea…")
+    if mode == "consolidate":
+        result = consolidate_answers(schema, payload["answers"])
+    elif mode == "delta":
+        result = apply_followup(schema, payload["field"], payload["answer"], skipped=payload.get("skipped") or [])
+    else:
+        result = propose_next_step(payload["aggregated_text"], schema, payload.get("chat_history") or [])
+    schema = IdeaSchema(**result.get("current_schema", {}))
+    question, field = result.get("question"), result.get("missing_field")
+    if mode == "consolidate":
+        question, field = None, None
+    sessions.update_schema(session_id, schema.model_dump(), "collecting" if question else "complete")
+    if question:
+        sessions.record_message(session_id, "agent", question, {"kind": "question", "missing_field": field})
+    return {"schema": schema.model_dump(), "pending_question": question, "pending_field": field,
+            "pending_questions": [], "error": result.get("error")}
+
+
+@handler("quick")
+def run_quick(payload: Dict[str, Any], report: Callable[[str, Any], None]) -> Dict[str, Any]:
+    """Listener then Analyst, publishing each top-level field as it streams in."""
+    from llm_agent import stream_next_step
+    from analyst_agent import stream_analyst_agent
+    from schema_types import IdeaSchema
+
+    fresh, started, first = payload.get("bypass_cache", False), time.perf_counter(), []
+
+    def fields(step: str, events) -> Dict[str, Any]:
+        partial, final = {}, {}
+        for kind, value in events:
+            if kind == "field":
+                first.append((time.perf_counter() - started) * 1000)
+                partial[value[0]] = value[1]
+                report(step, partial)
+            elif kind == "done":
+                final = value
+        return final
+
+    listener = fields("listener", stream_next_step(payload["idea"], IdeaSchema(), bypass_cache=fresh))
+    schema_data = listener.get("current_schema") or {}
+    analyst = fields("analyst", stream_analyst_agent(schema_data, bypass_cache=fresh))
+    return {"listener": listener, "analyst": analyst, "first_field_ms": first[0] if first else None,
+            "total_seconds": time.perf_counter() - started}
+
+
+@handler("validate")
+def run_validate(payload: Dict[str, Any], report: Callable[[str, Any], None]) -> Dict[str, Any]:
+    """Full validation: Listener, then Analyst / VC / Critic in parallel (each published as it finishes)."""
+    from orchestrator import validate_parallel
+    results, ran = validate_parallel(payload["idea"], bypass_cache=payload.get("bypass_cache", False),
+                                     on_result=report)
+    return {"results": results, "ran": ran}
+
+
+@handler("revalidate")
+def run_revalidate(payload: Dict[str, Any], report: Callable[[str, Any], None]) -> Dict[str, Any]:
+    """Re-run only the agents whose input fields changed on an edited schema."""
+    from orchestrator import revalidate_parallel
+    results, ran = revalidate_parallel(payload["schema"], bypass_cache=payload.get("bypass_cache", False),
+                                       on_result=report)
+    return {"results": results, "ran": ran}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run job queue workers (Streamlit can then use JOB_WORKERS=0).")
+    parser.add_argument("--workers", type=int, default=max(JOB_WORKERS, 1))
+    args = parser.parse_args()
+
+    jobs = JobQueue(workers=args.workers)
+    print(f"{args.workers} workers on {jobs.db_path} ({jobs.owner}); Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(60)
+            print(jobs.stats())
+    except KeyboardInterrupt:
+        jobs.stop()
@@ -0,0 +1,108 @@
+import re
+import json
+from typing import Any, List, Optional, Tuple
+
+FENCE_RE = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", re.DOTALL)
+TRAILING_COMMA_RE = re.compile(r",(\s*[}\]])")
+MAX_CUT_ATTEMPTS = 64
+
+
+def strip_fences(text: str) -> str:
+    """Body of the first ``` block (closed or not), or the text itself."""
+    m = FENCE_RE.search(text)
+    return m.group(1).strip() if m else text.strip()
+
+
+def _scan(text: str) -> Tuple[List[Tuple[int, str, List[str]]], List[str], bool, bool]:
+    """
+    Walk the JSON text outside strings. Returns the places it could be cut back to
+    (index, char, closers needed there), the closers needed at the end, and whether the
+    text ends inside a string / right after a backslash.
+    """
+    cuts, stack = [], []
+    in_str = esc = False
+    for i, c in enumerate(text):
+        if in_str:
+            if esc:
+                esc = False
+            elif c == "\\":
+                esc = True
+            elif c == '"':
+                in_str = False
+        elif c == '"':
+            in_str = True
+        elif c in "{[":
+            stack.append("}" if c == "{" else "]")
+            cuts.append((i, c, list(stack)))
+        elif c in "}]":
+            if stack:
+                stack.pop()
+        elif c == ",":
+            cuts.append((i, c, list(stack)))
+    return cuts, stack, in_str, esc
+
+
+def _loads(text: str) -> Optional[Any]:
+    try:
+        return json.loads(TRAILING_COMMA_RE.sub(r"\1", text))
+    except json.JSONDecodeError:
+        return None
+
+
+def _close_truncated(text: str) -> Optional[Any]:
+    cuts, stack, in_str, esc = _scan(text)
+    if not stack and not in_str:
+        return None
+
+    # 1) Finish the open string (if any) and close every open bracket
+    tail = text[:-1] if esc else text
+    if in_str:
+        tail += '"'
+    value = _loads(tail + "".join(reversed(stack)))
+    if value is not None:
+        return value
+
+    # 2) Otherwise drop the incomplete last member: cut back to a comma or opening bracket
+    for i, c, needed in reversed(cuts[-MAX_CUT_ATTEMPTS:]):
+        head = text[:i] if c == "," else text[:i + 1]
+        value = _loads(head + "".join(reversed(needed)))
+        if value is not None:
+            return value
+    return None
+
+
+def repair_json(text: str) -> Optional[Any]:
+    """
+    Best-effort local parse of model output that is almost JSON: strips ``` fences and
+    prose around the object, removes trailing commas, and closes JSON cut off by max_tokens
+    (dropping the incomplete last member). Returns None when nothing usable is found.
+    """
+    if not text:
+        return None
+    body = strip_fences(text)
+    starts = [i for i in (body.find("{"), body.find("[")) if i >= 0]
+    if not starts:
+        return None
+    body = body[min(starts):]
+
+    # Complete object followed by prose (or a second object): keep the first one
+    try:
+        value, _ = json.JSONDecoder().raw_decode(body)
+        return value
+    except json.JSONDecodeError:
+        pass
+    value = _loads(body)
+    if value is not None:
+        return value
+    return _close_truncated(body)
+
+
+def loads_lenient(text: str) -> Any:
+    """json.loads, falling back to repair_json; raises ValueError if both fail."""
+    try:
+        return json.loads(text)
+    except (TypeError, json.JSONDecodeError):
+        value = repair_json(text or "")
+        if value is None:
+            raise ValueError("No JSON object could be recovered from the model output")
+        return value
@@ -1,12 +1,17 @@
-import os
 import json
 from typing import Dict, Any, List
-from openai import OpenAI
 from schema_types import IdeaSchema
+from llm_cache import cached_call
+from clients import get_openai_client
+from streaming import stream_openai_chat
+from context_compactor import compact_context
+from output_models import ListenerOutput, ListenerQuestions, FollowupDelta, openai_tool, coerce, validator
+from structured_output import STRUCTURED_OUTPUT, StructuredOutputError
+from model_router import route
 
 def get_client():
-    """Return a fresh OpenAI client using the env var."""
-    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    """Return the shared, lazily-created OpenAI client (pooled connections)."""
+    return get_openai_client()
 
 SYSTEM = """You are the Idea Validation & Enrichment Agent.
 Your job is to take a startup idea (typed, doc, or audio) and map it into the IdeaSchema below.
@@ -21,86 +26,236 @@ idea_title, one_liner, problem, target_customer, solution, business_model,
 pricing, gtm, competition, moat, key_risks.
 """
 
-TOOL_DEF = [{
-    "type": "function",
-    "function": {
-        "name": "emit_followup_or_schema",
-        "description": "Either ask next follow-up or return final schema when complete.",
-        "parameters": {
-            "type": "object",
-            "properties": {
-                "status": {"type": "string", "enum": ["need_followup", "complete"]},
-                "question": {"type": "string", "description": "Ask only if need_followup"},
-                "missing_field": {"type": "string", "description": "Schema key the question targets"},
-                "current_schema": {"type": "object"}
-            },
-            "required": ["status", "current_schema"]
-        }
-    }
-}]
+# Batched intake: the same first pass also returns every clarifying question, ranked
+QUESTIONS_RULES = """
+Also return "questions": one short question for EVERY field that is empty or marked "(please confirm)",
+most important first (problem, target_customer, solution and business_model before the rest).
+Each item is {"field": <IdeaSchema key>, "question": str}.
+"""
 
-def _messages(aggregated_text: str, current_schema: Dict[str, Any], chat_history: List[Dict[str, str]]) -> List[Dict[str, str]]:
-    base = [
-        {"role": "system", "content": SYSTEM},
-        {"role": "user", "content": f"Aggregated input:\n\n{aggregated_text}\n\nCurrent schema (JSON):\n{json.dumps(current_schema, ensure_ascii=False)}"}
-    ]
-    for m in chat_history[-8:]:
-        base.append(m)
-    return base
+# Structured output: the Listener fills the schema through a forced function call
+LISTENER_TOOL = openai_tool("emit_idea_schema", "Return the filled-in IdeaSchema.", ListenerOutput)
+LISTENER_QUESTIONS_TOOL = openai_tool("emit_idea_schema", "Return the filled-in IdeaSchema and the clarifying questions.",
+                                      ListenerQuestions)
+FOLLOWUP_TOOL = openai_tool("emit_followup", "Return the updated field and the next question.", FollowupDelta)
+CONSOLIDATE_TOOL = openai_tool("emit_idea_schema", "Return the fields updated from the answers.", ListenerOutput)
 
-def propose_next_step(aggregated_text: str, schema_obj: IdeaSchema, chat_history: List[Dict[str, str]]):
-    client = get_client()
+def _request(aggregated_text: str, batch_questions: bool = False) -> Dict[str, Any]:
+    # Large uploads are compacted to the most schema-relevant chunks so the prompt stays bounded
     messages = [
-        {"role": "system", "content": SYSTEM},
-        {"role": "user", "content": aggregated_text}
+        {"role": "system", "content": SYSTEM + (QUESTIONS_RULES if batch_questions else "")},
+        {"role": "user", "content": compact_context(aggregated_text)}
     ]
-    resp = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages,
-        temperature=0.7
-    )
+    tool = LISTENER_QUESTIONS_TOOL if batch_questions else LISTENER_TOOL
+    return dict(model="gpt-4o-mini", messages=messages, temperature=0.7, **(tool if STRUCTURED_OUTPUT else {}))
 
-    try:
-        content = resp.choices[0].message.content
-        schema_data = json.loads(content)   # expect JSON
-        return {
+def _to_step(content: str, schema_obj: IdeaSchema, batch_questions: bool = False) -> Dict[str, Any]:
+    schema_data, error = coerce(content, ListenerQuestions if batch_questions else ListenerOutput)   # repairs fences / truncation locally
+    if schema_data is not None:
+        questions = schema_data.pop("questions", None)
+        step = {
             "status": "complete",
             "current_schema": schema_data
         }
-    except Exception as e:
-        return {
-            "status": "complete",
-            "current_schema": schema_obj.model_dump(),
-            "error": f"Could not parse schema: {e}"
-        }
+        if batch_questions:
+            step["questions"] = rank_questions(IdeaSchema(**schema_data), questions or [])
+        return step
+    step = {
+        "status": "complete",
+        "current_schema": schema_obj.model_dump(),
+        "error": f"Could not parse schema: {error}"
+    }
+    if batch_questions:
+        step["questions"] = local_questions(schema_obj)
+    return step
 
-    args = json.loads(tool_call.function.arguments or "{}")
-    current = args.get("current_schema", {})
-    schema_new = IdeaSchema(**{k: v for k, v in current.items() if k in IdeaSchema.model_fields})
+def stream_next_step(aggregated_text: str, schema_obj: IdeaSchema, bypass_cache: bool = False):
+    """
+    Streaming variant of propose_next_step: yields ("token", text), ("field", (key, value))
+    for each schema field as it completes, then ("done", <propose_next_step result>).
+    """
+    yield from stream_openai_chat(_request(aggregated_text), lambda text: _to_step(text, schema_obj), bypass_cache,
+                                  name="listener", validate=validator(ListenerOutput))
 
-    return {
-        "status": "complete",   # 🔑 always complete
-        "current_schema": schema_new.model_dump()
-    }
+def propose_next_step(aggregated_text: str, schema_obj: IdeaSchema, chat_history: List[Dict[str, str]],
+                      bypass_cache: bool = False, batch_questions: bool = False):
+    """
+    The Listener's pass over the input. With batch_questions=True the same call also returns
+    "questions": a ranked [{"field", "question"}] covering every field that still needs input,
+    so the whole clarification round costs one more call (consolidate_answers) instead of one per field.
+    """
+    request = _request(aggregated_text, batch_questions)
+    output_model = ListenerQuestions if batch_questions else ListenerOutput
+    try:
+        content = cached_call(
+            {"provider": "openai", **request},
+            lambda: route("listener", "openai", request, output_model),
+            bypass=bypass_cache, validate=validator(output_model), name="listener",
+        )
+    except StructuredOutputError as e:
+        content = e.raw   # never validated: _to_step reports it, nothing is cached
+    return _to_step(content, schema_obj, batch_questions)
 
-    args = json.loads(tool_call.function.arguments or "{}")
-    current = args.get("current_schema", {})
-    schema_new = IdeaSchema(**{k: v for k, v in current.items() if k in IdeaSchema.model_fields})
+FOLLOWUP_SYSTEM = """You are the Idea Validation & Enrichment Agent, updating ONE field of an existing IdeaSchema.
+You get the current schema, the field being clarified and the user's latest answer.
 
-    return {
-        "status": "complete",
-        "current_schema": schema_new.model_dump()
+Rules:
+- Rewrite only that field, using the answer (keep it concise, drop "(please confirm)" if the answer settles it).
+- If the answer is a skip or "don't know", keep a best guess and mark it "(please confirm)".
+- Then pick the most important field that is still empty or marked "(please confirm)" and ask ONE short question about it.
+- Output ONLY valid JSON: {"field": str, "value": str, "question": str|null, "missing_field": str|null}
+"""
+
+def _followup_request(schema_obj: IdeaSchema, missing_field: str, answer: str) -> Dict[str, Any]:
+    # Compact JSON and no transcript: the prompt size depends on the schema only, not the uploads
+    payload = {
+        "schema": {k: v for k, v in schema_obj.model_dump().items() if v},
+        "field": missing_field,
+        "answer": answer,
     }
+    return dict(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": FOLLOWUP_SYSTEM},
+            {"role": "user", "content": json.dumps(payload, ensure_ascii=False, separators=(",", ":"))},
+        ],
+        temperature=0.3,
+        max_tokens=400,
+        **(FOLLOWUP_TOOL if STRUCTURED_OUTPUT else {}),
+    )
+
+def _fields_to_clarify(schema_obj: IdeaSchema, skipped: List[str] = ()) -> List[str]:
+    """Missing required fields first, then fields marked "(please confirm)"."""
+    fields = schema_obj.missing_required_fields() + schema_obj.fields_to_confirm()
+    return [f for f in dict.fromkeys(fields) if f not in skipped]
+
+def _local_question(schema_obj: IdeaSchema, field: str) -> str:
+    info = IdeaSchema.model_fields[field]
+    topic = (info.description or field.replace("_", " ")).rstrip(".")
+    current = getattr(schema_obj, field)
+    if current:
+        return f"We assumed \"{current}\" for {field.replace('_', ' ')}. Is that right? ({topic})"
+    return f"Could you tell us more about: {topic.lower()}?"
+
+def next_local_question(schema_obj: IdeaSchema, skipped: List[str] = ()) -> Dict[str, Any]:
+    """
+    Pick the next field to clarify without an LLM call: missing required fields first,
+    then fields marked "(please confirm)". Returns {"question", "missing_field"} (both None when done).
+    """
+    for field in _fields_to_clarify(schema_obj, skipped):
+        return {"question": _local_question(schema_obj, field), "missing_field": field}
+    return {"question": None, "missing_field": None}
+
+def local_questions(schema_obj: IdeaSchema, skipped: List[str] = ()) -> List[Dict[str, str]]:
+    """Every question next_local_question would ask, in order, as [{"field", "question"}] (no LLM call)."""
+    return [{"field": f, "question": _local_question(schema_obj, f)} for f in _fields_to_clarify(schema_obj, skipped)]
+
+def rank_questions(schema_obj: IdeaSchema, questions: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """
+    The model's ranked questions, kept only for real fields that still need input (one per field,
+    required fields first); any such field the model left out gets a local question at the end.
+    """
+    needed = _fields_to_clarify(schema_obj)
+    required = set(schema_obj.missing_required_fields())
+    ranked: Dict[str, str] = {}
+    for q in sorted(questions, key=lambda q: q.get("field") not in required):   # stable: keeps the model's order
+        if q.get("field") in needed and q.get("question") and q["field"] not in ranked:
+            ranked[q["field"]] = q["question"].strip()
+    ranked.update({f: _local_question(schema_obj, f) for f in needed if f not in ranked})
+    return [{"field": f, "question": q} for f, q in ranked.items()]
+
+def apply_followup(schema_obj: IdeaSchema, missing_field: str, answer: str, skipped: List[str] = (),
+                   bypass_cache: bool = False) -> Dict[str, Any]:
+    """
+    Delta follow-up turn: send only the current schema, the targeted field and the new answer,
+    then merge the returned field into the schema locally. Same return shape as propose_next_step.
+    """
+    request = _followup_request(schema_obj, missing_field, answer)
+    try:
+        content = cached_call(
+            {"provider": "openai", **request},
+            lambda: route("followup", "openai", request, FollowupDelta),
+            bypass=bypass_cache, validate=validator(FollowupDelta), name="followup",
+        )
+    except StructuredOutputError as e:
+        content = e.raw
+
+    merged = schema_obj.model_dump()
+    result: Dict[str, Any] = {"status": "need_followup"}
+    delta, error = coerce(content, FollowupDelta)
+    if delta is not None:
+        field = delta.get("field") or missing_field
+        if field in IdeaSchema.model_fields and delta.get("value") is not None:
+            merged[field] = str(delta["value"])
+        result["question"] = delta.get("question")
+        result["missing_field"] = delta.get("missing_field")
+    else:
+        # Keep the user's words rather than losing the turn
+        if missing_field in IdeaSchema.model_fields:
+            merged[missing_field] = answer
+        result["error"] = f"Could not parse follow-up delta: {error}"
 
-    args = json.loads(tool_call.function.arguments or "{}")
-    current = args.get("current_schema", {})
-    schema_new = IdeaSchema(**{k: v for k, v in current.items() if k in IdeaSchema.model_fields})
-    status = args.get("status", "need_followup")
-    question = args.get("question")
-    missing_field = args.get("missing_field")
-    return {
-        "status": status,
-        "question": question,
-        "missing_field": missing_field,
-        "current_schema": schema_new.model_dump()
+    schema_new = IdeaSchema(**merged)
+    # Only trust the model's next question if it targets a real field that still needs input
+    if result.get("missing_field") not in IdeaSchema.model_fields or result["missing_field"] in skipped:
+        result.update(next_local_question(schema_new, skipped))
+    if not result.get("question"):
+        result["status"] = "complete"
+    result["current_schema"] = schema_new.model_dump()
+    return result
+
+CONSOLIDATE_SYSTEM = """You are the Idea Validation & Enrichment Agent, merging a founder's answers into an existing IdeaSchema.
+You get the current schema and {field: answer} for every clarifying question asked (null = skipped).
+
+Rules:
+- Rewrite each answered field from its answer (keep it concise, drop "(please confirm)" if the answer settles it).
+- For a skipped field keep a best guess and mark it "(please confirm)".
+- Change another field only if an answer clearly contradicts it.
+- Output ONLY valid JSON with the fields you changed (IdeaSchema keys); leave every other key out.
+"""
+
+def _consolidate_request(schema_obj: IdeaSchema, answers: Dict[str, Any]) -> Dict[str, Any]:
+    payload = {
+        "schema": {k: v for k, v in schema_obj.model_dump().items() if v},
+        "answers": answers,
     }
+    return dict(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": CONSOLIDATE_SYSTEM},
+            {"role": "user", "content": json.dumps(payload, ensure_ascii=False, separators=(",", ":"))},
+        ],
+        temperature=0.3,
+        max_tokens=1200,
+        **(CONSOLIDATE_TOOL if STRUCTURED_OUTPUT else {}),
+    )
+
+def consolidate_answers(schema_obj: IdeaSchema, answers: Dict[str, Any], bypass_cache: bool = False) -> Dict[str, Any]:
+    """
+    Merge the answers to a batch of questions ({field: answer, or None when skipped}) into the
+    schema with one call. Same return shape as propose_next_step; fields still needing input are
+    not asked about again (the round is over), they stay visible in the schema.
+    """
+    answers = {f: (a.strip() if isinstance(a, str) and a.strip() else None)
+               for f, a in answers.items() if f in IdeaSchema.model_fields}
+    merged = schema_obj.model_dump()
+    result: Dict[str, Any] = {"status": "complete"}
+    if any(answers.values()):
+        request = _consolidate_request(schema_obj, answers)
+        try:
+            content = cached_call(
+                {"provider": "openai", **request},
+                lambda: route("consolidate", "openai", request, ListenerOutput),
+                bypass=bypass_cache, validate=validator(ListenerOutput), name="consolidate",
+            )
+        except StructuredOutputError as e:
+            content = e.raw
+        updates, error = coerce(content, ListenerOutput)
+        if updates is not None:
+            merged.update({k: str(v) for k, v in updates.items() if v is not None})
+        else:
+            # Keep the founder's words rather than losing the round
+            merged.update({f: a for f, a in answers.items() if a})
+            result["error"] = f"Could not parse consolidated answers: {error}"
+    result["current_schema"] = IdeaSchema(**merged).model_dump()
+    return result
@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Optional
+
+import settings  # noqa: F401  (reads .env once per process)
+from instrumentation import span
+
+# Where responses are stored and how long they stay valid (override in .env)
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm_cache.sqlite3"))
+CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+CACHE_DISABLED = os.getenv("LLM_CACHE_DISABLED", "").lower() in ("1", "true", "yes")
+
+
+def make_key(**parts: Any) -> str:
+    """Content address for a request: sha256 over the canonical JSON of its parts
+    (provider, model, system, messages, temperature, max_tokens, ...)."""
+    blob = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed response cache with TTL expiry and LRU eviction by entry count."""
+
+    def __init__(self, path: str = CACHE_PATH, ttl_seconds: float = CACHE_TTL_SECONDS,
+                 max_entries: int = CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("pragma journal_mode=wal")
+        self._conn.execute(
+            "create table if not exists responses ("
+            " key text primary key,"
+            " value text not null,"
+            " created_at real not null,"
+            " last_access real not null)"
+        )
+        self._conn.execute("create index if not exists responses_last_access on responses (last_access)")
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("select value, created_at from responses where key = ?", (key,)).fetchone()
+            if row is None or (self.ttl_seconds > 0 and now - row[1] > self.ttl_seconds):
+                if row is not None:
+                    self._conn.execute("delete from responses where key = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute("update responses set last_access = ? where key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "insert or replace into responses (key, value, created_at, last_access) values (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            # Keep only the most recently used max_entries rows
+            self._conn.execute(
+                "delete from responses where key in ("
+                " select key from responses order by last_access desc limit -1 offset ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("delete from responses")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("select count(*) from responses").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": entries,
+            "path": self.path,
+        }
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ResponseCache:
+    """Process-wide cache instance, opened on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
+
+
+def cached_call(key_parts: Dict[str, Any], fetch: Callable[[], str], bypass: bool = False,
+                validate: Optional[Callable[[str], bool]] = None, name: str = None, kind: str = "llm") -> str:
+    """
+    Return the cached response text for key_parts, or call fetch() and store its result.
+    bypass=True always calls the provider (the fresh answer still refreshes the cache).
+    validate lets callers refuse to cache (or replay) unusable output, e.g. output_models.validator(Model).
+    The call is recorded as an instrumentation span called name (default: the provider).
+    """
+    with _span(key_parts, name, kind) as s:
+        if CACHE_DISABLED:
+            return _checked(s, fetch(), validate)
+        cache = get_cache()
+        key = make_key(**key_parts)
+        if not bypass:
+            hit = cache.get(key)
+            if hit is not None and (validate is None or validate(hit)):   # entries stored before a stricter check
+                s.cache_hit = True
+                return hit
+        text = _checked(s, fetch(), validate)
+        if not s.parse_error:
+            cache.set(key, text)
+        return text
+
+
+async def cached_call_async(key_parts: Dict[str, Any], fetch, bypass: bool = False,
+                            validate: Optional[Callable[[str], bool]] = None, name: str = None,
+                            kind: str = "llm") -> str:
+    """Async twin of cached_call; fetch is a zero-arg coroutine function."""
+    with _span(key_parts, name, kind) as s:
+        if CACHE_DISABLED:
+            return _checked(s, await fetch(), validate)
+        cache = get_cache()
+        key = make_key(**key_parts)
+        if not bypass:
+            hit = cache.get(key)
+            if hit is not None and (validate is None or validate(hit)):   # entries stored before a stricter check
+                s.cache_hit = True
+                return hit
+        text = _checked(s, await fetch(), validate)
+        if not s.parse_error:
+            cache.set(key, text)
+        return text
+
+
+def _span(key_parts: Dict[str, Any], name: Optional[str], kind: str):
+    provider = key_parts.get("provider")
+    return span(name or provider or "llm", kind=kind, provider=provider, model=key_parts.get("model"))
+
+
+def _checked(s, text: str, validate: Optional[Callable[[str], bool]]) -> str:
+    """Flag output that fails validate() on the span (cached_call then skips storing it)."""
+    if validate is not None and not validate(text):
+        s.parse_error = True
+    return text
+
+
+def is_json(text: str) -> bool:
+    try:
+        json.loads(text)
+        return True
+    except Exception:
+        return False
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or clear the LLM response cache.")
+    parser.add_argument("--clear", action="store_true")
+    args = parser.parse_args()
+
+    if args.clear:
+        get_cache().clear()
+    print(json.dumps(get_cache().stats(), indent=2))
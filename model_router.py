@@ -0,0 +1,287 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+import settings  # noqa: F401  (reads .env once per process)
+from clients import get_sync_client, get_async_client
+from instrumentation import current_span, bind_context
+from structured_output import call_structured, call_structured_async, claude_output, openai_output
+
+# Ordered "provider:model" candidates per agent; the agent's own model is always tried first.
+# MODEL_ROUTES='{"critic": ["anthropic:claude-3-5-sonnet-20240620", "openai:gpt-4o"]}'
+MODEL_ROUTES: Dict[str, List[str]] = json.loads(os.getenv("MODEL_ROUTES") or "{}")
+# Used for agents not listed above: the other provider's model
+DEFAULT_FALLBACKS = {
+    "anthropic": os.getenv("ANTHROPIC_FALLBACK_MODEL", "openai:gpt-4o"),
+    "openai": os.getenv("OPENAI_FALLBACK_MODEL", "anthropic:claude-3-5-haiku-20241022"),
+}
+# Hedging is opt-in: a hedge pays for a second full request, so it only goes to a candidate listed for
+# the agent in MODEL_ROUTES (never to DEFAULT_FALLBACKS, never to the same model again)
+HEDGING = os.getenv("ROUTER_HEDGING", "0").lower() in ("1", "true", "yes")
+HEDGE_PERCENTILE = float(os.getenv("ROUTER_HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("ROUTER_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_INITIAL_DELAY = float(os.getenv("ROUTER_HEDGE_INITIAL_DELAY", "30"))   # until a model has enough samples
+HEDGE_MIN_DELAY = float(os.getenv("ROUTER_HEDGE_MIN_DELAY", "1"))
+LATENCY_WINDOW = int(os.getenv("ROUTER_LATENCY_WINDOW", "200"))
+FAILURE_COOLDOWN = float(os.getenv("ROUTER_FAILURE_COOLDOWN", "30"))
+ANTHROPIC_DEFAULT_MAX_TOKENS = 2048
+
+API_KEY_ENV = {"openai": ("OPENAI_API_KEY",), "anthropic": ("CLAUDE_API_KEY", "ANTHROPIC_API_KEY")}
+
+_hedge_pool = ThreadPoolExecutor(max_workers=int(os.getenv("ROUTER_THREADS", "32")), thread_name_prefix="route")
+
+
+class LatencyTracker:
+    """Recent successful-call latencies for one model (sliding window) and its failure cool-down."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.samples: deque = deque(maxlen=window)
+        self.failed_until = 0.0
+        self.calls = self.errors = self.hedges_won = 0
+
+    def percentile(self, p: float) -> Optional[float]:
+        if len(self.samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class ModelRouter:
+    """
+    Per-agent ordered candidate models. A call goes to the first healthy candidate. Errors,
+    including replies that never validate against the output model, fail over to the next
+    candidate at once and put the model on a short cool-down so following calls start elsewhere.
+    With ROUTER_HEDGING=1, a call that has not answered by that model's observed p95 is hedged
+    to the next candidate explicitly routed for the agent, and the first answer wins.
+    """
+
+    def __init__(self, routes: Dict[str, List[str]] = None):
+        self.routes = MODEL_ROUTES if routes is None else routes
+        self._lock = threading.Lock()
+        self._trackers: Dict[str, LatencyTracker] = {}
+
+    def tracker(self, candidate: str) -> LatencyTracker:
+        with self._lock:
+            return self._trackers.setdefault(candidate, LatencyTracker())
+
+    def candidates(self, agent: str, provider: str, model: str) -> List[str]:
+        primary = f"{provider}:{model}"
+        listed = self.routes.get(agent) or [DEFAULT_FALLBACKS[provider]]
+        order = [primary] + [c for c in listed if c != primary]
+        order = [c for c in order if c == primary or _has_key(c.split(":", 1)[0])]
+        now = time.monotonic()
+        # Cooling-down models go last (still tried if nothing else is left)
+        return sorted(order, key=lambda c: self.tracker(c).failed_until > now)
+
+    def hedge_delay(self, candidate: str) -> Optional[float]:
+        if not HEDGING:
+            return None
+        p = self.tracker(candidate).percentile(HEDGE_PERCENTILE)
+        return HEDGE_INITIAL_DELAY if p is None else max(HEDGE_MIN_DELAY, p)
+
+    def _next_hedge(self, agent: str, queue: List[str], running: Dict[Any, Tuple[str, float]]) -> Optional[float]:
+        """
+        Seconds to wait before hedging to queue[0], or None (wait for the running attempt): only an
+        explicitly routed candidate is hedged to, timed by the p95 of the attempt actually in flight.
+        """
+        if not queue or queue[0] not in (self.routes.get(agent) or ()):
+            return None
+        return self.hedge_delay(next(iter(running.values()))[0])
+
+    def _succeeded(self, candidate: str, seconds: float) -> None:
+        t = self.tracker(candidate)
+        with self._lock:
+            t.calls += 1
+            t.samples.append(seconds)
+
+    def _failed(self, candidate: str) -> None:
+        t = self.tracker(candidate)
+        with self._lock:
+            t.calls += 1
+            t.errors += 1
+            t.failed_until = time.monotonic() + FAILURE_COOLDOWN
+
+    def _winner(self, candidate: str, hedged: bool, failovers: int) -> None:
+        s = current_span()
+        if s is not None:
+            s.attrs["routed_to"] = candidate
+            if hedged:
+                s.attrs["hedged"] = True
+            if failovers:
+                s.attrs["failovers"] = failovers
+        if hedged:
+            t = self.tracker(candidate)
+            with self._lock:
+                t.hedges_won += 1
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            items = list(self._trackers.items())
+        return [{"model": c, "calls": t.calls, "errors": t.errors, "hedges_won": t.hedges_won,
+                 "p50_s": _round(t.percentile(50)), "p95_s": _round(t.percentile(95))} for c, t in items]
+
+    # ---- sync ----
+    def route(self, agent: str, provider: str, kwargs: Dict[str, Any], output_model: Type[BaseModel]) -> str:
+        """call_structured over the agent's candidates with hedging and failover (kwargs in `provider` format)."""
+        queue = self.candidates(agent, provider, kwargs["model"])
+        running: Dict[Any, Tuple[str, float]] = {}
+        hedged, failovers, last_error = False, 0, None
+
+        def launch(candidate: str) -> None:
+            fut = _hedge_pool.submit(bind_context(_attempt), candidate, provider, kwargs, output_model)
+            running[fut] = (candidate, time.monotonic())
+
+        launch(queue.pop(0))
+        while running:
+            delay = None if hedged else self._next_hedge(agent, queue, running)
+            done, _ = wait(list(running), timeout=delay, return_when=FIRST_COMPLETED)
+            if not done:
+                hedged = True
+                launch(queue.pop(0))
+                continue
+            for fut in done:
+                candidate, started = running.pop(fut)
+                if fut.exception() is None:
+                    self._succeeded(candidate, time.monotonic() - started)
+                    self._winner(candidate, hedged and len(running) + len(done) > 1, failovers)
+                    return fut.result()   # a losing hedge finishes in the background; its result is dropped
+                self._failed(candidate)
+                last_error = fut.exception()
+                if queue:
+                    failovers += 1
+                    launch(queue.pop(0))
+        raise last_error
+
+    # ---- async ----
+    async def route_async(self, agent: str, provider: str, kwargs: Dict[str, Any],
+                          output_model: Type[BaseModel]) -> str:
+        """Async twin of route(); the losing hedge is cancelled."""
+        queue = self.candidates(agent, provider, kwargs["model"])
+        running: Dict[asyncio.Task, Tuple[str, float]] = {}
+        hedged, failovers, last_error = False, 0, None
+
+        def launch(candidate: str) -> None:
+            task = asyncio.ensure_future(_attempt_async(candidate, provider, kwargs, output_model))
+            running[task] = (candidate, time.monotonic())
+
+        launch(queue.pop(0))
+        try:
+            while running:
+                delay = None if hedged else self._next_hedge(agent, queue, running)
+                done, _ = await asyncio.wait(list(running), timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    launch(queue.pop(0))
+                    continue
+                for task in done:
+                    candidate, started = running.pop(task)
+                    if task.exception() is None:
+                        self._succeeded(candidate, time.monotonic() - started)
+                        self._winner(candidate, hedged and len(running) + len(done) > 1, failovers)
+                        return task.result()
+                    self._failed(candidate)
+                    last_error = task.exception()
+                    if queue:
+                        failovers += 1
+                        launch(queue.pop(0))
+            raise last_error
+        finally:
+            for task in running:
+                task.cancel()
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 3)
+
+
+def _has_key(provider: str) -> bool:
+    return any(os.getenv(name) for name in API_KEY_ENV.get(provider, ()))
+
+
+# ---- request translation between the two SDKs' chat formats ----
+
+def _text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    return "\n\n".join(b.get("text", "") for b in content or [] if isinstance(b, dict))
+
+
+def to_openai(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Anthropic messages.create kwargs -> chat.completions.create kwargs (cache_control is dropped)."""
+    system = _text(kwargs.get("system") or "")
+    out = dict(messages=([{"role": "system", "content": system}] if system else [])
+               + [{"role": m["role"], "content": _text(m["content"])} for m in kwargs["messages"]])
+    for key in ("max_tokens", "temperature"):
+        if key in kwargs:
+            out[key] = kwargs[key]
+    if kwargs.get("tools"):
+        out["tools"] = [{"type": "function", "function": {"name": t["name"], "description": t.get("description", ""),
+                                                          "parameters": t["input_schema"]}} for t in kwargs["tools"]]
+        choice = kwargs.get("tool_choice") or {}
+        if choice.get("type") == "tool":
+            out["tool_choice"] = {"type": "function", "function": {"name": choice["name"]}}
+    return out
+
+
+def to_anthropic(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """chat.completions.create kwargs -> Anthropic messages.create kwargs."""
+    system = "\n\n".join(m["content"] for m in kwargs["messages"] if m["role"] == "system")
+    out = dict(max_tokens=kwargs.get("max_tokens") or ANTHROPIC_DEFAULT_MAX_TOKENS,
+               messages=[m for m in kwargs["messages"] if m["role"] != "system"])
+    if system:
+        out["system"] = system
+    if "temperature" in kwargs:
+        out["temperature"] = min(1.0, kwargs["temperature"])
+    if kwargs.get("tools"):
+        out["tools"] = [{"name": t["function"]["name"], "description": t["function"].get("description", ""),
+                         "input_schema": t["function"]["parameters"]} for t in kwargs["tools"]]
+        choice = kwargs.get("tool_choice") or {}
+        if choice.get("type") == "function":
+            out["tool_choice"] = {"type": "tool", "name": choice["function"]["name"]}
+    return out
+
+
+def _request_for(candidate: str, provider: str, kwargs: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    target, model = candidate.split(":", 1)
+    if target != provider:
+        kwargs = to_openai(kwargs) if target == "openai" else to_anthropic(kwargs)
+    return target, {**kwargs, "model": model}
+
+
+def _create(target: str, client) -> Callable[[Dict[str, Any]], Any]:
+    if target == "anthropic":
+        return lambda kw: client.messages.create(**kw)
+    return lambda kw: client.chat.completions.create(**kw)
+
+
+def _extract(target: str):
+    return claude_output if target == "anthropic" else openai_output
+
+
+def _attempt(candidate: str, provider: str, kwargs: Dict[str, Any], output_model: Type[BaseModel]) -> str:
+    target, request = _request_for(candidate, provider, kwargs)
+    return call_structured(request, output_model, _create(target, get_sync_client(target)), _extract(target))
+
+
+async def _attempt_async(candidate: str, provider: str, kwargs: Dict[str, Any], output_model: Type[BaseModel]) -> str:
+    target, request = _request_for(candidate, provider, kwargs)
+    return await call_structured_async(request, output_model, _create(target, get_async_client(target)),
+                                       _extract(target))
+
+
+ROUTER = ModelRouter()
+
+
+def route(agent: str, provider: str, kwargs: Dict[str, Any], output_model: Type[BaseModel]) -> str:
+    return ROUTER.route(agent, provider, kwargs, output_model)
+
+
+async def route_async(agent: str, provider: str, kwargs: Dict[str, Any], output_model: Type[BaseModel]) -> str:
+    return await ROUTER.route_async(agent, provider, kwargs, output_model)
@@ -0,0 +1,348 @@
+import os
+import re
+import json
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import settings  # noqa: F401  (reads .env once per process)
+from extractors import iter_pdf_pages, iter_docx_blocks
+from vector_store import VectorStore, Hit, hash_embed, HASH_DIM
+from instrumentation import span, record_usage, bind_context
+from llm_cache import cached_call
+
+# Python side of the n8n NEET workflows (NEET_FileLoader_v0 ingests study material into a vector
+# store, XmPrepDB_Agent answers questions from it), with a local index instead of Pinecone.
+RAG_INDEX_DIR = os.getenv("RAG_INDEX_DIR", os.path.join(".data", "neet_index"))
+RAG_EMBEDDER = os.getenv("RAG_EMBEDDER", "hash")          # "hash" (local, free) or "openai"
+OPENAI_EMBED_MODEL = os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small")
+NEET_MODEL = os.getenv("NEET_MODEL", "gpt-4.1-mini")      # the model the n8n agents use
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "128"))
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "4"))
+# Chunks are built from whole paragraphs / PDF lines: at least CHUNK_MIN_CHARS, at most CHUNK_MAX_CHARS.
+# Where a chunk ends depends only on nearby content, so an edit re-chunks (and re-embeds) only
+# the chunks around it instead of shifting every chunk after it.
+CHUNK_MIN_CHARS = int(os.getenv("CHUNK_MIN_CHARS", "500"))
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "1500"))
+CHUNK_BOUNDARY_ODDS = 4    # after CHUNK_MIN_CHARS, about one paragraph in 4 ends a chunk
+SUPPORTED = (".pdf", ".docx", ".txt", ".md")
+# Ingest reads whole textbooks from disk, so it has its own extraction budgets instead of the
+# upload limits the intake applies to what users attach in the app.
+RAG_MAX_FILE_BYTES = int(os.getenv("RAG_MAX_FILE_BYTES", str(1024 * 1024 * 1024)))
+RAG_MAX_PDF_PAGES = int(os.getenv("RAG_MAX_PDF_PAGES", "100000"))
+RAG_MAX_TEXT_BYTES = int(os.getenv("RAG_MAX_TEXT_BYTES", str(512 * 1024 * 1024)))
+
+SYSTEM = """You are a NEET exam preparation assistant.
+Answer the question using the numbered study-material excerpts when they are relevant, and cite
+them like [1]. If the excerpts do not cover the question, answer from general knowledge and say so."""
+
+
+# ---- embedding backends ----
+
+class HashEmbedder:
+    """Local, deterministic embeddings (vector_store.hash_embed): no API calls, no cost."""
+    name = "hash"
+
+    def __init__(self, dim: int = HASH_DIM):
+        self.dim = dim
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return np.stack([hash_embed(t, self.dim) for t in texts]) if texts else np.zeros((0, self.dim), np.float32)
+
+
+class OpenAIEmbedder:
+    """OpenAI embeddings, one request per batch (what the n8n Embeddings OpenAI node calls)."""
+
+    def __init__(self, model: str = OPENAI_EMBED_MODEL, dim: int = None):
+        self.model = model
+        self.name = f"openai-{model}"
+        self.dim = dim or {"text-embedding-3-large": 3072}.get(model, 1536)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        from clients import get_openai_client
+        with span("embed", provider="openai", model=self.model, texts=len(texts)):
+            resp = record_usage(get_openai_client().embeddings.create(model=self.model, input=texts))
+        vectors = np.array([d.embedding for d in sorted(resp.data, key=lambda d: d.index)], dtype=np.float32)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+BACKENDS = {"hash": HashEmbedder, "openai": OpenAIEmbedder}
+
+
+def get_embedder(name: str = RAG_EMBEDDER):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedder {name!r} (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[name]()
+
+
+# ---- chunking ----
+
+@dataclass
+class Chunk:
+    text: str
+    page: Optional[int] = None
+
+    @property
+    def hash(self) -> str:
+        return hashlib.sha256(re.sub(r"\s+", " ", self.text).strip().encode("utf-8")).hexdigest()[:32]
+
+
+def iter_blocks(path: str) -> Iterator[Tuple[str, Optional[int]]]:
+    """(paragraph or line, page number) in document order, via the same extractors the intake uses."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".pdf":
+        for page, text in iter_pdf_pages(path, max_pages=RAG_MAX_PDF_PAGES, max_text_bytes=RAG_MAX_TEXT_BYTES,
+                                         max_bytes=RAG_MAX_FILE_BYTES):
+            for line in text.splitlines():
+                if line.strip():
+                    yield line.strip(), page
+    elif ext == ".docx":
+        for block in iter_docx_blocks(path, max_text_bytes=RAG_MAX_TEXT_BYTES, max_bytes=RAG_MAX_FILE_BYTES):
+            yield block, None
+    else:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for para in re.split(r"\n\s*\n", f.read()):
+                if para.strip():
+                    yield para.strip(), None
+
+
+def _boundary(block: str) -> bool:
+    return hashlib.blake2b(block.encode("utf-8"), digest_size=2).digest()[0] % CHUNK_BOUNDARY_ODDS == 0
+
+
+def chunk_blocks(blocks: Iterable[Tuple[str, Optional[int]]], min_chars: int = CHUNK_MIN_CHARS,
+                 max_chars: int = CHUNK_MAX_CHARS) -> List[Chunk]:
+    """Content-defined chunks: cut after a 'boundary' block once past min_chars, or at max_chars."""
+    chunks, parts, size, page = [], [], 0, None
+
+    def flush():
+        nonlocal parts, size, page
+        if parts:
+            chunks.append(Chunk("\n".join(parts), page))
+        parts, size, page = [], 0, None
+
+    for text, block_page in blocks:
+        while len(text) > max_chars:   # one huge paragraph: hard-split it on its own
+            flush()
+            cut = text.rfind(" ", 0, max_chars)
+            cut = cut if cut > max_chars // 2 else max_chars
+            chunks.append(Chunk(text[:cut].strip(), block_page))
+            text = text[cut:].strip()
+        if size and size + len(text) > max_chars:
+            flush()
+        if not parts:
+            page = block_page
+        parts.append(text)
+        size += len(text) + 1
+        if size >= min_chars and _boundary(text):
+            flush()
+    flush()
+    return chunks
+
+
+# ---- index ----
+
+@dataclass
+class IngestReport:
+    files_seen: int = 0
+    files_skipped: int = 0       # unchanged since the last ingest (size + mtime + hash)
+    files_removed: int = 0
+    chunks_total: int = 0
+    chunks_embedded: int = 0     # the only ones that cost an embedding call
+    chunks_reused: int = 0       # same text seen elsewhere: vector copied
+    chunks_removed: int = 0
+    errors: List[str] = field(default_factory=list)
+
+
+class NeetIndex:
+    """
+    Incremental document index. A file is re-read only if its size/mtime/hash changed; its
+    chunks are keyed by content hash, so only chunks whose text is new get embedded (in
+    batches), vanished chunks are tombstoned, and everything else is left in place.
+    """
+
+    def __init__(self, root: str = RAG_INDEX_DIR, embedder=None):
+        self.embedder = embedder or get_embedder()
+        self.store = VectorStore(os.path.join(root, self.embedder.name), dim=self.embedder.dim)
+        self._manifest_path = os.path.join(self.store.path, "manifest.json")
+        self._lock = threading.Lock()
+
+    def _manifest(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self._manifest_path):
+            return {}
+        with open(self._manifest_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_manifest(self, manifest: Dict[str, Dict[str, Any]]) -> None:
+        with open(self._manifest_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(self._manifest_path + ".tmp", self._manifest_path)
+
+    def ingest(self, paths: Iterable[str], prune: bool = False) -> IngestReport:
+        """
+        Index files and directories (recursively). With prune=True, files that were indexed
+        under the given directories but no longer exist are removed from the index.
+        """
+        report = IngestReport()
+        files, roots = [], []
+        for p in paths:
+            if os.path.isdir(p):
+                roots.append(os.path.abspath(p))
+                for dirpath, _, names in os.walk(p):
+                    files += [os.path.join(dirpath, n) for n in sorted(names) if n.lower().endswith(SUPPORTED)]
+            else:
+                files.append(p)
+        with self._lock, span("rag_ingest", kind="extract") as s:
+            manifest = self._manifest()
+            for path in files:
+                report.files_seen += 1
+                try:
+                    self._ingest_file(os.path.abspath(path), manifest, report)
+                except Exception as e:
+                    report.errors.append(f"{path}: {e}")
+            if prune:
+                for source in [m for m in manifest if any(m.startswith(r + os.sep) for r in roots)]:
+                    if not os.path.exists(source):
+                        report.chunks_removed += self._remove_source(source, manifest)
+                        report.files_removed += 1
+            self._save_manifest(manifest)
+            s.attrs.update(embedded=report.chunks_embedded, reused=report.chunks_reused)
+        return report
+
+    def _ingest_file(self, source: str, manifest: Dict[str, Dict[str, Any]], report: IngestReport) -> None:
+        stat = os.stat(source)
+        seen = manifest.get(source)
+        if seen and seen["size"] == stat.st_size and seen["mtime"] == stat.st_mtime:
+            report.files_skipped += 1
+            report.chunks_total += len(seen["chunks"])
+            return
+        with open(source, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        if seen and seen["sha256"] == digest:   # touched, not changed
+            seen.update(size=stat.st_size, mtime=stat.st_mtime)
+            report.files_skipped += 1
+            report.chunks_total += len(seen["chunks"])
+            return
+
+        chunks = {c.hash: c for c in chunk_blocks(iter_blocks(source))}
+        old = set(seen["chunks"]) if seen else set()
+        new = [h for h in chunks if h not in old]
+        gone = [f"{source}#{h}" for h in old if h not in chunks]
+
+        known = self._by_hash() if new else {}
+        ids, vectors, metas, to_embed = [], [], [], []
+        for h in new:
+            ids.append(f"{source}#{h}")
+            metas.append({"source": source, "page": chunks[h].page, "text": chunks[h].text})
+            vector = self._known_vector(known.get(h, ()))
+            if vector is not None:
+                report.chunks_reused += 1
+            else:
+                to_embed.append(len(vectors))
+            vectors.append(vector)
+        for i, vector in zip(to_embed, self._embed([chunks[new[i]].text for i in to_embed])):
+            vectors[i] = vector
+        report.chunks_embedded += len(to_embed)
+        if ids:
+            self.store.add(ids, np.stack(vectors), metas)
+        if gone:
+            self.store.remove(gone)
+        report.chunks_removed += len(gone)
+        report.chunks_total += len(chunks)
+        manifest[source] = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": digest, "chunks": list(chunks)}
+
+    def _known_vector(self, ids: Iterable[str]) -> Optional[np.ndarray]:
+        """The vector of the same chunk text already embedded for another file (copied, not re-embedded)."""
+        for id in ids:
+            vector = self.store.vector(id)
+            if vector is not None:
+                return vector
+        return None
+
+    def _by_hash(self) -> Dict[str, List[str]]:
+        """Live row ids grouped by chunk hash."""
+        index: Dict[str, List[str]] = {}
+        for id in self.store.ids():
+            index.setdefault(id.rsplit("#", 1)[1], []).append(id)
+        return index
+
+    def _embed(self, texts: List[str]) -> List[np.ndarray]:
+        """Embed in EMBED_BATCH_SIZE batches, EMBED_WORKERS at a time; returns vectors in order."""
+        if not texts:
+            return []
+        batches = [texts[i:i + EMBED_BATCH_SIZE] for i in range(0, len(texts), EMBED_BATCH_SIZE)]
+        if len(batches) == 1 or EMBED_WORKERS <= 1:
+            results = [self.embedder.embed(b) for b in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=EMBED_WORKERS) as pool:
+                results = list(pool.map(lambda b: bind_context(self.embedder.embed)(b), batches))
+        return [v for batch in results for v in batch]
+
+    def _remove_source(self, source: str, manifest: Dict[str, Dict[str, Any]]) -> int:
+        ids = [f"{source}#{h}" for h in manifest.pop(source)["chunks"]]
+        self.store.remove(ids)
+        return len(ids)
+
+    def search(self, query: str, k: int = 5) -> List[Hit]:
+        return self.store.search(self.embedder.embed([query])[0], k=k)
+
+
+def _context(hits: List[Hit]) -> str:
+    lines = []
+    for i, h in enumerate(hits, start=1):
+        where = os.path.basename(h.meta["source"]) + (f", p. {h.meta['page']}" if h.meta.get("page") else "")
+        lines.append(f"[{i}] ({where})\n{h.meta['text']}")
+    return "\n\n".join(lines)
+
+
+def answer(question: str, index: NeetIndex = None, k: int = 5, bypass_cache: bool = False) -> Dict[str, Any]:
+    """Retrieve the top-k chunks and answer from them (XmPrepDB_Agent without the vector DB round trip)."""
+    from clients import get_openai_client
+    index = index or NeetIndex()
+    hits = index.search(question, k=k)
+    request = dict(model=NEET_MODEL, temperature=0.2, messages=[
+        {"role": "system", "content": SYSTEM},
+        {"role": "user", "content": f"Study material:\n{_context(hits) or '(none found)'}\n\nQuestion: {question}"},
+    ])
+
+    def fetch():
+        resp = record_usage(get_openai_client().chat.completions.create(**request))
+        return resp.choices[0].message.content or ""
+
+    text = cached_call({"provider": "openai", **request}, fetch, bypass=bypass_cache, name="neet_answer")
+    return {"answer": text, "sources": [{"source": h.meta["source"], "page": h.meta.get("page"),
+                                         "score": round(h.score, 3)} for h in hits]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local NEET study-material index: ingest, search, ask.")
+    parser.add_argument("--embedder", default=RAG_EMBEDDER, choices=sorted(BACKENDS))
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("ingest", help="Index files/directories; only new or changed chunks are embedded")
+    p.add_argument("paths", nargs="+")
+    p.add_argument("--prune", action="store_true", help="Drop indexed files that were deleted from these directories")
+    p = sub.add_parser("search")
+    p.add_argument("query")
+    p.add_argument("-k", type=int, default=5)
+    p = sub.add_parser("ask")
+    p.add_argument("question")
+    p.add_argument("-k", type=int, default=5)
+    p = sub.add_parser("compact", help="Rewrite the index without removed chunks")
+    args = parser.parse_args()
+
+    index = NeetIndex(embedder=get_embedder(args.embedder))
+    if args.command == "ingest":
+        print(json.dumps(index.ingest(args.paths, prune=args.prune).__dict__, indent=2))
+    elif args.command == "search":
+        for h in index.search(args.query, k=args.k):
+            print(f"{h.score:.3f}  {os.path.basename(h.meta['source'])} p.{h.meta.get('page') or '-'}  "
+                  f"{h.meta['text'][:100]!r}")
+    elif args.command == "ask":
+        print(json.dumps(answer(args.question, index, k=args.k), indent=2, ensure_ascii=False))
+    else:
+        print(f"Dropped {index.store.compact()} stale rows")
@@ -1,14 +1,32 @@
 import os
 import json
-from dotenv import load_dotenv
+import asyncio
+import argparse
 
-# Load .env (OPENAI_API_KEY, CLAUDE_API_KEY)
-load_dotenv()
+import settings  # noqa: F401  (reads .env once per process)
 
 # Import your agents
 from llm_agent import propose_next_step   # Listener Agent
 from schema_types import IdeaSchema
-from analyst_agent import run_analyst_agent   # Analyst Agent
+from analyst_agent import run_analyst_agent_async   # Analyst Agent
+from vc_agent import run_vc_agent_async         # VC Agent
+from critic_agent import run_critic_agent_async # Critic Agent
+from clients import aclose_clients
+from agent_dag import VALIDATION_DAG
+from instrumentation import collect, format_breakdown
+from single_flight import FLIGHTS, flight_key
+from prompt_prefix import warm_prefix_async
+
+# Downstream agents that can be fanned out after the Listener
+PARALLEL_AGENTS = {
+    "analyst": run_analyst_agent_async,
+    "vc": run_vc_agent_async,
+    "critic": run_critic_agent_async,
+}
+
+# Per-agent timeout in seconds (override globally via AGENT_TIMEOUT, or per call)
+DEFAULT_TIMEOUT = float(os.getenv("AGENT_TIMEOUT", "120"))
+
 
 def run_orchestrator(raw_idea: str):
     print("\n===== Listener Agent (Intake) =====")
@@ -23,14 +41,162 @@ def run_orchestrator(raw_idea: str):
     print(json.dumps(schema_data, indent=2))
 
     print("\n===== Analyst Agent (Research + Validation) =====")
-    # Step 2: Analyst Agent validates schema
-    analyst_report = run_analyst_agent(schema_data)
+    # Step 2: Analyst Agent validates schema, through the same DAG as the parallel path: an unchanged
+    # schema reuses the memoized report, a near-duplicate idea the similar one
+    async def analyst():
+        try:
+            reports, _ = await VALIDATION_DAG.run_async(schema_data, ["analyst"])
+            return reports["analyst"]
+        finally:
+            await aclose_clients()
+    analyst_report = asyncio.run(analyst())
 
     print(json.dumps(analyst_report, indent=2))
 
     return schema_data, analyst_report
 
 
+async def _run_with_timeout(name: str, coro, timeout: float) -> dict:
+    """Await one agent; a timeout or exception becomes an error dict instead of failing the run."""
+    try:
+        return await asyncio.wait_for(coro, timeout=timeout)
+    except asyncio.TimeoutError:
+        return {"error": f"{name} agent timed out after {timeout:g}s"}
+    except Exception as e:
+        return {"error": f"{name} agent failed: {e}"}
+
+
+async def run_orchestrator_async(raw_idea: str, agents=tuple(PARALLEL_AGENTS), timeouts: dict = None,
+                                 bypass_cache: bool = False, on_result=None) -> dict:
+    """
+    Listener first, then Analyst / VC / Critic concurrently.
+    Returns {"listener": schema, "<agent>": report, ...}; failed agents carry {"error": ...}.
+    bypass_cache=True skips the response cache lookup for every call in the run.
+    on_result(name, output) is called as each step finishes (partial results for the job queue).
+    Identical concurrent runs (same normalized idea and settings) share one execution; each
+    caller's on_result still sees every step, including those finished before it joined.
+    """
+    results, _ = await _validate_shared(raw_idea, agents, timeouts, bypass_cache, on_result)
+    return results
+
+
+async def _validate_shared(raw_idea: str, agents, timeouts: dict, bypass_cache: bool, on_result=None):
+    """(results, [agents that ran]) of the one execution shared by identical concurrent runs."""
+    key = flight_key(raw_idea, pipeline="validate", agents=sorted(agents), timeouts=timeouts or {},
+                     bypass_cache=bypass_cache)
+
+    def publish(name, output):
+        FLIGHTS.publish(key, (name, output))
+
+    shared, _ = await FLIGHTS.do_async(key, lambda: _validate_async(raw_idea, agents, timeouts, bypass_cache,
+                                                                    publish),
+                                       on_event=(lambda event: on_result(*event)) if on_result else None)
+    return shared
+
+
+async def _validate_async(raw_idea: str, agents, timeouts: dict, bypass_cache: bool, on_result=None):
+    timeouts = timeouts or {}
+
+    # Step 1: Listener (sync OpenAI client) runs in a worker thread so the loop stays free
+    listener_output = await _run_with_timeout(
+        "listener",
+        asyncio.to_thread(propose_next_step, raw_idea, IdeaSchema(), [], bypass_cache),
+        timeouts.get("listener", DEFAULT_TIMEOUT),
+    )
+    if "current_schema" not in listener_output:
+        return {"listener": listener_output}, []
+    schema_data = listener_output["current_schema"]
+    if on_result:
+        on_result("listener", schema_data)
+
+    # Step 2: fan out the downstream agents on the same schema
+    reports, ran = await _run_dag(schema_data, agents, timeouts, bypass_cache, on_result)
+
+    results = {"listener": schema_data}
+    results.update(reports)
+    return results, ran
+
+
+async def _run_dag(schema_data: dict, agents, timeouts: dict, bypass_cache: bool, on_result=None):
+    timeouts = timeouts or {}
+    names = [a for a in agents if a in VALIDATION_DAG.nodes]
+    # Write the shared Claude prompt prefix once before the agents fan out (see prompt_prefix)
+    await warm_prefix_async(schema_data, names if bypass_cache else VALIDATION_DAG.stale(schema_data, names))
+
+    async def guarded(name, coro):
+        output = await _run_with_timeout(name, coro, timeouts.get(name, DEFAULT_TIMEOUT))
+        if on_result:
+            on_result(name, output)
+        return output
+
+    return await VALIDATION_DAG.run_async(schema_data, names, bypass_cache=bypass_cache, wrap=guarded)
+
+
+def revalidate_parallel(schema_data: dict, agents=tuple(PARALLEL_AGENTS), timeouts: dict = None,
+                        bypass_cache: bool = False, on_result=None):
+    """
+    Re-run the downstream agents on an edited schema. Each agent only re-runs if one of the
+    fields it reads (see agent_dag.VALIDATION_DAG) changed; the others return their last result.
+    Returns ({"listener": schema, "<agent>": report, ...}, [agents that re-ran]).
+    """
+    async def main():
+        try:
+            return await _run_dag(schema_data, agents, timeouts, bypass_cache, on_result)
+        finally:
+            await aclose_clients()
+    reports, ran = asyncio.run(main())
+    return {"listener": schema_data, **reports}, ran
+
+
+def validate_parallel(raw_idea: str, agents=tuple(PARALLEL_AGENTS), timeouts: dict = None,
+                      bypass_cache: bool = False, on_result=None):
+    """
+    Blocking entry point for the job queue workers (no running event loop there).
+    Returns ({"listener": schema, "<agent>": report, ...}, [agents that actually ran]); agents
+    whose inputs match a past run return their memoized report and are not listed.
+    """
+    async def main():
+        try:
+            return await _validate_shared(raw_idea, agents, timeouts, bypass_cache, on_result)
+        finally:
+            await aclose_clients()
+    return asyncio.run(main())
+
+
+def run_orchestrator_parallel(raw_idea: str, agents=tuple(PARALLEL_AGENTS), timeouts: dict = None,
+                              bypass_cache: bool = False, on_result=None) -> dict:
+    """Blocking entry point for the CLI: validate_parallel's results only."""
+    results, _ = validate_parallel(raw_idea, agents, timeouts, bypass_cache, on_result)
+    return results
+
+
 if __name__ == "__main__":
-    idea = "I want to build a microsaas product Greetings Generator so that anyone can send customized greetings instead of readymade ones."
-    schema, report = run_orchestrator(idea)
+    parser = argparse.ArgumentParser(description="Run the idea validation pipeline.")
+    parser.add_argument("idea", nargs="?",
+                        default="I want to build a microsaas product Greetings Generator so that anyone can send customized greetings instead of readymade ones.")
+    parser.add_argument("--parallel", action="store_true", help="Listener, then Analyst/VC/Critic concurrently")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Per-agent timeout in seconds")
+    parser.add_argument("--report", help="Also write a report to this path: .docx, .md or .html (with --parallel)")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the LLM response cache for this run")
+    args = parser.parse_args()
+
+    with collect() as run:
+        if not args.parallel:
+            schema, report = run_orchestrator(args.idea)
+        else:
+            timeouts = {name: args.timeout for name in ("listener", *PARALLEL_AGENTS)}
+            results = run_orchestrator_parallel(args.idea, timeouts=timeouts, bypass_cache=args.no_cache)
+    if args.parallel:
+        for name, output in results.items():
+            print(f"\n===== {name.title()} Agent =====")
+            print(json.dumps(output, indent=2, ensure_ascii=False))
+
+        if args.report and "analyst" in results:
+            from report_generator import generate_report
+            fmt = os.path.splitext(args.report)[1].lstrip(".").lower()
+            generate_report(results["listener"], results.get("analyst", {}), results.get("vc", {}),
+                            results.get("critic", {}), {}, out_file=args.report,
+                            fmt=fmt if fmt in ("md", "html") else "docx")
+
+    print("\n===== Time, tokens and cost =====")
+    print(format_breakdown(run.spans))
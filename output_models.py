@@ -0,0 +1,167 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
+
+from schema_types import IdeaSchema
+from json_repair import loads_lenient
+
+# Agents sometimes answer a "string" field with a list or an object; accept all three
+Text = Union[str, List[Any], Dict[str, Any]]
+
+
+class ListenerOutput(IdeaSchema):
+    """The Listener's filled-in IdeaSchema."""
+    model_config = ConfigDict(extra="ignore")
+
+
+class ClarifyingQuestion(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    field: str = Field(..., description="IdeaSchema key the question is about")
+    question: str = Field(..., description="One short question for the founder")
+
+
+class ListenerQuestions(ListenerOutput):
+    """The Listener's IdeaSchema plus every clarifying question at once (batched intake)."""
+    questions: List[ClarifyingQuestion] = Field(
+        default_factory=list, description="One question per empty or \"(please confirm)\" field, most important first")
+
+    @field_validator("questions", mode="before")
+    @classmethod
+    def _question_items(cls, v):
+        # A malformed question is dropped (a local one replaces it) rather than failing the schema
+        return [q for q in v if isinstance(q, dict)] if isinstance(v, list) else []
+
+
+class FollowupDelta(BaseModel):
+    """One clarified field plus the next question (delta follow-up turns)."""
+    model_config = ConfigDict(extra="ignore")
+
+    field: Optional[str] = Field(None, description="IdeaSchema key that was updated")
+    value: Optional[str] = Field(None, description="New value for that field")
+    question: Optional[str] = Field(None, description="Next clarifying question, or null when done")
+    missing_field: Optional[str] = Field(None, description="IdeaSchema key the next question targets")
+
+
+class AnalystReport(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    market: Text = Field(..., description="Market overview: size, demand, recent trends")
+    competition: Text = Field(..., description="Top players and gaps")
+    business_model: Text = Field(..., description="Is the business model realistic?")
+    opportunities: Text = Field(..., description="Key opportunities")
+    risks: Text = Field(..., description="Key risks")
+    improvements: Text = Field(..., description="Suggested improvements")
+
+
+class VCReport(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    scalability: Text = Field(..., description="How big and scalable can this get")
+    revenue_potential: Text = Field(..., description="Directional TAM/SAM/SOM or realistic revenue paths")
+    unit_economics: Text = Field(..., description="Pricing logic, CAC/LTV intuition, margins, payback")
+    risks: List[str] = Field(..., description="Top 3-6 risks")
+    fundability_score: int = Field(..., ge=1, le=5, description="1=unfundable, 5=highly fundable")
+    rationale: str = Field(..., description="Short justification for the score")
+
+    @field_validator("risks", mode="before")
+    @classmethod
+    def _risks_list(cls, v):
+        return [v] if isinstance(v, str) else v
+
+    @field_validator("fundability_score", mode="before")
+    @classmethod
+    def _clamp_score(cls, v):
+        try:
+            return min(5, max(1, int(round(float(v)))))
+        except (TypeError, ValueError):
+            return v
+
+
+class MitigationItem(BaseModel):
+    issue: str
+    actions: List[str] = Field(default_factory=list)
+
+
+class Mitigation(BaseModel):
+    items: List[MitigationItem] = Field(default_factory=list)
+
+
+SEVERITY_KEYS = ("gtm", "regulatory", "technical", "operational", "data_privacy")
+
+
+class CriticReport(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    regulatory: Text = Field(..., description="Compliance / IP / platform-policy issues")
+    technical: Text = Field(..., description="Core build risks, scalability, reliability, cost")
+    gtm: Text = Field(..., description="Distribution, differentiation, pricing, retention")
+    operational: Text = Field(..., description="Support, localization, seasonality, staffing")
+    data_privacy: Text = Field(..., description="PII handling, content ownership, data residency")
+    severity_ranking: List[str] = Field(..., description=f"Keys in descending severity, from {list(SEVERITY_KEYS)}")
+    mitigation: Mitigation = Field(default_factory=Mitigation)
+
+    @field_validator("severity_ranking")
+    @classmethod
+    def _known_keys(cls, v):
+        return [k for k in v if k in SEVERITY_KEYS]
+
+
+def _inline_refs(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Resolve $ref/$defs so the schema is self-contained for both providers' tool formats."""
+    defs = schema.get("$defs", {})
+
+    def resolve(node):
+        if isinstance(node, dict):
+            if "$ref" in node:
+                return resolve(defs[node["$ref"].split("/")[-1]])
+            return {k: resolve(v) for k, v in node.items() if k not in ("$defs", "title")}
+        if isinstance(node, list):
+            return [resolve(v) for v in node]
+        return node
+
+    return resolve(schema)
+
+
+def json_schema(model: Type[BaseModel]) -> Dict[str, Any]:
+    return _inline_refs(model.model_json_schema())
+
+
+def anthropic_tool(name: str, description: str, model: Type[BaseModel]) -> Dict[str, Any]:
+    """Tool definition + forced tool_choice kwargs for messages.create."""
+    return dict(
+        tools=[{"name": name, "description": description, "input_schema": json_schema(model)}],
+        tool_choice={"type": "tool", "name": name},
+    )
+
+
+def openai_tool(name: str, description: str, model: Type[BaseModel]) -> Dict[str, Any]:
+    """Function definition + forced tool_choice kwargs for chat.completions.create."""
+    return dict(
+        tools=[{"type": "function",
+                "function": {"name": name, "description": description, "parameters": json_schema(model)}}],
+        tool_choice={"type": "function", "function": {"name": name}},
+    )
+
+
+def coerce(text: str, model: Type[BaseModel]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Parse (repairing locally if needed) and validate model output.
+    Returns (data, None) on success or (None, reason) for a targeted retry / error report.
+    """
+    try:
+        data = loads_lenient(text)
+    except ValueError as e:
+        return None, str(e)
+    if not isinstance(data, dict):
+        return None, f"Expected a JSON object, got {type(data).__name__}"
+    try:
+        return model.model_validate(data).model_dump(exclude_none=False), None
+    except ValidationError as e:
+        problems = "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()[:8])
+        return None, f"Output failed validation: {problems}"
+
+
+def validator(model: Type[BaseModel]) -> Callable[[str], bool]:
+    """validate= predicate for the response cache: only replies that pass `model` are stored (or replayed)."""
+    return lambda text: coerce(text, model)[0] is not None
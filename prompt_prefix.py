@@ -0,0 +1,127 @@
+import os
+import json
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import settings  # noqa: F401  (reads .env once per process)
+from output_models import AnalystReport, VCReport, CriticReport, anthropic_tool
+from structured_output import STRUCTURED_OUTPUT
+from instrumentation import span, record_usage
+
+# cache_control markers on the shared prefix (set ANTHROPIC_PROMPT_CACHE=0 to send the same layout unmarked)
+PROMPT_CACHE = os.getenv("ANTHROPIC_PROMPT_CACHE", "1").lower() not in ("0", "false", "no")
+EPHEMERAL = {"type": "ephemeral"}
+
+# Agent -> (title used in its brief, forced tool name, tool description, output model)
+PANEL = {
+    "analyst": ("Analyst Agent", "emit_analysis", "Return the market validation analysis.", AnalystReport),
+    "vc": ("VC Agent", "emit_vc_assessment", "Return the VC feasibility assessment.", VCReport),
+    "critic": ("Critic Agent", "emit_critique", "Return the structured critique.", CriticReport),
+}
+
+PREAMBLE = """You are one agent on a three-agent panel that validates startup ideas.
+Each request says which agent you are acting as; follow only that agent's brief below.
+The idea is given as IdeaSchema JSON: the fields every agent sees follow these briefs,
+and any further fields for your role are in the user message."""
+
+
+def canonical_json(data: Dict[str, Any]) -> str:
+    """Stable text for a schema block: same content, same bytes (key order and spacing fixed)."""
+    return json.dumps(data, sort_keys=True, ensure_ascii=False, indent=1)
+
+
+@lru_cache(maxsize=1)
+def panel_brief() -> str:
+    """Preamble plus every agent's system prompt, identical for all three agents and all ideas."""
+    import analyst_agent, vc_agent, critic_agent   # imported late: those modules import this one
+    systems = {"analyst": analyst_agent.SYSTEM, "vc": vc_agent.SYSTEM, "critic": critic_agent.SYSTEM}
+    return PREAMBLE + "".join(f"\n\n## {PANEL[name][0]}\n{systems[name].strip()}" for name in PANEL)
+
+
+@lru_cache(maxsize=1)
+def shared_fields() -> Tuple[str, ...]:
+    """
+    IdeaSchema fields every validation agent is shown: the intersection of the agent_dag.VALIDATION_DAG
+    field sets, in the first agent's order. Only these can go in the block the three agents share
+    without changing what each one reads.
+    """
+    from agent_dag import VALIDATION_DAG   # imported late: agent_dag imports the agents, which import this
+    first, *rest = (node.fields for node in VALIDATION_DAG.nodes.values())
+    return tuple(f for f in first if all(f in fields for fields in rest))
+
+
+@lru_cache(maxsize=1)
+def panel_tools() -> List[Dict[str, Any]]:
+    """All three output tools, in a fixed order: tools come first in the cached prefix, so they must match."""
+    return [anthropic_tool(tool, description, model)["tools"][0] for _, tool, description, model in PANEL.values()]
+
+
+def _block(text: str) -> Dict[str, Any]:
+    return {"type": "text", "text": text, **({"cache_control": EPHEMERAL} if PROMPT_CACHE else {})}
+
+
+def panel_request(agent: str, schema_json: Dict[str, Any], model: str, max_tokens: int,
+                  temperature: Optional[float] = None) -> Dict[str, Any]:
+    """
+    messages.create kwargs for one panel agent. Cached prefix, in the order Anthropic caches it:
+    tools -> panel brief (breakpoint 1, same for every idea) -> shared schema fields
+    (breakpoint 2, same for the three agents of one idea). The agent's own fields and the
+    instruction follow uncached.
+    """
+    title, tool, _, _ = PANEL[agent]
+    # An empty schema has nothing to split (agent_dag requests one for each signature while building the DAG)
+    shared_keys = shared_fields() if schema_json else ()
+    shared = {f: schema_json.get(f) for f in shared_keys if f in schema_json}
+    own = {k: v for k, v in schema_json.items() if k not in shared_keys}
+    user_prompt = f"""You are acting as the {title}.
+
+Further IdeaSchema fields for your review:
+{canonical_json(own)}
+
+Return ONLY the JSON object with the exact fields described in the {title} brief."""
+    kwargs = dict(
+        model=model,
+        max_tokens=max_tokens,
+        system=[_block(panel_brief()), _block("IdeaSchema:\n" + canonical_json(shared))],
+        messages=[{"role": "user", "content": user_prompt}],
+    )
+    if temperature is not None:
+        kwargs["temperature"] = temperature
+    if STRUCTURED_OUTPUT:
+        kwargs.update(tools=panel_tools(), tool_choice={"type": "tool", "name": tool})
+    return kwargs
+
+
+def _agent_request(agent: str, schema_json: Dict[str, Any]) -> Dict[str, Any]:
+    import analyst_agent, vc_agent, critic_agent
+    return {"analyst": analyst_agent, "vc": vc_agent, "critic": critic_agent}[agent]._request_kwargs(schema_json)
+
+
+async def warm_prefix_async(schema_json: Dict[str, Any], agents) -> None:
+    """
+    Anthropic can serve a cached prefix only once the response that wrote it has started, so
+    agents sent together would each pay to write it. When two or more panel agents on the same
+    model are about to run concurrently, send the prefix once with max_tokens=1 first; they then
+    all read it. Failures are ignored: this only saves cost.
+    """
+    if not PROMPT_CACHE:
+        return
+    by_model: Dict[str, List[Dict[str, Any]]] = {}
+    for agent in agents:
+        if agent in PANEL:
+            kwargs = _agent_request(agent, schema_json)
+            by_model.setdefault(kwargs["model"], []).append(kwargs)
+    from clients import get_async_anthropic_client
+    for model, requests in by_model.items():
+        if len(requests) < 2:
+            continue
+        kwargs = requests[0]
+        prime = dict(model=model, max_tokens=1, system=kwargs["system"],
+                     messages=[{"role": "user", "content": "Reply with OK."}])
+        if "tools" in kwargs:
+            prime["tools"] = kwargs["tools"]
+        with span("prefix_warmup", provider="anthropic", model=model):
+            try:
+                record_usage(await get_async_anthropic_client().messages.create(**prime))
+            except Exception:
+                pass
@@ -0,0 +1,467 @@
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+import settings  # noqa: F401  (reads .env once per process)
+from instrumentation import count_attempt, current_span
+
+# Process-wide limits for every provider call (override in .env).
+# LLM_RATE_LIMITS='{"anthropic": {"rpm": 50, "tpm": 40000}, "openai/gpt-4o-mini": {"rpm": 500, "tpm": 200000}}'
+# Providers/models not listed take their limits from the rate-limit headers of the first response.
+RATE_LIMITS: Dict[str, Dict[str, float]] = json.loads(os.getenv("LLM_RATE_LIMITS") or "{}")
+RATE_LIMIT_DISABLED = os.getenv("LLM_RATE_LIMIT_DISABLED", "").lower() in ("1", "true", "yes")
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "6"))
+BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+BACKOFF_CAP = float(os.getenv("LLM_BACKOFF_CAP", "30"))
+RETRY_AFTER_CAP = float(os.getenv("LLM_RETRY_AFTER_CAP", "60"))
+# Adaptive concurrency per provider/model: +1 per window of successes, halved on 429/529/timeouts,
+# trimmed while latency stays above LATENCY_TOLERANCE x the best recently seen
+INITIAL_CONCURRENCY = int(os.getenv("LLM_INITIAL_CONCURRENCY", "16"))
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "256"))
+LATENCY_TOLERANCE = float(os.getenv("LLM_LATENCY_TOLERANCE", "3"))
+DEFAULT_OUTPUT_TOKENS = 1024
+
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504, 529}
+THROTTLE_STATUSES = {429, 503, 529}
+
+# (limit, remaining) response headers per provider; both are per minute
+LIMIT_HEADERS = {
+    "openai": (("x-ratelimit-limit-requests", "x-ratelimit-remaining-requests"),
+               ("x-ratelimit-limit-tokens", "x-ratelimit-remaining-tokens")),
+    "anthropic": (("anthropic-ratelimit-requests-limit", "anthropic-ratelimit-requests-remaining"),
+                  ("anthropic-ratelimit-tokens-limit", "anthropic-ratelimit-tokens-remaining")),
+}
+
+
+class TokenBucket:
+    """Per-minute budget refilled continuously. Reservations may overdraw it; the caller waits off the debt."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take `amount`; returns how many seconds to wait before it is covered."""
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+        return 0.0 if self.level >= 0 else -self.level * 60.0 / self.capacity
+
+    def refund(self, amount: float) -> None:
+        self.level = min(self.capacity, self.level + amount)
+
+    def sync(self, limit: Optional[float], remaining: Optional[float], now: float) -> None:
+        """Adopt the provider's own view (it also counts other processes using the same key)."""
+        self._refill(now)
+        if limit:
+            self.level += limit - self.capacity
+            self.capacity = float(limit)
+        if remaining is not None:
+            self.level = min(self.level, remaining)
+
+
+class Lane:
+    """Limits and adaptive concurrency state for one provider/model."""
+
+    def __init__(self, key: Tuple[str, str], rpm: Optional[float], tpm: Optional[float]):
+        self.key = key
+        self.configured = bool(rpm or tpm)
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.limit = float(INITIAL_CONCURRENCY)
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.last_decrease = 0.0
+        self.latency_ewma: Optional[float] = None
+        self.latency_floor: Optional[float] = None
+        self.throttled = 0
+        self.retries = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"provider": self.key[0], "model": self.key[1], "concurrency_limit": round(self.limit, 1),
+                "in_flight": self.in_flight, "throttled": self.throttled, "retries": self.retries,
+                "rpm": self.requests.capacity if self.requests else None,
+                "tpm": self.tokens.capacity if self.tokens else None}
+
+
+class RateLimiter:
+    """
+    Shared by every client in the process: token buckets on requests and tokens per
+    provider/model, AIMD concurrency, and a pause for everyone when the provider says
+    Retry-After. Works for threads and any number of event loops.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, Dict[str, float]]] = None):
+        self.limits = RATE_LIMITS if limits is None else limits
+        self._lanes: Dict[Tuple[str, str], Lane] = {}
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._async_waiters = []
+
+    def lane(self, provider: str, model: Optional[str]) -> Lane:
+        key = (provider, model or "*")
+        with self._lock:
+            lane = self._lanes.get(key)
+            if lane is None:
+                conf = self.limits.get(f"{provider}/{model}") or self.limits.get(provider) or {}
+                lane = self._lanes[key] = Lane(key, conf.get("rpm"), conf.get("tpm"))
+            return lane
+
+    def _reserve(self, lane: Lane, tokens: float) -> float:
+        now = time.monotonic()
+        with self._lock:
+            wait = max(0.0, lane.blocked_until - now)
+            if lane.requests:
+                wait = max(wait, lane.requests.reserve(1, now))
+            if lane.tokens:
+                wait = max(wait, lane.tokens.reserve(tokens, now))
+            return wait
+
+    def _try_enter(self, lane: Lane) -> bool:
+        if lane.in_flight < max(1, int(lane.limit)):
+            lane.in_flight += 1
+            return True
+        return False
+
+    def acquire(self, lane: Lane, tokens: float) -> float:
+        """Block until the request may be sent; returns the seconds spent waiting."""
+        started = time.monotonic()
+        wait = self._reserve(lane, tokens)
+        if wait:
+            time.sleep(wait)
+        with self._cond:
+            while not self._try_enter(lane):
+                self._cond.wait(timeout=1.0)
+        return time.monotonic() - started
+
+    async def aacquire(self, lane: Lane, tokens: float) -> float:
+        started = time.monotonic()
+        wait = self._reserve(lane, tokens)
+        if wait:
+            await asyncio.sleep(wait)
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._try_enter(lane):
+                    break
+                fut = loop.create_future()
+                self._async_waiters.append((loop, fut))
+            try:
+                await asyncio.wait_for(fut, timeout=1.0)
+            except asyncio.TimeoutError:
+                pass
+        return time.monotonic() - started
+
+    def release(self, lane: Lane, latency: Optional[float] = None, throttled: bool = False) -> None:
+        with self._lock:
+            lane.in_flight = max(0, lane.in_flight - 1)
+            if throttled:
+                lane.throttled += 1
+                # A burst of 429s is one congestion signal: halve at most once per round trip
+                now = time.monotonic()
+                if now - lane.last_decrease >= max(1.0, lane.latency_ewma or 0.0):
+                    lane.limit = max(1.0, lane.limit / 2)
+                    lane.last_decrease = now
+            elif latency is not None:
+                lane.latency_floor = latency if lane.latency_floor is None else min(latency, lane.latency_floor * 1.01)
+                lane.latency_ewma = latency if lane.latency_ewma is None else 0.8 * lane.latency_ewma + 0.2 * latency
+                if lane.latency_ewma > LATENCY_TOLERANCE * lane.latency_floor:
+                    lane.limit = max(1.0, lane.limit * 0.95)
+                else:
+                    lane.limit = min(float(MAX_CONCURRENCY), lane.limit + 1.0 / lane.limit)
+            self._cond.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, fut in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, fut)
+            except RuntimeError:
+                pass  # that loop has already closed
+
+    def pause(self, lane: Lane, seconds: float) -> None:
+        """Hold every request on this lane (the provider asked us to wait)."""
+        with self._lock:
+            lane.blocked_until = max(lane.blocked_until, time.monotonic() + seconds)
+            lane.retries += 1
+
+    def refund(self, lane: Lane, tokens: float) -> None:
+        if tokens > 0 and lane.tokens:
+            with self._lock:
+                lane.tokens.refund(tokens)
+
+    def observe(self, lane: Lane, headers: httpx.Headers) -> None:
+        """Learn / resync the request and token budgets from the provider's rate-limit headers."""
+        names = LIMIT_HEADERS.get(lane.key[0])
+        if not names:
+            return
+        now = time.monotonic()
+        with self._lock:
+            for attr, (limit_h, remaining_h) in zip(("requests", "tokens"), names):
+                limit, remaining = _number(headers.get(limit_h)), _number(headers.get(remaining_h))
+                if limit is None:
+                    continue
+                bucket = getattr(lane, attr)
+                if bucket is None:
+                    bucket = TokenBucket(limit)
+                    setattr(lane, attr, bucket)
+                bucket.sync(None if lane.configured else limit, remaining, now)
+
+    def snapshot(self):
+        with self._lock:
+            return [lane.snapshot() for lane in self._lanes.values()]
+
+
+def _wake(fut) -> None:
+    if not fut.done():
+        fut.set_result(None)
+
+
+def _number(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def retry_after(headers: httpx.Headers) -> Optional[float]:
+    """Seconds from retry-after-ms / retry-after (delta or HTTP date), if the provider sent one."""
+    ms = _number(headers.get("retry-after-ms"))
+    if ms is not None:
+        return min(RETRY_AFTER_CAP, max(0.0, ms / 1000))
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    seconds = _number(value)
+    if seconds is None:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(RETRY_AFTER_CAP, max(0.0, seconds))
+
+
+def backoff(attempt: int, hint: Optional[float] = None) -> float:
+    """Retry-After plus a little jitter so waiting callers do not return in lockstep; else full jitter."""
+    if hint is not None:
+        return hint + random.uniform(0, 0.1 * hint + 0.25)
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def _should_retry(response: httpx.Response) -> bool:
+    flag = response.headers.get("x-should-retry")
+    if flag in ("true", "false"):
+        return flag == "true"
+    return response.status_code in RETRY_STATUSES
+
+
+def _describe(request: httpx.Request) -> Tuple[Optional[str], float]:
+    """(model, estimated tokens) for a JSON request; multipart uploads count as one small request."""
+    try:
+        body = request.content
+        payload = json.loads(body)
+    except (httpx.RequestNotRead, ValueError, TypeError):
+        return None, 0.0
+    if not isinstance(payload, dict):
+        return None, len(body) / 4
+    out = payload.get("max_tokens") or payload.get("max_completion_tokens") or DEFAULT_OUTPUT_TOKENS
+    return payload.get("model"), len(body) / 4 + out
+
+
+def _usage_tokens(response: httpx.Response) -> Optional[float]:
+    try:
+        usage = response.json().get("usage") or {}
+    except (ValueError, AttributeError):
+        return None
+    if "total_tokens" in usage:
+        return usage["total_tokens"]
+    if "input_tokens" in usage:
+        return (usage.get("input_tokens") or 0) + (usage.get("output_tokens") or 0)
+    return None
+
+
+def _note(waited: float, retried: bool) -> None:
+    s = current_span()
+    if s is not None:
+        if waited >= 0.01:
+            s.attrs["queued_s"] = round(s.attrs.get("queued_s", 0) + waited, 3)
+        if retried:
+            s.attrs["throttled"] = s.attrs.get("throttled", 0) + 1
+
+
+LIMITER = RateLimiter()
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Keeps the concurrency slot until a streamed response is closed."""
+
+    def __init__(self, stream, done):
+        self._stream, self._done = stream, done
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            self._done()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, done):
+        self._stream, self._done = stream, done
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._done()
+
+
+def _once(fn):
+    called = []
+
+    def wrapper(*args, **kwargs):
+        if not called:
+            called.append(True)
+            fn(*args, **kwargs)
+    return wrapper
+
+
+class RateLimitedTransport(httpx.HTTPTransport):
+    """
+    httpx transport for the provider SDK clients: every request (messages, chat completions,
+    transcriptions, streams) waits for the shared limiter and is retried here, so the SDKs'
+    own retries are switched off (max_retries=0).
+    """
+
+    def __init__(self, provider: str, limiter: RateLimiter = LIMITER, **kwargs):
+        super().__init__(**kwargs)
+        self.provider, self.limiter = provider, limiter
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if RATE_LIMIT_DISABLED:
+            count_attempt(request)
+            return super().handle_request(request)
+        model, tokens = _describe(request)
+        lane = self.limiter.lane(self.provider, model)
+        for attempt in range(MAX_RETRIES + 1):
+            _note(self.limiter.acquire(lane, tokens), attempt > 0)
+            release = _once(self.limiter.release)
+            try:
+                count_attempt(request)
+                started = time.monotonic()
+                try:
+                    response = super().handle_request(request)
+                except (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError):
+                    release(lane, throttled=True)
+                    if attempt == MAX_RETRIES:
+                        raise
+                    time.sleep(backoff(attempt))
+                    continue
+
+                latency = time.monotonic() - started
+                if _should_retry(response) and attempt < MAX_RETRIES:
+                    throttled = response.status_code in THROTTLE_STATUSES
+                    release(lane, throttled=throttled)
+                    response.close()
+                    hint = retry_after(response.headers)
+                    wait = backoff(attempt, hint)
+                    if throttled:
+                        self.limiter.pause(lane, wait)   # everyone on this lane waits it out, not just us
+                    else:
+                        time.sleep(wait)
+                    continue
+
+                self.limiter.observe(lane, response.headers)
+                done = lambda: release(lane, latency)
+                if "text/event-stream" in response.headers.get("content-type", ""):
+                    response.stream = _ReleasingStream(response.stream, done)
+                    return response
+                try:
+                    response.read()
+                    used = _usage_tokens(response)
+                    if used is not None:
+                        self.limiter.refund(lane, tokens - used)
+                finally:
+                    done()
+                return response
+            except BaseException:
+                # Any other failure (including KeyboardInterrupt) must not keep the slot: no-op if already released
+                release(lane)
+                raise
+        raise RuntimeError("unreachable")
+
+
+class AsyncRateLimitedTransport(httpx.AsyncHTTPTransport):
+    """Async twin of RateLimitedTransport, sharing the same process-wide limiter."""
+
+    def __init__(self, provider: str, limiter: RateLimiter = LIMITER, **kwargs):
+        super().__init__(**kwargs)
+        self.provider, self.limiter = provider, limiter
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if RATE_LIMIT_DISABLED:
+            count_attempt(request)
+            return await super().handle_async_request(request)
+        model, tokens = _describe(request)
+        lane = self.limiter.lane(self.provider, model)
+        for attempt in range(MAX_RETRIES + 1):
+            _note(await self.limiter.aacquire(lane, tokens), attempt > 0)
+            release = _once(self.limiter.release)
+            try:
+                count_attempt(request)
+                started = time.monotonic()
+                try:
+                    response = await super().handle_async_request(request)
+                except (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError):
+                    release(lane, throttled=True)
+                    if attempt == MAX_RETRIES:
+                        raise
+                    await asyncio.sleep(backoff(attempt))
+                    continue
+
+                latency = time.monotonic() - started
+                if _should_retry(response) and attempt < MAX_RETRIES:
+                    throttled = response.status_code in THROTTLE_STATUSES
+                    release(lane, throttled=throttled)
+                    await response.aclose()
+                    wait = backoff(attempt, retry_after(response.headers))
+                    if throttled:
+                        self.limiter.pause(lane, wait)
+                    else:
+                        await asyncio.sleep(wait)
+                    continue
+
+                self.limiter.observe(lane, response.headers)
+                done = lambda: release(lane, latency)
+                if "text/event-stream" in response.headers.get("content-type", ""):
+                    response.stream = _AsyncReleasingStream(response.stream, done)
+                    return response
+                try:
+                    await response.aread()
+                    used = _usage_tokens(response)
+                    if used is not None:
+                        self.limiter.refund(lane, tokens - used)
+                finally:
+                    done()
+                return response
+            except BaseException:
+                # Cancelled (an agent timeout, a losing hedge) or failed otherwise: the slot is always freed
+                release(lane)
+                raise
+        raise RuntimeError("unreachable")
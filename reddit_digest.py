@@ -0,0 +1,271 @@
+import os
+import csv
+import io
+import json
+import html
+import smtplib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from email.message import EmailMessage
+from typing import Dict, List, Protocol
+
+import httpx
+
+import settings  # noqa: F401  (reads .env once per process)
+from instrumentation import span, record_usage, bind_context, collect, format_breakdown
+from llm_cache import cached_call
+
+# Python side of n8n_redditTrends_basicloop.json. The n8n loop searched Reddit and called the LLM
+# once per subscriber; here every distinct topic is fetched and summarised once per run and each
+# subscriber's email is stitched together from those summaries, so cost grows with topics only.
+DIGEST_MODEL = os.getenv("DIGEST_MODEL", "gpt-4.1-mini")
+DIGEST_POSTS_PER_TOPIC = int(os.getenv("DIGEST_POSTS_PER_TOPIC", "5"))
+DIGEST_WORKERS = int(os.getenv("DIGEST_WORKERS", "8"))
+DIGEST_SUBJECT = os.getenv("DIGEST_SUBJECT", "Top Reddit posts on your topics")
+REDDIT_USER_AGENT = os.getenv("REDDIT_USER_AGENT", "idea-validator-digest/1.0")
+
+SYSTEM = """You are a professional email writer.
+Summarise the Reddit posts below for a newsletter section about the given topic: 2-4 sentences
+on what people are discussing, then one bullet per post with a one-line takeaway.
+Return HTML only (<p>, <ul>, <li>, <a>); keep every post link."""
+
+
+@dataclass
+class Post:
+    title: str
+    url: str
+    permalink: str
+    text: str = ""
+    score: int = 0
+
+
+@dataclass
+class Subscriber:
+    email: str
+    topics: List[str]
+
+
+# ---- pluggable sources and sinks ----
+
+class SubscriberSource(Protocol):
+    def subscribers(self) -> List[Subscriber]: ...
+
+
+class PostSource(Protocol):
+    def search(self, topic: str, limit: int) -> List[Post]: ...
+
+
+class Mailer(Protocol):
+    def send(self, to: str, subject: str, html_body: str) -> None: ...
+
+
+def _parse_rows(rows) -> List[Subscriber]:
+    """Rows with Email and Topic columns (as in the RedditTrendSubscribers sheet); a Topic cell may
+    list several topics separated by commas, and one email may appear on several rows."""
+    merged: Dict[str, List[str]] = {}
+    for row in rows:
+        row = {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}
+        email = row.get("email") or row.get("email id")
+        if not email:
+            continue
+        topics = merged.setdefault(email.lower(), [])
+        for topic in (row.get("topic") or row.get("topics") or "").split(","):
+            if topic.strip() and topic.strip().lower() not in (t.lower() for t in topics):
+                topics.append(topic.strip())
+    return [Subscriber(email, topics) for email, topics in merged.items() if topics]
+
+
+class CsvSubscribers:
+    """Local stand-in for the Google Sheet: a CSV file with Email and Topic columns."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def subscribers(self) -> List[Subscriber]:
+        with open(self.path, newline="", encoding="utf-8-sig") as f:
+            return _parse_rows(csv.DictReader(f))
+
+
+class GoogleSheetSubscribers:
+    """The subscriber sheet via its CSV export (the sheet must be shared as viewable by link)."""
+
+    def __init__(self, document_id: str, gid: str = "0"):
+        self.url = f"https://docs.google.com/spreadsheets/d/{document_id}/export?format=csv&gid={gid}"
+
+    def subscribers(self) -> List[Subscriber]:
+        with span("sheet", kind="fetch"):
+            resp = httpx.get(self.url, follow_redirects=True, timeout=30)
+            resp.raise_for_status()
+        return _parse_rows(csv.DictReader(io.StringIO(resp.text)))
+
+
+class RedditSearch:
+    """Top posts across all of Reddit for a keyword (the n8n Reddit node's 'search allReddit, sort top')."""
+
+    def __init__(self, client: httpx.Client = None):
+        self.client = client or httpx.Client(headers={"User-Agent": REDDIT_USER_AGENT}, timeout=30)
+
+    def search(self, topic: str, limit: int) -> List[Post]:
+        with span("reddit_search", kind="fetch", topic=topic):
+            resp = self.client.get("https://www.reddit.com/search.json",
+                                   params={"q": topic, "sort": "top", "limit": limit, "t": "week"})
+            resp.raise_for_status()
+        return [Post(title=d["title"], url=d.get("url") or "", permalink=d.get("permalink") or "",
+                     text=(d.get("selftext") or "")[:2000], score=d.get("score") or 0)
+                for d in (c["data"] for c in resp.json()["data"]["children"])]
+
+
+class FilePosts:
+    """Local stand-in for Reddit: a JSON file mapping topic -> list of posts."""
+
+    def __init__(self, path: str):
+        with open(path, encoding="utf-8") as f:
+            self.posts = {k.lower(): v for k, v in json.load(f).items()}
+
+    def search(self, topic: str, limit: int) -> List[Post]:
+        return [Post(**p) for p in self.posts.get(topic.lower(), [])[:limit]]
+
+
+class OutboxMailer:
+    """Local stand-in for Gmail: one .html file per recipient in a directory."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def send(self, to: str, subject: str, html_body: str) -> None:
+        name = "".join(c if c.isalnum() or c in "@.-_" else "_" for c in to)
+        with open(os.path.join(self.directory, f"{name}.html"), "w", encoding="utf-8") as f:
+            f.write(f"<!-- To: {to} | Subject: {subject} -->\n{html_body}")
+
+
+class SmtpMailer:
+    """Gmail (or any SMTP server) with an app password: SMTP_USER / SMTP_PASSWORD, one connection per run."""
+
+    def __init__(self, host: str = None, port: int = None, user: str = None, password: str = None):
+        self.host = host or os.getenv("SMTP_HOST", "smtp.gmail.com")
+        self.port = port or int(os.getenv("SMTP_PORT", "465"))
+        self.user = user or os.getenv("SMTP_USER")
+        self.password = password or os.getenv("SMTP_PASSWORD")
+        self._smtp = None
+
+    def send(self, to: str, subject: str, html_body: str) -> None:
+        if self._smtp is None:
+            self._smtp = smtplib.SMTP_SSL(self.host, self.port)
+            self._smtp.login(self.user, self.password)
+        msg = EmailMessage()
+        msg["From"], msg["To"], msg["Subject"] = self.user, to, subject
+        msg.set_content("This digest is best viewed as HTML.")
+        msg.add_alternative(html_body, subtype="html")
+        with span("send_email", kind="fetch"):
+            self._smtp.send_message(msg)
+
+    def close(self) -> None:
+        if self._smtp is not None:
+            self._smtp.quit()
+            self._smtp = None
+
+
+# ---- pipeline ----
+
+def topics_to_subscribers(subscribers: List[Subscriber]) -> Dict[str, List[str]]:
+    """Invert subscriber -> topics into topic -> emails (topics compared case-insensitively)."""
+    inverted: Dict[str, List[str]] = {}
+    for sub in subscribers:
+        for topic in sub.topics:
+            inverted.setdefault(topic.lower(), []).append(sub.email)
+    return inverted
+
+
+def posts_html(posts: List[Post]) -> str:
+    """The n8n code node's HTML: title, text (or a content link) and a discussion link per post."""
+    parts = []
+    for p in posts:
+        details = html.escape(p.text) if p.text.strip() else f'<a href="{html.escape(p.url)}">View Content</a>'
+        parts.append(f"<h3>{html.escape(p.title)}</h3>\n<p>{details}</p>\n"
+                     f'<p><a href="https://reddit.com{html.escape(p.permalink)}">Discuss on Reddit</a></p>\n<hr>')
+    return "\n".join(parts)
+
+
+def summarize_topic(topic: str, posts: List[Post], bypass_cache: bool = False) -> str:
+    """One LLM call per topic, cached on the posts themselves: unchanged top posts cost nothing."""
+    if not posts:
+        return "<p>No notable posts this time.</p>"
+    from clients import get_openai_client
+    request = dict(model=DIGEST_MODEL, temperature=0.3, messages=[
+        {"role": "system", "content": SYSTEM},
+        {"role": "user", "content": f"Topic: {topic}\n\n{posts_html(posts)}"},
+    ])
+
+    def fetch():
+        resp = record_usage(get_openai_client().chat.completions.create(**request))
+        return resp.choices[0].message.content or ""
+
+    return cached_call({"provider": "openai", **request}, fetch, bypass=bypass_cache, name="digest_summary")
+
+
+def assemble_email(topics: List[str], sections: Dict[str, str]) -> str:
+    """A subscriber's email: their topics' precomputed sections, no LLM call."""
+    body = "\n".join(f"<h2>{html.escape(t)}</h2>\n{sections[t.lower()]}" for t in topics if t.lower() in sections)
+    return f"<html><body>\n<p>Here is what's trending on Reddit for your topics.</p>\n{body}\n</body></html>"
+
+
+@dataclass
+class DigestReport:
+    subscribers: int = 0
+    topics: int = 0
+    emails_sent: int = 0
+    errors: List[str] = field(default_factory=list)
+
+
+def run_digest(source: SubscriberSource, posts: PostSource, mailer: Mailer, limit: int = DIGEST_POSTS_PER_TOPIC,
+               workers: int = DIGEST_WORKERS, bypass_cache: bool = False) -> DigestReport:
+    """Invert the mapping, fetch + summarise each distinct topic once (in parallel), then mail everyone."""
+    subscribers = source.subscribers()
+    inverted = topics_to_subscribers(subscribers)
+    report = DigestReport(subscribers=len(subscribers), topics=len(inverted))
+
+    def section(topic: str) -> str:
+        return summarize_topic(topic, posts.search(topic, limit), bypass_cache=bypass_cache)
+
+    sections: Dict[str, str] = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {topic: pool.submit(bind_context(section), topic) for topic in inverted}
+        for topic, future in futures.items():
+            try:
+                sections[topic] = future.result()
+            except Exception as e:
+                report.errors.append(f"topic {topic!r}: {e}")   # its subscribers still get their other topics
+
+    for sub in subscribers:
+        if not any(t.lower() in sections for t in sub.topics):
+            continue
+        try:
+            mailer.send(sub.email, DIGEST_SUBJECT, assemble_email(sub.topics, sections))
+            report.emails_sent += 1
+        except Exception as e:
+            report.errors.append(f"{sub.email}: {e}")
+    if hasattr(mailer, "close"):
+        mailer.close()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send each subscriber a digest of top Reddit posts on their topics.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--subscribers", help="CSV file with Email and Topic columns")
+    group.add_argument("--sheet", help="Google Sheet id (shared by link) with Email and Topic columns")
+    parser.add_argument("--posts", help="JSON file {topic: [posts]} instead of live Reddit search")
+    parser.add_argument("--outbox", help="Write emails to this directory instead of sending them over SMTP")
+    parser.add_argument("--limit", type=int, default=DIGEST_POSTS_PER_TOPIC)
+    parser.add_argument("--fresh", action="store_true", help="Bypass the response cache")
+    args = parser.parse_args()
+
+    source = CsvSubscribers(args.subscribers) if args.subscribers else GoogleSheetSubscribers(args.sheet)
+    post_source = FilePosts(args.posts) if args.posts else RedditSearch()
+    mailer = OutboxMailer(args.outbox) if args.outbox else SmtpMailer()
+    with collect() as run:
+        report = run_digest(source, post_source, mailer, limit=args.limit, bypass_cache=args.fresh)
+    print(json.dumps(report.__dict__, indent=2))
+    print(format_breakdown(run.spans))
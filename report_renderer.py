@@ -0,0 +1,285 @@
+import io
+import os
+import sys
+import json
+import re
+import html
+import zipfile
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from string import Template
+from xml.sax.saxutils import escape as xml_escape
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import settings  # noqa: F401  (reads .env once per process)
+
+# Worker processes for render_batch (default: one per CPU)
+RENDER_WORKERS = int(os.getenv("REPORT_RENDER_WORKERS", "0")) or None
+RENDER_CHUNKSIZE = int(os.getenv("REPORT_RENDER_CHUNKSIZE", "16"))
+
+FORMATS = ("docx", "md", "html")
+MIME_TYPES = {
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "md": "text/markdown",
+    "html": "text/html",
+}
+
+# (heading, results key, [(field, label), ...]); fields not listed are appended after these
+SECTIONS = (
+    ("Executive Summary", "listener", [
+        ("idea_title", "Title"), ("one_liner", "One-liner"), ("problem", "Problem"), ("solution", "Solution"),
+        ("target_customer", "Target Customer"), ("business_model", "Business Model"), ("pricing", "Pricing"),
+        ("gtm", "Go-to-Market"), ("competition", "Competition"), ("moat", "Moat"), ("key_risks", "Key Risks"),
+    ]),
+    ("Market Analysis", "analyst", [
+        ("market", "Market"), ("competition", "Competition"), ("business_model", "Business Model"),
+        ("opportunities", "Opportunities"), ("risks", "Risks"), ("improvements", "Suggested Improvements"),
+    ]),
+    ("Feasibility Assessment", "vc", [
+        ("fundability_score", "Fundability Score (1-5)"), ("rationale", "Rationale"), ("scalability", "Scalability"),
+        ("revenue_potential", "Revenue Potential"), ("unit_economics", "Unit Economics"), ("risks", "Risks"),
+    ]),
+    ("Challenges & Blind Spots", "critic", [
+        ("severity_ranking", "Severity Ranking"), ("gtm", "Go-to-Market"), ("regulatory", "Regulatory"),
+        ("technical", "Technical"), ("operational", "Operational"), ("data_privacy", "Data Privacy"),
+        ("mitigation", "Mitigation"),
+    ]),
+    ("Action Plan", "advisor", []),
+)
+
+
+@dataclass
+class Block:
+    """A paragraph (`text`) or a bullet list (`items`)."""
+    text: str = ""
+    items: List[str] = field(default_factory=list)
+
+
+@dataclass
+class Section:
+    title: str
+    fields: List[Tuple[str, List[Block]]] = field(default_factory=list)
+    note: str = ""
+
+
+@dataclass
+class Report:
+    title: str
+    sections: List[Section]
+
+
+def _inline(value: Any) -> str:
+    """One-line text for a nested value (e.g. a mitigation item)."""
+    if isinstance(value, dict):
+        return "; ".join(f"{_label(k)}: {_inline(v)}" for k, v in value.items() if v not in (None, "", [], {}))
+    if isinstance(value, list):
+        return ", ".join(_inline(v) for v in value)
+    return "" if value is None else str(value)
+
+
+def _label(key: str) -> str:
+    return str(key).replace("_", " ").title()
+
+
+def _blocks(value: Any) -> List[Block]:
+    if value is None or value == "" or value == [] or value == {}:
+        return []
+    if isinstance(value, list):
+        return [Block(items=[_inline(v) for v in value])]
+    if isinstance(value, dict):
+        # {"items": [...]} wrappers (critic mitigation) read better as the list itself
+        if list(value) == ["items"] and isinstance(value["items"], list):
+            return _blocks(value["items"])
+        return [Block(items=[f"{_label(k)}: {_inline(v)}" for k, v in value.items() if v not in (None, "", [], {})])]
+    return [Block(text=str(value))]
+
+
+def build_report(results: Dict[str, Any]) -> Report:
+    """Lay out {"listener": ..., "analyst": ..., "vc": ..., "critic": ..., "advisor": ...} as report sections."""
+    listener = results.get("listener") or {}
+    sections = []
+    for title, key, labels in SECTIONS:
+        data = results.get(key)
+        section = Section(title)
+        if not isinstance(data, dict) or not data:
+            if key == "advisor" and not data:
+                continue
+            section.note = "Not available."
+        elif "error" in data:
+            section.note = f"Not available: {data['error']}"
+        else:
+            known = dict(labels)
+            for name in [f for f, _ in labels if f in data] + [k for k in data if k not in known]:
+                blocks = _blocks(data[name])
+                if blocks:
+                    section.fields.append((known.get(name) or _label(name), blocks))
+        sections.append(section)
+    return Report(title=str(listener.get("idea_title") or "Idea Validation Report"), sections=sections)
+
+
+# ---- Markdown / HTML: templates compiled once at import ----
+
+MD_PAGE = Template("# $title\n\n$sections")
+MD_SECTION = Template("## $number. $heading\n\n$body")
+MD_FIELD = Template("**$label**\n\n$body\n")
+
+HTML_PAGE = Template(
+    "<!DOCTYPE html>\n<html lang=\"en\"><head><meta charset=\"utf-8\"><title>$title</title>\n"
+    "<style>body{font-family:system-ui,sans-serif;max-width:52rem;margin:2rem auto;line-height:1.5;padding:0 1rem}"
+    "h2{border-bottom:1px solid #ddd;padding-bottom:.2rem}.note{color:#888}dt{font-weight:600;margin-top:.8rem}"
+    "dd{margin-left:0}</style></head>\n<body><h1>$title</h1>\n$sections</body></html>\n"
+)
+HTML_SECTION = Template("<section><h2>$number. $heading</h2>\n$body</section>\n")
+HTML_FIELD = Template("<dt>$label</dt><dd>$body</dd>\n")
+
+
+def _md_blocks(blocks: List[Block]) -> str:
+    return "\n".join(b.text + "\n" if b.text else "".join(f"- {i}\n" for i in b.items) for b in blocks)
+
+
+def render_markdown(report: Report) -> str:
+    sections = []
+    for n, s in enumerate(report.sections, 1):
+        body = f"_{s.note}_\n" if s.note else "".join(
+            MD_FIELD.substitute(label=label, body=_md_blocks(blocks)) for label, blocks in s.fields)
+        sections.append(MD_SECTION.substitute(number=n, heading=s.title, body=body))
+    return MD_PAGE.substitute(title=report.title, sections="\n".join(sections))
+
+
+def _html_blocks(blocks: List[Block]) -> str:
+    e = html.escape
+    return "".join(f"<p>{e(b.text)}</p>" if b.text else "<ul>" + "".join(f"<li>{e(i)}</li>" for i in b.items) + "</ul>"
+                   for b in blocks)
+
+
+def render_html(report: Report) -> str:
+    sections = []
+    for n, s in enumerate(report.sections, 1):
+        if s.note:
+            body = f"<p class=\"note\">{html.escape(s.note)}</p>\n"
+        else:
+            body = "<dl>\n" + "".join(HTML_FIELD.substitute(label=html.escape(label), body=_html_blocks(blocks))
+                                      for label, blocks in s.fields) + "</dl>\n"
+        sections.append(HTML_SECTION.substitute(number=n, heading=html.escape(s.title), body=body))
+    return HTML_PAGE.substitute(title=html.escape(report.title), sections="".join(sections))
+
+
+# ---- DOCX: python-docx's default package is built once; per report only word/document.xml is written ----
+
+DOCX_BODY_PART = "word/document.xml"
+DOCX_PARAGRAPH = Template('<w:p>$props<w:r>$run<w:t xml:space="preserve">$text</w:t></w:r></w:p>')
+DOCX_STYLE = Template('<w:pPr><w:pStyle w:val="$style"/></w:pPr>')
+INVALID_XML_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+@lru_cache(maxsize=1)
+def _docx_template() -> Tuple[bytes, str, str]:
+    """(zip of every part except the body, document.xml up to <w:body>, document.xml from <w:sectPr>)"""
+    from docx import Document
+    buf = io.BytesIO()
+    Document().save(buf)
+    src = zipfile.ZipFile(buf)
+    static = io.BytesIO()
+    with zipfile.ZipFile(static, "w") as z:
+        for info in src.infolist():
+            if info.filename != DOCX_BODY_PART:
+                z.writestr(info, src.read(info))   # compressed once here, copied as-is per report
+    body = src.read(DOCX_BODY_PART).decode("utf-8")
+    head = body[:body.index("<w:body>") + len("<w:body>")]
+    return static.getvalue(), head, body[body.index("<w:sectPr"):]
+
+
+def _docx_p(text: str, style: str = "", italic: bool = False) -> str:
+    text = xml_escape(INVALID_XML_RE.sub("", text)).replace("\n", '</w:t><w:br/><w:t xml:space="preserve">')
+    return DOCX_PARAGRAPH.substitute(props=DOCX_STYLE.substitute(style=style) if style else "",
+                                     run="<w:rPr><w:i/></w:rPr>" if italic else "", text=text)
+
+
+def render_docx(report: Report) -> bytes:
+    static, head, tail = _docx_template()
+    parts = [head, _docx_p("Idea Validation Report", "Title"), _docx_p(report.title)]
+    for n, s in enumerate(report.sections, 1):
+        parts.append(_docx_p(f"{n}. {s.title}", "Heading1"))
+        if s.note:
+            parts.append(_docx_p(s.note, italic=True))
+        for label, blocks in s.fields:
+            parts.append(_docx_p(label, "Heading2"))
+            for b in blocks:
+                if b.text:
+                    parts.append(_docx_p(b.text))
+                parts.extend(_docx_p(item, "ListBullet") for item in b.items)
+    parts.append(tail)
+    buf = io.BytesIO(static)
+    with zipfile.ZipFile(buf, "a", zipfile.ZIP_DEFLATED) as z:
+        z.writestr(DOCX_BODY_PART, "".join(parts))
+    return buf.getvalue()
+
+
+_RENDERERS = {
+    "docx": render_docx,
+    "md": lambda r: render_markdown(r).encode("utf-8"),
+    "html": lambda r: render_html(r).encode("utf-8"),
+}
+
+
+def render_report(results: Dict[str, Any], fmt: str = "docx") -> bytes:
+    """Render one validation result to `fmt` (docx, md or html) entirely in memory."""
+    if fmt not in _RENDERERS:
+        raise ValueError(f"Unknown report format: {fmt} (expected one of {', '.join(FORMATS)})")
+    return _RENDERERS[fmt](build_report(results))
+
+
+def _render_one(job: Tuple[str, Dict[str, Any], Sequence[str]]) -> List[Tuple[str, str, bytes]]:
+    rid, results, formats = job
+    report = build_report(results)
+    return [(rid, fmt, _RENDERERS[fmt](report)) for fmt in formats]
+
+
+def render_batch(items: Iterable[Tuple[str, Dict[str, Any]]], formats: Sequence[str] = ("docx",),
+                 workers: Optional[int] = RENDER_WORKERS, chunksize: int = RENDER_CHUNKSIZE
+                 ) -> Iterator[Tuple[str, str, bytes]]:
+    """
+    Render many (id, results) pairs across a process pool, yielding (id, format, bytes)
+    in input order. workers=1 renders in this process.
+    """
+    for fmt in formats:
+        if fmt not in _RENDERERS:
+            raise ValueError(f"Unknown report format: {fmt}")
+    jobs = ((rid, results, tuple(formats)) for rid, results in items)
+    if workers == 1:
+        for job in jobs:
+            yield from _render_one(job)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for rendered in pool.map(_render_one, jobs, chunksize=chunksize):
+            yield from rendered
+
+
+def _iter_batch_results(path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """(id, results) from a batch_validate.py output file, skipping failed pipelines."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            results = row.get("results") or {}
+            if isinstance(results, dict) and isinstance(results.get("listener"), dict):
+                yield str(row["id"]), results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render reports for a batch_validate.py results file into a zip.")
+    parser.add_argument("input", help="JSONL written by batch_validate.py")
+    parser.add_argument("--out", default="reports.zip")
+    parser.add_argument("--formats", default="docx", help=f"Comma-separated, from {', '.join(FORMATS)}")
+    parser.add_argument("--workers", type=int, default=RENDER_WORKERS)
+    args = parser.parse_args()
+
+    count = 0
+    with zipfile.ZipFile(args.out, "w", zipfile.ZIP_DEFLATED) as zf:
+        for rid, fmt, data in render_batch(_iter_batch_results(args.input), args.formats.split(","), args.workers):
+            zf.writestr(f"{rid}.{fmt}", data)
+            count += 1
+    print(f"Rendered {count} report file(s) into {args.out}", file=sys.stderr)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, List
+from typing import Optional, List
 
 class IdeaSchema(BaseModel):
     idea_title: Optional[str] = Field(None, description="Short title or name for the idea")
@@ -10,12 +10,16 @@ class IdeaSchema(BaseModel):
     business_model: Optional[str] = Field(None, description="How money is made (subscription, ads, etc.)")
 
     # Optional good-to-haves
-    pricing: Optional[str] = None
-    gtm: Optional[str] = None
-    competition: Optional[str] = None
-    moat: Optional[str] = None
-    key_risks: Optional[str] = None
+    pricing: Optional[str] = Field(None, description="Price points, plans or tiers")
+    gtm: Optional[str] = Field(None, description="Go-to-market: channels, marketing and sales strategy")
+    competition: Optional[str] = Field(None, description="Competitors and alternatives in the market")
+    moat: Optional[str] = Field(None, description="Defensible advantage or differentiation")
+    key_risks: Optional[str] = Field(None, description="Main risks and challenges")
 
     def missing_required_fields(self) -> List[str]:
         order = ["problem", "target_customer", "solution", "business_model"]
         return [f for f in order if (getattr(self, f) is None or str(getattr(self, f)).strip() == "")]
+
+    def fields_to_confirm(self) -> List[str]:
+        """Fields the Listener filled with an assumption marked "(please confirm)"."""
+        return [f for f in type(self).model_fields if "(please confirm)" in str(getattr(self, f) or "").lower()]
@@ -0,0 +1,219 @@
+import os
+import json
+import uuid
+import queue
+import atexit
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import settings  # noqa: F401  (reads .env once per process)
+from artifact_store import INTAKE_DB_PATH, ARTIFACTS_DDL
+
+# Local stand-in for intake_sessions / intake_messages in supabase_schema.sql
+# (uuid -> text, jsonb -> JSON text, timestamptz -> ISO-8601 text)
+SESSIONS_DDL = """
+create table if not exists intake_sessions (
+  id text primary key,
+  user_id text,
+  status text check (status in ('new','collecting','complete','error')) default 'collecting',
+  idea_schema text default '{}',
+  created_at text,
+  updated_at text
+)
+"""
+MESSAGES_DDL = """
+create table if not exists intake_messages (
+  id text primary key,
+  session_id text references intake_sessions (id) on delete cascade,
+  role text check (role in ('user','agent','system')),
+  content text,
+  payload text,
+  created_at text
+)
+"""
+
+FLUSH_INTERVAL_SECONDS = float(os.getenv("SESSION_FLUSH_INTERVAL", "0.5"))
+FLUSH_BATCH_SIZE = 200
+# A locked / busy database is retried with exponential backoff; writes still failing after that
+# stay queued for the next batch instead of being dropped.
+WRITE_RETRIES = 4
+WRITE_BACKOFF_SECONDS = 0.05
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class SessionStore:
+    """
+    Durable intake history with write-behind persistence: record_* calls only enqueue,
+    and a background thread writes queued rows in batched transactions. Schema updates
+    for the same session within one batch collapse to the latest.
+    """
+
+    def __init__(self, db_path: str = INTAKE_DB_PATH, flush_interval: float = FLUSH_INTERVAL_SECONDS):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._read_conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._read_conn.execute("pragma journal_mode=wal")
+        for ddl in (SESSIONS_DDL, MESSAGES_DDL, ARTIFACTS_DDL):
+            self._read_conn.execute(ddl)
+        self._read_conn.commit()
+        self._read_lock = threading.Lock()
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._writer = threading.Thread(target=self._run, name="session-store-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    # ---- enqueue-only API (never blocks on the database) ----
+    def create_session(self, user_id: str = None, status: str = "collecting") -> str:
+        session_id = str(uuid.uuid4())
+        now = _now()
+        self._queue.put(("session", (session_id, user_id, status, "{}", now, now)))
+        return session_id
+
+    def update_schema(self, session_id: str, idea_schema: Dict[str, Any], status: str = None) -> None:
+        self._queue.put(("schema", (session_id, json.dumps(idea_schema, ensure_ascii=False), status, _now())))
+
+    def record_message(self, session_id: str, role: str, content: str, payload: Dict[str, Any] = None) -> None:
+        self._queue.put(("message", (str(uuid.uuid4()), session_id, role, content,
+                                     json.dumps(payload or {}, ensure_ascii=False), _now())))
+
+    def link_artifact(self, session_id: str, artifact: Dict[str, Any]) -> None:
+        """Artifacts are shared across sessions by hash, so each use is logged as a system message."""
+        self.record_message(session_id, "system", artifact.get("meta", {}).get("filename", ""), {
+            "kind": "artifact",
+            "artifact_id": artifact["id"],
+            "sha256": artifact["sha256"],
+            "type": artifact["type"],
+            "cached": artifact.get("cached", False),
+        })
+
+    # ---- synchronous API ----
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Block until everything queued so far is written."""
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def load_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """The session row plus its messages in order, or None if unknown."""
+        self.flush()
+        with self._read_lock:
+            cur = self._read_conn.execute("select * from intake_sessions where id = ?", (session_id,))
+            row = cur.fetchone()
+            if row is None:
+                return None
+            session = dict(zip([c[0] for c in cur.description], row))
+            cur = self._read_conn.execute(
+                "select * from intake_messages where session_id = ? order by created_at, rowid", (session_id,))
+            messages = [dict(zip([c[0] for c in cur.description], r)) for r in cur.fetchall()]
+        session["idea_schema"] = json.loads(session["idea_schema"] or "{}")
+        for m in messages:
+            m["payload"] = json.loads(m["payload"] or "{}")
+        return {"session": session, "messages": messages}
+
+    def close(self) -> None:
+        if self._writer.is_alive():
+            self._queue.put(("stop", None))
+            self._writer.join(timeout=10)
+
+    # ---- background writer ----
+    def _run(self) -> None:
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("pragma journal_mode=wal")
+        conn.execute("pragma synchronous=normal")
+        stop, kept = False, []
+        while not stop:
+            try:
+                batch = kept + [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                if not kept:
+                    continue
+                batch = kept
+            while len(batch) < FLUSH_BATCH_SIZE + len(kept):
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop, kept = self._write_batch(conn, batch)
+        conn.close()
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: List) -> Tuple[bool, List]:
+        """Write one batch; returns (stop, items to retry with the next batch)."""
+        sessions, messages, waiters, stop = [], [], [], False
+        schemas: Dict[str, tuple] = {}
+        for kind, item in batch:
+            if kind == "session":
+                sessions.append(item)
+            elif kind == "schema":
+                schemas[item[0]] = item   # last update per session wins
+            elif kind == "message":
+                messages.append(item)
+            elif kind == "flush":
+                waiters.append(item)
+            elif kind == "stop":
+                stop = True
+        statements = [
+            ("insert or ignore into intake_sessions (id, user_id, status, idea_schema, created_at, updated_at)"
+             " values (?, ?, ?, ?, ?, ?)", sessions),
+            ("update intake_sessions set idea_schema = ?, status = coalesce(?, status), updated_at = ?"
+             " where id = ?", [(s, status, ts, sid) for sid, s, status, ts in schemas.values()]),
+            ("insert into intake_messages (id, session_id, role, content, payload, created_at)"
+             " values (?, ?, ?, ?, ?, ?)", messages),
+        ]
+        for attempt in range(WRITE_RETRIES + 1):
+            try:
+                with conn:
+                    for sql, rows in statements:
+                        conn.executemany(sql, rows)
+                break
+            except sqlite3.OperationalError as e:   # locked / busy / I/O: the same writes may succeed later
+                error = e
+                if attempt < WRITE_RETRIES:
+                    time.sleep(WRITE_BACKOFF_SECONDS * 2 ** attempt)
+            except sqlite3.Error:   # a bad row (e.g. a constraint): write row by row so only it is lost
+                self._write_rows(conn, statements)
+                break
+        else:
+            writes = sum(len(rows) for _, rows in statements)
+            if not stop:
+                print(f"⚠️  session store: {writes} writes kept for retry ({error})")
+                return False, batch   # flush() waiters stay queued with the writes they wait for
+            print(f"⚠️  session store: dropped {writes} writes at shutdown ({error})")
+        for event in waiters:
+            event.set()
+        return stop, []
+
+    @staticmethod
+    def _write_rows(conn: sqlite3.Connection, statements: List[Tuple[str, List[tuple]]]) -> None:
+        dropped, error = 0, None
+        for sql, rows in statements:
+            for row in rows:
+                try:
+                    with conn:
+                        conn.execute(sql, row)
+                except sqlite3.Error as e:
+                    dropped, error = dropped + 1, e
+        if dropped:
+            print(f"⚠️  session store: dropped {dropped} writes ({error})")
+
+
+_store: Optional[SessionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """Process-wide store (one writer thread), opened on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SessionStore()
+    return _store
@@ -0,0 +1,9 @@
+"""
+Process-wide configuration. Importing this module reads .env exactly once per process; modules
+that read settings from the environment import it (before their first os.getenv) instead of
+calling load_dotenv() themselves. Streamlit re-executes the page scripts on every interaction,
+but an imported module is not re-executed, so a rerun no longer re-reads .env.
+"""
+from dotenv import load_dotenv
+
+load_dotenv()
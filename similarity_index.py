@@ -0,0 +1,118 @@
+import os
+import json
+import argparse
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import settings  # noqa: F401  (reads .env once per process)
+from llm_cache import make_key
+from instrumentation import span
+from vector_store import VectorStore, hash_embed
+
+# Reuse a past agent report when that agent's inputs are at least this similar (cosine, 0..1)
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILAR_IDEA_THRESHOLD", "0.85"))
+SIMILAR_IDEAS = os.getenv("SIMILAR_IDEAS", "1").lower() not in ("0", "false", "no")
+SIMILAR_INDEX_DIR = os.getenv("SIMILAR_INDEX_DIR", os.path.join(".data", "similar"))
+
+
+def idea_text(inputs: Dict[str, Any]) -> str:
+    """The text that is embedded: field values only (field names would make every idea look alike)."""
+    return "\n".join(v if isinstance(v, str) else json.dumps(v, ensure_ascii=False)
+                     for v in inputs.values() if v)
+
+
+def adapt(report: Any, old_title: Optional[str], new_title: Optional[str]) -> Any:
+    """A stored report reworded for the new idea: mentions of the old idea's title become the new one."""
+    if not old_title or not new_title or old_title == new_title:
+        return report
+    if isinstance(report, str):
+        return report.replace(old_title, new_title)
+    if isinstance(report, list):
+        return [adapt(v, old_title, new_title) for v in report]
+    if isinstance(report, dict):
+        return {k: adapt(v, old_title, new_title) for k, v in report.items()}
+    return report
+
+
+@dataclass
+class Match:
+    score: float
+    inputs: Dict[str, Any]
+    result: Dict[str, Any]
+
+
+class SimilarityIndex:
+    """
+    Past agent results, indexed by a local embedding of the fields each agent reads (one
+    vector store per agent and prompt signature, so a prompt change starts a fresh index).
+    Where agent_dag's memo only reuses a result for identical fields, this also catches
+    rewordings of an idea validated before, across processes and restarts.
+    """
+
+    def __init__(self, root: str = SIMILAR_INDEX_DIR, threshold: float = SIMILARITY_THRESHOLD):
+        self.root = root
+        self.threshold = threshold
+        self._stores: Dict[str, VectorStore] = {}
+        self._lock = threading.Lock()
+
+    def store(self, node) -> VectorStore:
+        name = f"{node.name}-{node.signature[:12]}" if node.signature else node.name
+        with self._lock:
+            if name not in self._stores:
+                self._stores[name] = VectorStore(os.path.join(self.root, name))
+            return self._stores[name]
+
+    def lookup(self, node, schema: Dict[str, Any]) -> Optional[Match]:
+        """The closest past result for this agent if it clears the threshold, adapted to the new idea.
+        None while reuse is switched off (SIMILAR_IDEAS=0), so agent_dag.stale() agrees with run_async()."""
+        if not SIMILAR_IDEAS:
+            return None
+        inputs = node.inputs(schema)
+        text = idea_text(inputs)
+        if not text:
+            return None
+        hits = self.store(node).search(hash_embed(text), k=1)
+        if not hits or hits[0].score < self.threshold:
+            return None
+        meta = hits[0].meta
+        result = adapt(meta["result"], meta["inputs"].get("idea_title"), inputs.get("idea_title"))
+        return Match(hits[0].score, meta["inputs"], result)
+
+    def add(self, node, schema: Dict[str, Any], result: Dict[str, Any]) -> None:
+        """Remember a successful result (the same inputs validated again replace the older entry)."""
+        inputs = node.inputs(schema)
+        text = idea_text(inputs)
+        if not text or not isinstance(result, dict) or "error" in result:
+            return
+        self.store(node).add([make_key(**inputs)], hash_embed(text)[None, :], [{"inputs": inputs, "result": result}])
+
+    def reuse(self, node, schema: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """lookup() recorded as a zero-cost cache hit on the agent's span; None means run the agent."""
+        match = self.lookup(node, schema)
+        if match is None:
+            return None
+        with span(node.name) as s:
+            s.cache_hit = True
+            s.attrs.update(similar_to=match.inputs.get("idea_title"), similarity=round(match.score, 3))
+        return match.result
+
+
+# One per process; the files underneath are shared by every process
+SIMILAR = SimilarityIndex()
+
+
+if __name__ == "__main__":
+    from agent_dag import VALIDATION_DAG
+
+    parser = argparse.ArgumentParser(description="Find past validations similar to an IdeaSchema JSON file.")
+    parser.add_argument("schema", help="IdeaSchema JSON file")
+    parser.add_argument("-k", type=int, default=3)
+    args = parser.parse_args()
+
+    with open(args.schema, encoding="utf-8") as f:
+        schema = json.load(f)
+    for name, node in VALIDATION_DAG.nodes.items():
+        hits = SIMILAR.store(node).search(hash_embed(idea_text(node.inputs(schema))), k=args.k)
+        print(f"{name}: " + ("; ".join(f"{h.meta['inputs'].get('idea_title')} ({h.score:.3f})" for h in hits)
+                             or "no past validations"))
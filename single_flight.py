@@ -0,0 +1,173 @@
+import re
+import copy
+import asyncio
+import threading
+import unicodedata
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from llm_cache import make_key
+
+
+def normalize_idea(text: str) -> str:
+    """Unicode-normalized, case-folded, single-spaced idea text: what counts as 'the same idea'."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text or "")).strip().casefold()
+
+
+def flight_key(text: str = "", **config: Any) -> str:
+    """Key for one pipeline run: normalized idea text plus the pipeline configuration."""
+    return make_key(idea=normalize_idea(text), **config)
+
+
+class Abandoned(Exception):
+    """The leading call was cancelled before it finished; a waiting caller takes over."""
+
+
+class _Call:
+    """One in-flight call: the future its followers wait on and the events published so far."""
+
+    def __init__(self):
+        self.future = Future()
+        self.events: List[Any] = []
+        self.listeners: List[Tuple[Callable[[Any], None], bool]] = []   # (on_event, is the leader's)
+        self.lock = threading.Lock()
+
+    def listen(self, on_event: Callable[[Any], None], leader: bool) -> None:
+        """Replay the events published so far to a new listener, then keep it informed."""
+        with self.lock:
+            for event in self.events:
+                on_event(copy.deepcopy(event))
+            self.listeners.append((on_event, leader))
+
+    def publish(self, event: Any) -> None:
+        with self.lock:
+            self.events.append(event)
+            for on_event, leader in self.listeners:
+                if leader:
+                    on_event(event)   # the leader's own callback: its errors are the run's errors
+                    continue
+                try:
+                    on_event(copy.deepcopy(event))
+                except Exception:
+                    pass   # a follower's callback must not fail the run everyone shares
+
+
+class SingleFlight:
+    """
+    In-process request coalescing: while a call for a key is running, identical calls (from
+    any thread or event loop) wait for it and get a copy of its result instead of repeating
+    the work. Events the running call publishes (partial results) reach every caller's on_event,
+    late joiners included. Nothing is kept once the call finishes; the response cache covers
+    reuse after that.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.leaders = 0
+        self.joined = 0
+
+    def _claim(self, key: str, on_event: Optional[Callable[[Any], None]]) -> Tuple[Future, bool]:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.joined += 1
+        if on_event is not None:
+            call.listen(on_event, leader)
+        return call.future, leader
+
+    def _settle(self, key: str, fut: Future, result: Any = None, error: BaseException = None) -> None:
+        with self._lock:
+            if key in self._calls and self._calls[key].future is fut:
+                del self._calls[key]
+        if error is not None:
+            fut.set_exception(error)
+        else:
+            fut.set_result(result)
+
+    def publish(self, key: str, event: Any) -> None:
+        """Called by the leading fn: hand event to every caller's on_event (and to later joiners)."""
+        with self._lock:
+            call = self._calls.get(key)
+        if call is not None:
+            call.publish(event)
+
+    def do(self, key: str, fn: Callable[[], Any],
+           on_event: Optional[Callable[[Any], None]] = None) -> Tuple[Any, bool]:
+        """Run fn() once per key at a time. Returns (result, shared) where shared means we waited on another caller."""
+        while True:
+            fut, leader = self._claim(key, on_event)
+            if not leader:
+                try:
+                    return copy.deepcopy(fut.result()), True
+                except Abandoned:
+                    continue
+            try:
+                result = fn()
+            except Exception as e:
+                self._settle(key, fut, error=e)
+                raise
+            except BaseException:
+                self._settle(key, fut, error=Abandoned())
+                raise
+            self._settle(key, fut, result)
+            return result, False
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]],
+                       on_event: Optional[Callable[[Any], None]] = None) -> Tuple[Any, bool]:
+        """Async twin of do(); fn is a zero-arg coroutine function. Works across event loops and threads."""
+        while True:
+            fut, leader = self._claim(key, on_event)
+            if not leader:
+                try:
+                    return copy.deepcopy(await _wait(fut)), True
+                except Abandoned:
+                    continue
+            try:
+                result = await fn()
+            except Exception as e:
+                self._settle(key, fut, error=e)
+                raise
+            except BaseException:   # cancelled (e.g. a timeout around this call)
+                self._settle(key, fut, error=Abandoned())
+                raise
+            self._settle(key, fut, result)
+            return result, False
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"leaders": self.leaders, "joined": self.joined,
+                    "in_flight": len(self._calls)}
+
+
+async def _wait(fut: Future) -> Any:
+    """Await a concurrent Future without letting our cancellation cancel it for everyone else."""
+    loop = asyncio.get_running_loop()
+    waiter = loop.create_future()
+
+    def relay(_):
+        try:
+            loop.call_soon_threadsafe(_copy_state, fut, waiter)
+        except RuntimeError:
+            pass  # our loop has already closed
+
+    fut.add_done_callback(relay)
+    return await waiter
+
+
+def _copy_state(source: Future, waiter: asyncio.Future) -> None:
+    if waiter.done():
+        return
+    error = source.exception()
+    if error is not None:
+        waiter.set_exception(error)
+    else:
+        waiter.set_result(source.result())
+
+
+# One per process: Streamlit sessions, batch runs and the CLI all coalesce here
+FLIGHTS = SingleFlight()
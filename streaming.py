@@ -0,0 +1,187 @@
+import json
+import time
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from llm_cache import CACHE_DISABLED, get_cache, make_key, is_json
+from clients import get_anthropic_client, get_openai_client
+from instrumentation import Span, span, use_span, record_usage
+
+# Events yielded by the stream_* helpers:
+#   ("token", str)                  raw text as it arrives
+#   ("field", (key, value))         a top-level JSON member that just completed
+#   ("done", dict)                  the final parsed result (or the agent's error dict)
+StreamEvent = Tuple[str, Any]
+
+
+class IncrementalJSONObject:
+    """
+    Incremental parser for a single JSON object arriving in chunks.
+    feed() returns the top-level (key, value) pairs completed by that chunk, so a UI
+    can render `market`, `competition`, ... as soon as each one closes. Text before the
+    opening brace (e.g. a ```json fence) and after the closing brace is ignored.
+    """
+
+    def __init__(self):
+        self._buf = ""
+        self._i = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._phase = "key"     # key -> colon -> value_start -> value
+        self._key = None
+        self._key_start = 0
+        self._value_start = 0
+        self.done = False
+        self.fields: Dict[str, Any] = {}
+
+    def _emit(self, end: int, out: List[Tuple[str, Any]]):
+        raw = self._buf[self._value_start:end].strip()
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            return  # malformed member; the final parse will report it
+        self.fields[self._key] = value
+        out.append((self._key, value))
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        out: List[Tuple[str, Any]] = []
+        self._buf += chunk
+        buf = self._buf
+        while self._i < len(buf) and not self.done:
+            i, c = self._i, buf[self._i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._phase == "key":
+                        self._key = json.loads(buf[self._key_start:i + 1])
+                        self._phase = "colon"
+            elif self._depth == 0:
+                if c == "{":
+                    self._depth = 1
+                    self._phase = "key"
+            elif c == '"':
+                self._in_string = True
+                if self._depth == 1 and self._phase == "key":
+                    self._key_start = i
+                elif self._depth == 1 and self._phase == "value_start":
+                    self._value_start = i
+                    self._phase = "value"
+            elif c == ":" and self._depth == 1 and self._phase == "colon":
+                self._phase = "value_start"
+            elif c in "{[":
+                if self._depth == 1 and self._phase == "value_start":
+                    self._value_start = i
+                    self._phase = "value"
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    if self._phase == "value":
+                        self._emit(i, out)
+                    self.done = True
+            elif c == "," and self._depth == 1 and self._phase == "value":
+                self._emit(i, out)
+                self._phase = "key"
+            elif self._depth == 1 and self._phase == "value_start" and not c.isspace():
+                self._value_start = i   # number / true / false / null
+                self._phase = "value"
+            self._i += 1
+        return out
+
+
+def _replay(text: str, parse: Callable[[str], Dict[str, Any]]) -> Iterator[StreamEvent]:
+    """Serve a cached response through the same event protocol as a live stream."""
+    parser = IncrementalJSONObject()
+    yield "token", text
+    for field in parser.feed(text):
+        yield "field", field
+    yield "done", parse(text)
+
+
+def _pull(chunks: Iterator[str], s: Span) -> Iterator[str]:
+    """Advance the provider stream with s current (the transport counts attempts on the current
+    span), but never across our own yields, so the caller's code does not run inside s."""
+    try:
+        while True:
+            with use_span(s):
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        chunks.close()   # an abandoned stream closes its HTTP response now, not at garbage collection
+
+
+def _stream(key_parts: Dict[str, Any], chunks: Callable[[Span], Iterator[str]],
+            parse: Callable[[str], Dict[str, Any]], bypass_cache: bool, name: str = None,
+            validate: Callable[[str], bool] = is_json) -> Iterator[StreamEvent]:
+    key = None if CACHE_DISABLED else make_key(**key_parts)
+    with span(name or key_parts["provider"], provider=key_parts["provider"], model=key_parts.get("model"),
+              activate=False, streamed=True) as s:
+        if key and not bypass_cache:
+            hit = get_cache().get(key)
+            if hit is not None and validate(hit):
+                s.cache_hit = True
+                yield from _replay(hit, parse)
+                return
+
+        parser = IncrementalJSONObject()
+        parts = []
+        started = time.perf_counter()
+        for chunk in _pull(chunks(s), s):
+            parts.append(chunk)
+            if len(parts) == 1:
+                s.attrs["first_token_seconds"] = round(time.perf_counter() - started, 3)
+            yield "token", chunk
+            for field in parser.feed(chunk):
+                yield "field", field
+
+        text = "".join(parts)
+        s.parse_error = not validate(text)   # only output the agent can use is cached
+        if key and not s.parse_error:
+            get_cache().set(key, text)
+    yield "done", parse(text)
+
+
+def stream_claude(kwargs: Dict[str, Any], parse: Callable[[str], Dict[str, Any]],
+                  bypass_cache: bool = False, name: str = None,
+                  validate: Callable[[str], bool] = is_json) -> Iterator[StreamEvent]:
+    """Stream an Anthropic messages call; kwargs are the agent's usual request kwargs."""
+    def chunks(s: Span):
+        with get_anthropic_client().messages.stream(**kwargs) as stream:
+            for event in stream:
+                # Text replies and forced tool calls (structured output) stream the same JSON
+                if event.type == "content_block_delta":
+                    if event.delta.type == "text_delta":
+                        yield event.delta.text
+                    elif event.delta.type == "input_json_delta":
+                        yield event.delta.partial_json
+            record_usage(stream.get_final_message(), s)
+
+    yield from _stream({"provider": "anthropic", **kwargs}, chunks, parse, bypass_cache, name, validate)
+
+
+def stream_openai_chat(request: Dict[str, Any], parse: Callable[[str], Dict[str, Any]],
+                       bypass_cache: bool = False, name: str = None,
+                       validate: Callable[[str], bool] = is_json) -> Iterator[StreamEvent]:
+    """Stream an OpenAI chat completion; request holds model/messages/temperature."""
+    def chunks(s: Span):
+        # include_usage adds a final chunk with token counts (and no choices)
+        for event in get_openai_client().chat.completions.create(
+                stream=True, stream_options={"include_usage": True}, **request):
+            if event.usage:
+                record_usage(event, s)
+            if not event.choices:
+                continue
+            delta = event.choices[0].delta
+            if delta.content:
+                yield delta.content
+            for call in delta.tool_calls or ():
+                if call.function and call.function.arguments:
+                    yield call.function.arguments
+
+    yield from _stream({"provider": "openai", **request}, chunks, parse, bypass_cache, name, validate)
@@ -1,62 +1,224 @@
-import os, json, traceback
+import json
 import streamlit as st
-from dotenv import load_dotenv
 
-# load env (.env should have OPENAI_API_KEY and CLAUDE_API_KEY)
-load_dotenv()
-
-# local agents you already have
-from llm_agent import propose_next_step           # Listener Agent
+# local agents you already have (they run on the job queue workers: see job_queue.py)
+import settings  # noqa: F401  (reads .env once per process)
 from schema_types import IdeaSchema
-from analyst_agent import run_analyst_agent       # Analyst (Claude)
+from llm_cache import get_cache
+from instrumentation import breakdown
+from report_renderer import render_report, MIME_TYPES
+from single_flight import FLIGHTS, flight_key
+from job_queue import get_job_queue, JOB_POLL_SECONDS
+
+# Listener / Analyst / VC / Critic calls run as durable background jobs, so a rerun never waits on
+# an LLM and a reload (or a restart) resumes the job from ?job=<id>. Long-lived objects are held
+# with st.cache_resource, so a rerun reuses them instead of looking them up again.
+jobs = st.cache_resource(get_job_queue)()
+cache = st.cache_resource(get_cache)()
+
+AGENT_TITLES = [("analyst", "Analyst"), ("vc", "VC"), ("critic", "Critic")]
+
+
+def render_fields(fields: dict) -> None:
+    """Each top-level JSON field of an agent's output, as text, a bullet list or JSON."""
+    for key, value in fields.items():
+        st.markdown(f"**{key}**")
+        if isinstance(value, str):
+            st.write(value)
+        elif isinstance(value, list) and all(isinstance(v, str) for v in value):
+            st.markdown("\n".join(f"- {v}" for v in value))
+        else:
+            st.json(value)
+
+
+def render_breakdown(spans) -> None:
+    """Per-agent time, tokens and estimated cost for this run."""
+    rows = breakdown(spans)
+    if rows:
+        cost = sum(r["cost_usd"] for r in rows)
+        slowest = rows[0]
+        with st.expander(f"⏱️ Run breakdown · slowest: {slowest['step']} ({slowest['seconds']:.1f} s) · est. ${cost:.4f}"):
+            st.dataframe(rows, use_container_width=True)
+
+
+def submit_job(kind: str, payload: dict, key: str) -> None:
+    """Queue a pipeline job for this session (identical jobs already in flight are joined)."""
+    for k in ("validation", "quick", "job_error"):
+        st.session_state.pop(k, None)
+    st.session_state.job = jobs.submit(kind, payload, key=key)
+    st.query_params["job"] = st.session_state.job
+
+
+def forget_job() -> None:
+    st.session_state.pop("job", None)
+    st.query_params.pop("job", None)
+
+
+def render_progress(job: dict) -> None:
+    """Partial results of a running job: each step appears as soon as it has finished."""
+    partial = job["partial"] or {}
+    if job["status"] == "queued":
+        st.info("⏳ Waiting for a worker…")
+    if job["kind"] == "quick":
+        cols = st.columns(2)
+        for col, (name, title) in zip(cols, [("listener", "Structured Idea (Listener Output)"),
+                                             ("analyst", "Validation Report (Analyst Output)")]):
+            with col:
+                st.subheader(title)
+                render_fields(partial.get(name) or {})
+                st.caption("⏳ receiving…")
+        return
+    schema_data = partial.get("listener") or job["payload"].get("schema")
+    st.subheader("Structured Idea (Listener Output)")
+    if schema_data:
+        st.code(json.dumps(schema_data, indent=2, ensure_ascii=False), language="json")
+    else:
+        st.caption("⏳ Listener is structuring the idea…")
+    for col, (name, title) in zip(st.columns(3), AGENT_TITLES):
+        with col:
+            st.subheader(f"{title} Output")
+            if name in partial:
+                st.code(json.dumps(partial[name], indent=2, ensure_ascii=False), language="json")
+            elif schema_data:
+                st.caption("⏳ running…")
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def watch_job() -> None:
+    """Poll this session's job; once it is finished, keep its result and rerun the whole page."""
+    job = jobs.get(st.session_state.job)
+    if job is None:
+        forget_job()
+        return
+    if job["status"] in ("queued", "running"):
+        render_progress(job)
+        return
+    forget_job()
+    result = job["result"] or {}
+    if job["status"] == "error":
+        st.session_state.job_error = job["error"]
+    elif job["kind"] == "quick":
+        st.session_state.quick = result
+    else:
+        st.session_state.validation = {"results": result["results"], "ran": result["ran"], "spans": result["spans"]}
+    st.rerun()
+
+
+def render_quick(result: dict) -> None:
+    """Listener + Analyst results of a quick (non-full) validation."""
+    listener_out, analyst_report = result["listener"], result["analyst"]
+    schema_data = listener_out.get("current_schema") or {}
+    col1, col2 = st.columns(2)
+
+    # Step 1: Listener (auto-fill schema — Option 2 logic, no back-and-forth)
+    with col1:
+        st.subheader("Structured Idea (Listener Output)")
+        render_fields(schema_data)
+        if "error" in listener_out:
+            st.warning(listener_out["error"])
+        st.success("Listener Agent complete ✅")
+
+    # Step 2: Analyst (Claude)
+    with col2:
+        st.subheader("Validation Report (Analyst Output)")
+        render_fields({k: v for k, v in analyst_report.items() if k not in ("error", "raw")})
+        if "error" in analyst_report:
+            st.warning(analyst_report["error"])
+            st.code(analyst_report.get("raw", ""), language="json")
+        st.success("Analyst Agent complete ✅")
+
+    if result.get("first_field_ms") is not None:
+        st.caption(f"First field after {result['first_field_ms']:.0f} ms · total {result['total_seconds']:.1f} s")
+    render_breakdown(result["spans"])
+
+    # Optional: single downloadable combined output
+    combined = {
+        "listener_schema": schema_data,
+        "analyst_report": analyst_report
+    }
+    st.download_button("Download Combined JSON", data=json.dumps(combined, indent=2, ensure_ascii=False),
+                       file_name="idea_validation.json", mime="application/json")
+
+
+def render_validation(validation: dict) -> None:
+    """Full-validation results, plus a form to edit the schema and re-run only the affected agents."""
+    results = validation["results"]
+    schema_data = results.get("listener") or {}
+
+    st.subheader("Structured Idea (Listener Output)")
+    st.code(json.dumps(schema_data, indent=2, ensure_ascii=False), language="json")
+
+    cols = st.columns(3)
+    for col, (name, title) in zip(cols, AGENT_TITLES):
+        with col:
+            st.subheader(f"{title} Output")
+            if name in results and name not in validation["ran"]:
+                st.caption("♻️ Reused: the fields this agent reads match an earlier validation")
+            output = results.get(name, {"error": "Not run (Listener failed)"})
+            if "error" in output:
+                st.warning(output["error"])
+            st.code(json.dumps(output, indent=2, ensure_ascii=False), language="json")
+
+    render_breakdown(validation["spans"])
+    cols = st.columns(4)
+    cols[0].download_button("Download Combined JSON", data=json.dumps(results, indent=2, ensure_ascii=False),
+                            file_name="idea_validation.json", mime="application/json")
+    # Rendered in memory on each rerun; no temp files
+    for col, (fmt, label) in zip(cols[1:], [("docx", "Word"), ("md", "Markdown"), ("html", "HTML")]):
+        col.download_button(f"Download {label} report", data=render_report(results, fmt),
+                            file_name=f"idea_report.{fmt}", mime=MIME_TYPES[fmt], key=f"report_{fmt}")
+
+    if not schema_data:
+        return
+    with st.form("edit_schema"):
+        st.markdown("**Edit the idea and re-validate** (only agents that read a changed field re-run)")
+        edited = {f: st.text_input(f, value=str(schema_data.get(f) or "")) for f in IdeaSchema.model_fields}
+        resubmit = st.form_submit_button("Re-validate")
+    if resubmit:
+        new_schema = {**schema_data, **{k: (v.strip() or None) for k, v in edited.items()}}
+        submit_job("revalidate", {"schema": new_schema}, key=flight_key(pipeline="revalidate", schema=new_schema))
+        st.rerun()
+
 
 st.set_page_config(page_title="Idea Validator (Listener → Analyst)", page_icon="🧠", layout="wide")
 st.title("Idea Validator")
 st.caption("Paste an idea → we auto-structure it → send to Analyst → show final results.")
 
+# A job still running when the page was reloaded
+if st.query_params.get("job") and not st.session_state.get("job"):
+    st.session_state.job = st.query_params["job"]
+
 with st.form("idea_form"):
     idea_text = st.text_area(
         "Your idea (one input, one click, done):",
         height=140,
         placeholder="e.g., A micro-SaaS Greetings Generator so anyone can send customized greetings instead of generic ones."
     )
+    full_validation = st.checkbox("Full validation: run Analyst, VC and Critic in parallel", value=False)
+    fresh = st.checkbox("Bypass response cache (force fresh LLM calls)", value=False)
     submitted = st.form_submit_button("Validate Idea")
 
 if submitted:
     if not idea_text.strip():
         st.warning("Please enter your idea.")
         st.stop()
+    # Identical ideas submitted while one is in flight (other users, double clicks) join that job
+    kind = "validate" if full_validation else "quick"
+    submit_job(kind, {"idea": idea_text, "bypass_cache": fresh},
+               key=flight_key(idea_text, pipeline=kind, bypass_cache=fresh))
 
-    try:
-        # Step 1: Listener (auto-fill schema — Option 2 logic, no back-and-forth)
-        st.write("⏳ Running Listener Agent…")
-        empty_schema = IdeaSchema()
-        listener_out = propose_next_step(idea_text, empty_schema, [])
-        schema_data = listener_out.get("current_schema") or {}
-        st.success("Listener Agent complete ✅")
-
-        # Step 2: Analyst (Claude)
-        st.write("⏳ Running Analyst Agent…")
-        analyst_report = run_analyst_agent(schema_data)
-        st.success("Analyst Agent complete ✅")
+if st.session_state.get("job"):
+    watch_job()
+elif st.session_state.get("job_error"):
+    st.error(f"Something went wrong: {st.session_state.job_error}")
+elif st.session_state.get("validation"):
+    render_validation(st.session_state.validation)
+elif st.session_state.get("quick"):
+    render_quick(st.session_state.quick)
 
-        # Display (one screen, two sections)
-        col1, col2 = st.columns(2)
-        with col1:
-            st.subheader("Structured Idea (Listener Output)")
-            st.code(json.dumps(schema_data, indent=2, ensure_ascii=False), language="json")
-        with col2:
-            st.subheader("Validation Report (Analyst Output)")
-            st.code(json.dumps(analyst_report, indent=2, ensure_ascii=False), language="json")
-
-        # Optional: single downloadable combined output
-        combined = {
-            "listener_schema": schema_data,
-            "analyst_report": analyst_report
-        }
-        st.download_button("Download Combined JSON", data=json.dumps(combined, indent=2, ensure_ascii=False),
-                           file_name="idea_validation.json", mime="application/json")
-
-    except Exception as e:
-        st.error(f"Something went wrong: {e}")
-        st.exception(traceback.format_exc())
+stats = cache.stats()
+flights = FLIGHTS.stats()
+queue = jobs.stats()
+st.caption(f"LLM cache: {stats['hits']} hits / {stats['misses']} misses this process · {stats['entries']} stored responses"
+           f" · {flights['joined']} duplicate in-flight validations coalesced"
+           f" · jobs: {queue['queued']} queued, {queue['running']} running")
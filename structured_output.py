@@ -0,0 +1,101 @@
+import os
+import json
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+import settings  # noqa: F401  (reads .env once per process)
+from output_models import coerce
+from instrumentation import current_span, record_usage
+
+# Tool/function calling for agent outputs (set STRUCTURED_OUTPUT=0 to go back to plain JSON prompting)
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "1").lower() not in ("0", "false", "no")
+# Extra calls allowed when local repair cannot recover a valid object
+STRUCTURED_RETRIES = int(os.getenv("STRUCTURED_RETRIES", "1"))
+
+Extract = Callable[[Any], Tuple[str, bool]]
+
+
+class StructuredOutputError(ValueError):
+    """No reply validated against the output model, retries included. `raw` is the last reply."""
+
+    def __init__(self, reason: str, raw: str):
+        super().__init__(reason)
+        self.reason, self.raw = reason, raw
+
+
+def claude_output(resp) -> Tuple[str, bool]:
+    """(JSON of the tool call, or the text reply; was it cut off by max_tokens?)"""
+    for block in resp.content:
+        if block.type == "tool_use":
+            return json.dumps(block.input, ensure_ascii=False), resp.stop_reason == "max_tokens"
+    text = "".join(b.text for b in resp.content if b.type == "text")
+    return text, resp.stop_reason == "max_tokens"
+
+
+def openai_output(resp) -> Tuple[str, bool]:
+    choice = resp.choices[0]
+    truncated = choice.finish_reason == "length"
+    if choice.message.tool_calls:
+        return choice.message.tool_calls[0].function.arguments or "", truncated
+    return choice.message.content or "", truncated
+
+
+def _retry_kwargs(kwargs: Dict[str, Any], raw: str, reason: str, truncated: bool) -> Dict[str, Any]:
+    """
+    Targeted retry: a cut-off answer is asked again with twice the token budget; an
+    invalid one gets the validation errors back so the model only has to fix those.
+    """
+    if truncated and kwargs.get("max_tokens"):
+        return {**kwargs, "max_tokens": kwargs["max_tokens"] * 2}
+    fix = (f"Your previous reply could not be used ({reason}). Reply again with the complete, "
+           f"corrected object only" + (", using the tool." if kwargs.get("tools") else ", as JSON."))
+    return {**kwargs, "messages": list(kwargs["messages"]) + [
+        {"role": "assistant", "content": raw.strip() or "(empty)"},
+        {"role": "user", "content": fix},
+    ]}
+
+
+def _accept(raw: str, model: Type[BaseModel], attempt: int) -> Tuple[Optional[str], str]:
+    data, reason = coerce(raw, model)
+    if data is None:
+        return None, reason
+    s = current_span()
+    if s is not None:
+        try:
+            json.loads(raw)
+        except (TypeError, json.JSONDecodeError):
+            s.attrs["repaired"] = True   # fixed locally, no extra call
+        if attempt:
+            s.attrs["structured_retries"] = attempt
+    return json.dumps(data, ensure_ascii=False), ""
+
+
+def call_structured(kwargs: Dict[str, Any], model: Type[BaseModel], create: Callable[[Dict[str, Any]], Any],
+                    extract: Extract) -> str:
+    """
+    Run create(kwargs), then parse -> repair locally -> validate against `model`, retrying
+    with a targeted request only when that fails. Returns canonical JSON text; raises
+    StructuredOutputError if no reply validated (so nothing unvalidated reaches the cache,
+    and the model router can fail over). Callers turn it into their usual error dict.
+    """
+    raw, truncated = extract(record_usage(create(kwargs)))
+    for attempt in range(STRUCTURED_RETRIES + 1):
+        text, reason = _accept(raw, model, attempt)
+        if text is not None:
+            return text
+        if attempt == STRUCTURED_RETRIES:
+            raise StructuredOutputError(reason, raw)
+        raw, truncated = extract(record_usage(create(_retry_kwargs(kwargs, raw, reason, truncated))))
+
+
+async def call_structured_async(kwargs: Dict[str, Any], model: Type[BaseModel], create, extract: Extract) -> str:
+    """Async twin of call_structured; create(kwargs) returns an awaitable response."""
+    raw, truncated = extract(record_usage(await create(kwargs)))
+    for attempt in range(STRUCTURED_RETRIES + 1):
+        text, reason = _accept(raw, model, attempt)
+        if text is not None:
+            return text
+        if attempt == STRUCTURED_RETRIES:
+            raise StructuredOutputError(reason, raw)
+        raw, truncated = extract(record_usage(await create(_retry_kwargs(kwargs, raw, reason, truncated))))
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# The modules live at the repository root (no package): make them importable from the tests
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# No response cache and no metrics file from test runs
+os.environ.setdefault("LLM_CACHE_DISABLED", "1")
+os.environ.setdefault("LLM_METRICS_DISABLED", "1")
@@ -0,0 +1,156 @@
+import asyncio
+
+import pytest
+
+from agent_dag import AgentDAG, AgentNode
+
+
+def make_dag(calls, fail=(), **kwargs):
+    def node(name):
+        async def run(inputs, upstream, bypass):
+            calls.append(name)
+            if name in fail:
+                return {"error": f"{name} failed"}
+            return {"seen": inputs, "upstream": sorted(upstream)}
+        return run
+
+    return AgentDAG([
+        AgentNode("market", node("market"), fields=("problem", "target_customer")),
+        AgentNode("pricing", node("pricing"), fields=("business_model",)),
+        AgentNode("verdict", node("verdict"), fields=("problem",), depends_on=("market", "pricing")),
+    ], **kwargs)
+
+
+SCHEMA = {"problem": "cards are generic", "target_customer": "families", "business_model": "subscription",
+          "moat": "none"}
+
+
+def run(dag, schema, **kwargs):
+    return asyncio.run(dag.run_async(schema, **kwargs))
+
+
+def test_unchanged_schema_is_served_from_memo():
+    calls = []
+    dag = make_dag(calls)
+    first, ran = run(dag, SCHEMA)
+    assert sorted(ran) == ["market", "pricing", "verdict"]
+    assert first["verdict"]["upstream"] == ["market", "pricing"]
+
+    again, ran = run(dag, dict(SCHEMA))
+    assert ran == [] and again == first
+    assert len(calls) == 3
+    assert dag.stale(SCHEMA) == []
+
+
+def test_fields_a_node_does_not_read_do_not_invalidate_it():
+    dag = make_dag([])
+    run(dag, SCHEMA)
+    _, ran = run(dag, {**SCHEMA, "moat": "network effects"})
+    assert ran == []
+
+
+def test_changed_field_reruns_the_node_and_everything_downstream():
+    calls = []
+    dag = make_dag(calls)
+    run(dag, SCHEMA)
+    edited = {**SCHEMA, "business_model": "one-off purchase"}
+    assert dag.stale(edited) == ["pricing", "verdict"]
+    results, ran = run(dag, edited)
+    assert ran == ["pricing", "verdict"]
+    assert results["pricing"]["seen"] == {"business_model": "one-off purchase"}
+    assert calls[3:] == ["pricing", "verdict"]
+
+
+def test_requested_nodes_pull_in_their_dependencies_only():
+    dag = make_dag([])
+    results, ran = run(dag, SCHEMA, names=["pricing"])
+    assert ran == ["pricing"] and set(results) == {"pricing"}
+    assert dag.with_dependencies(["verdict"]) == ["market", "pricing", "verdict"]
+
+
+def test_failed_results_are_not_memoized():
+    calls = []
+    dag = make_dag(calls, fail=("market",))
+    first, _ = run(dag, SCHEMA)
+    assert first["market"] == {"error": "market failed"}
+    _, ran = run(dag, SCHEMA)
+    assert ran == ["market"]
+
+
+def test_bypass_cache_reruns_everything():
+    dag = make_dag([])
+    run(dag, SCHEMA)
+    _, ran = run(dag, SCHEMA, bypass_cache=True)
+    assert sorted(ran) == ["market", "pricing", "verdict"]
+
+
+def test_memo_is_bounded_least_recently_used_first():
+    dag = make_dag([], max_entries=3)
+    run(dag, SCHEMA)                                  # market, pricing, verdict
+    run(dag, {**SCHEMA, "business_model": "ads"})     # market reused; the new pricing + verdict evict the old ones
+    _, ran = run(dag, SCHEMA)
+    assert ran == ["pricing", "verdict"]
+
+
+def test_wrap_sees_only_nodes_that_run():
+    dag = make_dag([])
+    wrapped = []
+
+    async def wrap(name, coro):
+        wrapped.append(name)
+        return await coro
+
+    run(dag, SCHEMA, wrap=wrap)
+    run(dag, {**SCHEMA, "problem": "cards are dull"}, wrap=wrap)
+    assert wrapped[3:] == ["market", "verdict"]
+
+
+def test_invalid_graphs_are_rejected():
+    async def noop(inputs, upstream, bypass):
+        return {}
+
+    with pytest.raises(ValueError, match="unknown"):
+        AgentDAG([AgentNode("a", noop, fields=(), depends_on=("b",))])
+    with pytest.raises(ValueError, match="Cycle"):
+        AgentDAG([AgentNode("a", noop, fields=(), depends_on=("b",)),
+                  AgentNode("b", noop, fields=(), depends_on=("a",))])
+
+
+def test_sync_cli_path_shares_the_dag_memo(monkeypatch):
+    import orchestrator
+    import analyst_agent
+    from agent_dag import VALIDATION_DAG
+
+    schema = {"idea_title": "Greetings", "problem": "generic cards"}
+    calls = []
+
+    async def analyst(inputs, bypass_cache=False):
+        calls.append(inputs)
+        return {"market": "big"}
+
+    monkeypatch.setattr(orchestrator, "propose_next_step", lambda *args: {"current_schema": schema})
+    monkeypatch.setattr(analyst_agent, "run_analyst_agent_async", analyst)   # what the DAG node calls
+    monkeypatch.setattr(VALIDATION_DAG, "index", None)
+    VALIDATION_DAG.clear()
+    try:
+        assert orchestrator.run_orchestrator("greetings") == (schema, {"market": "big"})
+        assert VALIDATION_DAG.stale(schema, ["analyst"]) == []        # recorded in the memo
+        reports, ran = asyncio.run(VALIDATION_DAG.run_async(schema, ["analyst"]))
+        assert ran == [] and reports["analyst"] == {"market": "big"} and len(calls) == 1
+    finally:
+        VALIDATION_DAG.clear()
+
+
+def test_shared_prompt_block_holds_only_fields_every_agent_reads():
+    import prompt_prefix
+    from agent_dag import VALIDATION_DAG
+
+    shared = prompt_prefix.shared_fields()
+    assert shared and all(set(shared) <= set(node.fields) for node in VALIDATION_DAG.nodes.values())
+    outside = [f for node in VALIDATION_DAG.nodes.values() for f in node.fields if f not in shared]
+    assert all(any(f not in node.fields for node in VALIDATION_DAG.nodes.values()) for f in outside)
+
+    schema = {"idea_title": "Greetings", "pricing": "$5"}
+    kwargs = prompt_prefix.panel_request("vc", schema, "claude", 100)
+    assert '"idea_title"' in kwargs["system"][1]["text"] and '"pricing"' not in kwargs["system"][1]["text"]
+    assert '"pricing"' in kwargs["messages"][0]["content"]
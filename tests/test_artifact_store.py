@@ -0,0 +1,22 @@
+import pytest
+
+from artifact_store import ArtifactStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ArtifactStore(str(tmp_path / "intake.db"), str(tmp_path / "artifacts"))
+
+
+def test_failed_processing_releases_the_hash_and_is_retried(store):
+    def broken(path):
+        raise RuntimeError("extraction failed")
+
+    with pytest.raises(RuntimeError):
+        store.get_or_process(b"same bytes", "notes.txt", broken)
+    assert store._inflight == {}
+
+    artifact = store.get_or_process(b"same bytes", "notes.txt", lambda path: "text")
+    assert (artifact["text_extracted"], artifact["cached"]) == ("text", False)
+    assert store.get_or_process(b"same bytes", "notes.txt", broken)["cached"] is True
+    assert store._inflight == {}
@@ -0,0 +1,34 @@
+from context_compactor import compact_context, chunk_text, estimate_tokens, CHUNK_TOKENS
+from extractors import consolidate_inputs
+
+
+def test_under_budget_is_unchanged():
+    text = consolidate_inputs("idea", "a short document", "")
+    assert compact_context(text, budget=1000) == text
+
+
+def test_chunks_never_exceed_chunk_tokens():
+    text = " ".join(["word"] * 5000) + "\n\n" + "Short paragraph."
+    chunks = chunk_text(text)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(c) <= CHUNK_TOKENS for c in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+
+def test_unpunctuated_block_is_compacted_not_dropped():
+    text = consolidate_inputs("idea", " ".join(["word"] * 20000), "")
+    out = compact_context(text, budget=1000)
+    assert out.startswith("[TYPED]\nidea")
+    assert "[DOC]" in out and "word" in out
+    assert estimate_tokens(out) <= 1000 + 10   # block headers and "[…]" markers aside
+
+
+def test_typed_and_answers_kept_whole_and_relevant_chunks_win():
+    doc = "\n\n".join(["Filler about the weather and nothing else. " * 10] * 40
+                      + ["Our target customer is small bakeries; the business model is a monthly subscription."])
+    text = consolidate_inputs("greetings app", doc, "") + "\n\n[ANSWER to pricing]\n$5 per month"
+    out = compact_context(text, budget=400)
+    assert "[TYPED]\ngreetings app" in out
+    assert "[ANSWER to pricing]\n$5 per month" in out
+    assert "small bakeries" in out
+    assert estimate_tokens(out) <= 400 + 20
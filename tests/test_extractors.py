@@ -0,0 +1,91 @@
+import io
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+import extractors
+import neet_rag
+from extractors import iter_pdf_pages, extract_text_from_pdf
+
+
+def make_pdf(pages):
+    """A PDF with one page per string; empty strings become blank pages."""
+    writer = PdfWriter()
+    font = DictionaryObject({NameObject("/Type"): NameObject("/Font"), NameObject("/Subtype"): NameObject("/Type1"),
+                             NameObject("/BaseFont"): NameObject("/Helvetica")})
+    for text in pages:
+        page = writer.add_blank_page(width=300, height=300)
+        if text:
+            stream = DecodedStreamObject()
+            stream.set_data(f"BT /F1 12 Tf 20 200 Td ({text}) Tj ET".encode("latin-1"))
+            page[NameObject("/Contents")] = writer._add_object(stream)
+            page[NameObject("/Resources")] = DictionaryObject(
+                {NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})})
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def test_page_numbers_count_skipped_blank_pages():
+    pdf = make_pdf(["", "first", "", "", "second"])
+    assert list(iter_pdf_pages(pdf, workers=1)) == [(2, "first"), (5, "second")]
+    assert extract_text_from_pdf(pdf) == "first\nsecond"
+
+
+def test_page_budget_counts_physical_pages():
+    pdf = make_pdf(["", "first", "second"])
+    assert list(iter_pdf_pages(pdf, max_pages=2, workers=1)) == [(2, "first")]
+
+
+def test_rag_blocks_carry_real_page_numbers(tmp_path):
+    path = tmp_path / "notes.pdf"
+    path.write_bytes(make_pdf(["", "Mitosis", "", "Meiosis"]))
+    assert list(neet_rag.iter_blocks(str(path))) == [("Mitosis", 2), ("Meiosis", 4)]
+
+
+def test_rag_ingest_uses_its_own_page_budget(tmp_path, monkeypatch):
+    path = tmp_path / "book.pdf"
+    path.write_bytes(make_pdf(["one", "two", "three"]))
+    monkeypatch.setattr(neet_rag, "RAG_MAX_PDF_PAGES", 2)
+    assert [page for _, page in neet_rag.iter_blocks(str(path))] == [1, 2]
+
+
+def api_error(cls, status):
+    request = httpx.Request("POST", "https://api.openai.com/v1/audio/transcriptions")
+    return cls("error", response=httpx.Response(status, request=request), body=None)
+
+
+def fake_transcriber(monkeypatch, failures):
+    """get_client() stand-in whose models raise failures[model], or else transcribe; returns the models tried."""
+    tried = []
+
+    def create(model, file):
+        tried.append(model)
+        if model in failures:
+            raise failures[model]
+        return SimpleNamespace(text=f" {model} ", usage=None)
+
+    client = SimpleNamespace(audio=SimpleNamespace(transcriptions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(extractors, "get_client", lambda: client)
+    monkeypatch.setattr(extractors, "TRANSCRIBE_MODELS", ["primary", "fallback"])
+    monkeypatch.setattr(extractors, "_working_model", None)
+    return tried
+
+
+def test_unavailable_model_falls_back_and_is_remembered(monkeypatch):
+    tried = fake_transcriber(monkeypatch, {"primary": api_error(openai.NotFoundError, 404)})
+    assert extractors._transcribe_segment("a.wav", b"") == "fallback"
+    assert extractors._transcribe_segment("b.wav", b"") == "fallback"
+    assert tried == ["primary", "fallback", "fallback"]
+
+
+def test_bad_segment_fails_without_switching_models(monkeypatch):
+    tried = fake_transcriber(monkeypatch, {"primary": api_error(openai.BadRequestError, 400)})
+    with pytest.raises(openai.BadRequestError):
+        extractors._transcribe_segment("a.wav", b"")
+    assert tried == ["primary"]
+    assert extractors._working_model is None
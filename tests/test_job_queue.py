@@ -0,0 +1,149 @@
+import os
+import time
+import threading
+
+import pytest
+
+import job_queue
+import orchestrator
+from job_queue import JobQueue, handler, HANDLERS, JOB_MAX_ATTEMPTS
+
+
+@pytest.fixture
+def kinds():
+    added = []
+
+    def register(kind, fn):
+        handler(kind)(fn)
+        added.append(kind)
+
+    yield register
+    for kind in added:
+        HANDLERS.pop(kind, None)
+
+
+def wait_for(queue, job_id, status, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while (job := queue.get(job_id))["status"] != status:
+        assert time.monotonic() < deadline, f"job stayed {job['status']}"
+        time.sleep(0.01)
+    return job
+
+
+def test_expired_lease_is_reclaimed_by_another_worker(tmp_path, kinds):
+    kinds("echo", lambda payload, report: {"echo": payload})
+    db = str(tmp_path / "jobs.db")
+    crashed = JobQueue(db, workers=0, lease_seconds=0.1)   # no heartbeat: behaves like a dead process
+    job_id = crashed.submit("echo", {"n": 1})
+    assert crashed._claim()["id"] == job_id
+
+    other = JobQueue(db, workers=0, lease_seconds=0.1)
+    assert other._claim() is None                          # lease still held
+    time.sleep(0.15)
+    job = other._claim()
+    assert (job["id"], job["attempts"]) == (job_id, 2)
+
+    crashed._update(job_id, "status = 'error', error = ?", ("stale worker",))
+    assert other.get(job_id)["status"] == "running"        # the old owner can no longer write to it
+    other._run(job)
+    assert other.get(job_id)["result"]["echo"] == {"n": 1}
+
+
+def test_heartbeat_keeps_a_long_job_from_being_reclaimed(tmp_path, kinds):
+    release = threading.Event()
+    kinds("slow", lambda payload, report: {"ok": release.wait(5)})
+    db = str(tmp_path / "jobs.db")
+    worker = JobQueue(db, workers=1, lease_seconds=0.1)
+    try:
+        job_id = worker.submit("slow", {})
+        wait_for(worker, job_id, "running")
+        other = JobQueue(db, workers=0, lease_seconds=0.1)
+        time.sleep(0.35)                                   # several lease periods
+        assert other._claim() is None
+        release.set()
+        assert wait_for(worker, job_id, "done")["attempts"] == 1
+    finally:
+        release.set()
+        worker.stop()
+
+
+def test_job_that_keeps_losing_its_worker_gives_up(tmp_path, kinds):
+    kinds("echo", lambda payload, report: {})
+    queue = JobQueue(str(tmp_path / "jobs.db"), workers=0, lease_seconds=0.01)
+    job_id = queue.submit("echo", {})
+    for _ in range(JOB_MAX_ATTEMPTS + 1):
+        job = queue._claim()
+        time.sleep(0.02)
+    queue._run(job)
+    assert queue.get(job_id)["status"] == "error"
+    assert "Gave up" in queue.get(job_id)["error"]
+
+
+def test_reclaimed_job_still_finds_its_upload(tmp_path, monkeypatch, kinds):
+    monkeypatch.setattr(job_queue, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    kinds("read", lambda payload, report: {"text": open(payload["doc"]["path"]).read()})
+    upload = tmp_path / "notes.txt"
+    upload.write_text("pitch")
+    with open(upload, "rb") as f:
+        doc = job_queue.save_upload(f, "notes.txt")
+    db = str(tmp_path / "jobs.db")
+    crashed = JobQueue(db, workers=0, lease_seconds=0.05)
+    job_id = crashed.submit("read", {"doc": doc})
+    crashed._claim()                                       # dies before finishing
+
+    time.sleep(0.1)
+    other = JobQueue(db, workers=0, lease_seconds=0.05)
+    other._run(other._claim())
+    assert other.get(job_id)["result"]["text"] == "pitch"
+    assert not os.path.exists(doc["path"])                 # removed once the job is done
+
+
+def test_followup_round_runs_on_the_queue_and_saves_the_next_question(tmp_path, monkeypatch):
+    import llm_agent
+    import session_store
+    sessions = session_store.SessionStore(str(tmp_path / "intake.db"))
+    monkeypatch.setattr(session_store, "_store", sessions)
+    calls = []
+
+    def apply_followup(schema, field, answer, skipped=()):
+        calls.append((field, answer, list(skipped)))
+        return {"current_schema": {**schema.model_dump(), field: answer},
+                "question": "Who pays?", "missing_field": "business_model"}
+
+    monkeypatch.setattr(llm_agent, "apply_followup", apply_followup)
+    queue = JobQueue(str(tmp_path / "jobs.db"), workers=0)
+    sid = sessions.create_session()
+    job_id = queue.submit("followup", {"session_id": sid, "mode": "delta", "schema": {}, "field": "target_customer",
+                                       "answer": "dentists", "skipped": ["pricing"]}, session_id=sid)
+    queue._run(queue._claim())
+
+    result = queue.get(job_id)["result"]
+    assert calls == [("target_customer", "dentists", ["pricing"])]
+    assert (result["pending_question"], result["pending_field"]) == ("Who pays?", "business_model")
+    saved = sessions.load_session(sid)
+    assert saved["session"]["idea_schema"]["target_customer"] == "dentists"
+    assert saved["messages"][-1]["payload"] == {"kind": "question", "missing_field": "business_model"}
+    sessions.close()
+
+
+def test_identical_queued_job_is_joined(tmp_path, kinds):
+    kinds("echo", lambda payload, report: {})
+    queue = JobQueue(str(tmp_path / "jobs.db"), workers=0)
+    first = queue.submit("echo", {}, key="k")
+    assert queue.submit("echo", {}, key="k") == first
+    assert queue.submit("echo", {}, key="other") != first
+
+
+def test_validate_reports_only_the_agents_that_ran(monkeypatch):
+    schema = {"idea_summary": "greetings"}
+    monkeypatch.setattr(orchestrator, "propose_next_step", lambda *args: {"current_schema": schema})
+
+    async def run_dag(schema_data, agents, timeouts, bypass_cache, on_result=None):
+        return {"analyst": {"a": 1}, "vc": {"v": 1}, "critic": {"c": 1}}, ["critic"]
+
+    monkeypatch.setattr(orchestrator, "_run_dag", run_dag)
+    partial = {}
+    result = job_queue.run_validate({"idea": "greetings app"}, partial.__setitem__)
+    assert result["ran"] == ["critic"]
+    assert set(result["results"]) == {"listener", "analyst", "vc", "critic"}
+    assert partial == {"listener": schema}
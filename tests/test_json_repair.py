@@ -0,0 +1,50 @@
+import pytest
+
+from json_repair import repair_json, loads_lenient, strip_fences
+
+
+def test_fenced_json_with_prose_around_it():
+    text = 'Here is the report:\n```json\n{"market": "big", "score": 7}\n```\nLet me know!'
+    assert strip_fences(text) == '{"market": "big", "score": 7}'
+    assert repair_json(text) == {"market": "big", "score": 7}
+
+
+def test_unclosed_fence_and_trailing_commas():
+    assert repair_json('```json\n{"a": [1, 2,], "b": {"c": 3,},}') == {"a": [1, 2], "b": {"c": 3}}
+
+
+def test_first_object_wins_over_trailing_prose_or_second_object():
+    assert repair_json('{"a": 1} and then {"b": 2}') == {"a": 1}
+
+
+def test_truncated_inside_a_string_is_closed():
+    assert repair_json('{"summary": "a strong idea with') == {"summary": "a strong idea with"}
+
+
+def test_truncated_after_a_backslash_drops_the_escape():
+    assert repair_json('{"path": "C:\\') == {"path": "C:"}
+
+
+def test_incomplete_last_member_is_dropped():
+    assert repair_json('{"market": "big", "competition": [{"name": "X"}, {"name": "Y", "share":') == \
+        {"market": "big", "competition": [{"name": "X"}, {"name": "Y"}]}
+    assert repair_json('{"market": "big", "score"') == {"market": "big"}
+
+
+def test_brackets_inside_strings_are_not_counted():
+    assert repair_json('{"note": "use {braces} and [brackets]", "x": [1') == \
+        {"note": "use {braces} and [brackets]", "x": [1]}
+
+
+@pytest.mark.parametrize("text", ["", "no json here", "```\nstill nothing\n```"])
+def test_nothing_recoverable(text):
+    assert repair_json(text) is None
+
+
+def test_loads_lenient_prefers_strict_parse_and_raises_when_hopeless():
+    assert loads_lenient('[1, 2]') == [1, 2]
+    assert loads_lenient('```json\n{"a": 1,}\n```') == {"a": 1}
+    with pytest.raises(ValueError):
+        loads_lenient("sorry, I cannot help with that")
+    with pytest.raises(ValueError):
+        loads_lenient(None)
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+import llm_cache
+import analyst_agent
+from llm_cache import ResponseCache, cached_call, make_key
+from output_models import AnalystReport, validator
+
+VALID = json.dumps({k: "ok" for k in AnalystReport.model_fields})
+INVALID = json.dumps({"market": "big"})   # parses as JSON, fails the AnalystReport model
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    store = ResponseCache(str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(llm_cache, "CACHE_DISABLED", False)
+    monkeypatch.setattr(llm_cache, "_cache", store)
+    return store
+
+
+def test_schema_invalid_reply_is_not_cached(cache):
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return INVALID
+
+    for _ in range(2):
+        assert cached_call({"k": 1}, fetch, validate=validator(AnalystReport)) == INVALID
+    assert len(calls) == 2                          # asked again instead of replaying the bad reply
+    assert cache.get(make_key(k=1)) is None
+
+
+def test_schema_valid_reply_is_cached_and_replayed(cache):
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return VALID
+
+    for _ in range(2):
+        assert cached_call({"k": 2}, fetch, validate=validator(AnalystReport)) == VALID
+    assert len(calls) == 1
+
+
+def test_invalid_entry_already_in_the_cache_is_not_replayed(cache):
+    cache.set(make_key(k=3), INVALID)
+    assert cached_call({"k": 3}, lambda: VALID, validate=validator(AnalystReport)) == VALID
+    assert cache.get(make_key(k=3)) == VALID
+
+
+def test_agent_does_not_cache_a_report_that_fails_its_model(cache, monkeypatch):
+    monkeypatch.setattr(analyst_agent, "route", lambda *args: INVALID)
+    report = analyst_agent.run_analyst_agent({"idea_title": "Greetings"})
+    assert "error" in report
+    kwargs = analyst_agent._request_kwargs({"idea_title": "Greetings"})
+    assert cache.get(make_key(provider="anthropic", **kwargs)) is None
@@ -0,0 +1,106 @@
+import asyncio
+
+import model_router
+from model_router import ModelRouter
+
+
+def test_hedge_delay_follows_the_live_candidate_after_failover(monkeypatch):
+    monkeypatch.setattr(model_router, "HEDGING", True)
+    monkeypatch.setattr(model_router, "HEDGE_MIN_SAMPLES", 1)
+    monkeypatch.setattr(model_router, "HEDGE_MIN_DELAY", 0.0)
+    monkeypatch.setenv("OPENAI_API_KEY", "x")
+    router = ModelRouter(routes={"agent": ["openai:backup", "openai:spare"]})
+    router.tracker("openai:primary").samples.append(60.0)   # would never hedge in time
+    router.tracker("openai:backup").samples.append(0.05)
+    calls = []
+
+    async def attempt(candidate, provider, kwargs, output_model):
+        calls.append(candidate)
+        if candidate == "openai:primary":
+            raise RuntimeError("down")
+        if candidate == "openai:backup":
+            await asyncio.sleep(5)
+        return candidate
+
+    monkeypatch.setattr(model_router, "_attempt_async", attempt)
+    result = asyncio.run(asyncio.wait_for(
+        router.route_async("agent", "openai", {"model": "primary"}, None), timeout=2))
+    # backup is slower than its own p95, so the spare is hedged in well before the primary's 60 s
+    assert result == "openai:spare"
+    assert calls == ["openai:primary", "openai:backup", "openai:spare"]
+
+
+def test_losing_hedge_is_cancelled(monkeypatch):
+    monkeypatch.setattr(model_router, "HEDGING", True)
+    monkeypatch.setattr(model_router, "HEDGE_MIN_SAMPLES", 1)
+    monkeypatch.setattr(model_router, "HEDGE_MIN_DELAY", 0.0)
+    monkeypatch.setenv("OPENAI_API_KEY", "x")
+    router = ModelRouter(routes={"agent": ["openai:backup"]})
+    router.tracker("openai:primary").samples.append(0.05)
+    cancelled = []
+
+    async def attempt(candidate, provider, kwargs, output_model):
+        try:
+            await asyncio.sleep(5 if candidate == "openai:primary" else 0.1)
+        except asyncio.CancelledError:
+            cancelled.append(candidate)
+            raise
+        return candidate
+
+    monkeypatch.setattr(model_router, "_attempt_async", attempt)
+
+    async def main():
+        result = await router.route_async("agent", "openai", {"model": "primary"}, None)
+        await asyncio.sleep(0)   # let the cancellation land
+        return result
+
+    assert asyncio.run(main()) == "openai:backup"
+    assert cancelled == ["openai:primary"]
+
+
+def test_hedging_is_off_by_default():
+    assert model_router.HEDGING is False
+
+
+def test_no_hedge_to_default_fallback_or_the_same_model(monkeypatch):
+    monkeypatch.setattr(model_router, "HEDGING", True)
+    monkeypatch.setattr(model_router, "HEDGE_MIN_SAMPLES", 1)
+    monkeypatch.setattr(model_router, "HEDGE_MIN_DELAY", 0.0)
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "x")
+    router = ModelRouter(routes={})                     # only the implicit DEFAULT_FALLBACKS candidate
+    router.tracker("openai:primary").samples.append(0.01)
+    calls = []
+
+    async def attempt(candidate, provider, kwargs, output_model):
+        calls.append(candidate)
+        await asyncio.sleep(0.2)
+        return candidate
+
+    monkeypatch.setattr(model_router, "_attempt_async", attempt)
+    assert asyncio.run(router.route_async("agent", "openai", {"model": "primary"}, None)) == "openai:primary"
+    assert calls == ["openai:primary"]
+
+    single = ModelRouter(routes={"agent": ["openai:primary"]})   # nothing left to hedge to
+    single.tracker("openai:primary").samples.append(0.01)
+    calls.clear()
+    assert asyncio.run(single.route_async("agent", "openai", {"model": "primary"}, None)) == "openai:primary"
+    assert calls == ["openai:primary"]
+
+
+def test_reply_that_never_validates_fails_over(monkeypatch):
+    from structured_output import StructuredOutputError
+    monkeypatch.setenv("OPENAI_API_KEY", "x")
+    router = ModelRouter(routes={"agent": ["openai:backup"]})
+    calls = []
+
+    def attempt(candidate, provider, kwargs, output_model):
+        calls.append(candidate)
+        if candidate == "openai:primary":
+            raise StructuredOutputError("Output failed validation", "{}")
+        return "{\"ok\": true}"
+
+    monkeypatch.setattr(model_router, "_attempt", attempt)
+    assert router.route("agent", "openai", {"model": "primary"}, None) == "{\"ok\": true}"
+    assert calls == ["openai:primary", "openai:backup"]
+    assert router.tracker("openai:primary").errors == 1
+    assert not router.tracker("openai:primary").samples   # no latency credit for an unusable reply
@@ -0,0 +1,96 @@
+import json
+import asyncio
+
+import httpx
+import pytest
+
+import rate_limiter
+from rate_limiter import RateLimiter, RateLimitedTransport, AsyncRateLimitedTransport
+
+BODY = json.dumps({"model": "m", "max_tokens": 10}).encode()
+
+
+def request() -> httpx.Request:
+    return httpx.Request("POST", "https://api.example.com/v1/chat", content=BODY)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "backoff", lambda attempt, hint=None: 0.0)
+
+
+def upstream(monkeypatch, handler, async_=False):
+    """Replace the real network send under the rate-limited transports."""
+    if async_:
+        async def send(self, req):
+            return await handler(req)
+        monkeypatch.setattr(httpx.AsyncHTTPTransport, "handle_async_request", send)
+    else:
+        monkeypatch.setattr(httpx.HTTPTransport, "handle_request", lambda self, req: handler(req))
+
+
+def test_async_cancel_releases_slot(monkeypatch):
+    async def slow(req):
+        await asyncio.sleep(10)
+
+    upstream(monkeypatch, slow, async_=True)
+    limiter = RateLimiter(limits={})
+    transport = AsyncRateLimitedTransport("openai", limiter=limiter)
+
+    async def main():
+        for _ in range(3):
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(transport.handle_async_request(request()), timeout=0.05)
+
+    asyncio.run(main())
+    assert limiter.lane("openai", "m").in_flight == 0
+
+
+def test_async_error_releases_slot(monkeypatch):
+    async def broken(req):
+        raise ValueError("boom")
+
+    upstream(monkeypatch, broken, async_=True)
+    limiter = RateLimiter(limits={})
+    transport = AsyncRateLimitedTransport("openai", limiter=limiter)
+    with pytest.raises(ValueError):
+        asyncio.run(transport.handle_async_request(request()))
+    assert limiter.lane("openai", "m").in_flight == 0
+
+
+def test_sync_error_releases_slot(monkeypatch):
+    def broken(req):
+        raise ValueError("boom")
+
+    upstream(monkeypatch, broken)
+    limiter = RateLimiter(limits={})
+    with pytest.raises(ValueError):
+        RateLimitedTransport("openai", limiter=limiter).handle_request(request())
+    assert limiter.lane("openai", "m").in_flight == 0
+
+
+def test_retry_then_success_releases_every_slot(monkeypatch):
+    statuses = [500, 429, 200]
+
+    def flaky(req):
+        return httpx.Response(statuses.pop(0), json={"usage": {"total_tokens": 5}})
+
+    upstream(monkeypatch, flaky)
+    limiter = RateLimiter(limits={})
+    response = RateLimitedTransport("openai", limiter=limiter).handle_request(request())
+    lane = limiter.lane("openai", "m")
+    assert response.status_code == 200
+    assert lane.in_flight == 0
+    assert lane.throttled == 1
+
+
+def test_network_errors_exhaust_retries_without_leaking(monkeypatch):
+    def down(req):
+        raise httpx.ConnectError("refused")
+
+    upstream(monkeypatch, down)
+    monkeypatch.setattr(rate_limiter, "MAX_RETRIES", 2)
+    limiter = RateLimiter(limits={})
+    with pytest.raises(httpx.ConnectError):
+        RateLimitedTransport("openai", limiter=limiter).handle_request(request())
+    assert limiter.lane("openai", "m").in_flight == 0
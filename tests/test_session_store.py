@@ -0,0 +1,83 @@
+import sqlite3
+import threading
+
+import pytest
+
+import session_store
+from session_store import SessionStore
+
+
+class FlakyConnection:
+    """A real connection whose first `failures` executemany calls fail as if the database were locked."""
+
+    def __init__(self, path, failures):
+        self.conn, self.failures = sqlite3.connect(path), failures
+
+    def __enter__(self):
+        return self.conn.__enter__()
+
+    def __exit__(self, *exc):
+        return self.conn.__exit__(*exc)
+
+    def executemany(self, sql, rows):
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError("database is locked")
+        return self.conn.executemany(sql, rows)
+
+    def execute(self, sql, params=()):
+        return self.conn.execute(sql, params)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_store, "WRITE_BACKOFF_SECONDS", 0)
+    s = SessionStore(str(tmp_path / "intake.db"))
+    yield s
+    s.close()
+
+
+def batch_for(session_id="s1", message_id="m1"):
+    return [("session", (session_id, None, "collecting", "{}", "t0", "t0")),
+            ("message", (message_id, session_id, "user", "hello", "{}", "t1"))]
+
+
+def messages(store):
+    with sqlite3.connect(store.db_path) as conn:
+        return [r[0] for r in conn.execute("select content from intake_messages order by rowid")]
+
+
+def test_locked_database_is_retried_with_backoff(store):
+    done = threading.Event()
+    conn = FlakyConnection(store.db_path, failures=session_store.WRITE_RETRIES)
+    assert store._write_batch(conn, batch_for() + [("flush", done)]) == (False, [])
+    assert done.is_set()
+    assert messages(store) == ["hello"]
+
+
+def test_writes_still_failing_are_kept_not_dropped(store):
+    done = threading.Event()
+    batch = batch_for() + [("flush", done)]
+    conn = FlakyConnection(store.db_path, failures=session_store.WRITE_RETRIES + 1)
+    stop, kept = store._write_batch(conn, batch)
+    assert (stop, kept) == (False, batch)
+    assert not done.is_set() and messages(store) == []
+    assert store._write_batch(conn, kept) == (False, [])    # the database is back
+    assert done.is_set() and messages(store) == ["hello"]
+
+
+def test_bad_row_only_loses_itself(store):
+    store._write_batch(sqlite3.connect(store.db_path), batch_for())
+    batch = batch_for("s2", "m2") + [("message", ("m1", "s1", "user", "duplicate id", "{}", "t2"))]
+    assert store._write_batch(sqlite3.connect(store.db_path), batch) == (False, [])
+    assert messages(store) == ["hello", "hello"]
+
+
+def test_round_trip_through_the_writer_thread(store):
+    session_id = store.create_session()
+    store.record_message(session_id, "user", "an idea")
+    store.update_schema(session_id, {"idea_summary": "x"}, status="complete")
+    loaded = store.load_session(session_id)
+    assert loaded["session"]["status"] == "complete"
+    assert loaded["session"]["idea_schema"] == {"idea_summary": "x"}
+    assert [m["content"] for m in loaded["messages"]] == ["an idea"]
@@ -0,0 +1,36 @@
+import asyncio
+
+import similarity_index
+from agent_dag import AgentDAG, AgentNode
+from similarity_index import SimilarityIndex
+
+SCHEMA = {"idea_title": "Greetings", "problem": "greeting cards are generic and impersonal"}
+REWORDED = {"idea_title": "Greetings", "problem": "greeting cards are generic and impersonal!"}
+
+
+def make_dag(tmp_path, calls):
+    async def run(inputs, upstream, bypass):
+        calls.append(inputs)
+        return {"market": "big"}
+
+    return AgentDAG([AgentNode("analyst", run, fields=("idea_title", "problem"))],
+                    index=SimilarityIndex(str(tmp_path / "similar")))
+
+
+def test_similar_idea_is_reused_and_stale_agrees(tmp_path):
+    calls = []
+    dag = make_dag(tmp_path, calls)
+    asyncio.run(dag.run_async(SCHEMA))
+    assert dag.stale(REWORDED) == []
+    _, ran = asyncio.run(dag.run_async(REWORDED))
+    assert ran == [] and len(calls) == 1
+
+
+def test_disabled_reuse_makes_stale_and_run_agree(tmp_path, monkeypatch):
+    calls = []
+    dag = make_dag(tmp_path, calls)
+    asyncio.run(dag.run_async(SCHEMA))
+    monkeypatch.setattr(similarity_index, "SIMILAR_IDEAS", False)
+    assert dag.stale(REWORDED) == ["analyst"]
+    _, ran = asyncio.run(dag.run_async(REWORDED))
+    assert ran == ["analyst"] and len(calls) == 2
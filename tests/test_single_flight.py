@@ -0,0 +1,86 @@
+import time
+import asyncio
+import threading
+
+import orchestrator
+from single_flight import SingleFlight
+
+
+def until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_followers_get_every_published_event_including_earlier_ones():
+    flights, joined = SingleFlight(), threading.Event()
+    leader_events, follower_events = [], []
+
+    async def work():
+        flights.publish("k", ("listener", {"idea": "x"}))
+        await asyncio.to_thread(joined.wait, 5)
+        flights.publish("k", ("analyst", {"score": 7}))
+        return {"done": True}
+
+    async def main():
+        leader = asyncio.create_task(flights.do_async("k", work, on_event=leader_events.append))
+        await asyncio.sleep(0.05)
+        follower = asyncio.create_task(flights.do_async("k", work, on_event=follower_events.append))
+        await asyncio.sleep(0.05)
+        joined.set()
+        return await leader, await follower
+
+    (result, shared), (copy, follower_shared) = asyncio.run(main())
+    assert (shared, follower_shared) == (False, True)
+    assert result == copy == {"done": True}
+    assert leader_events == follower_events == [("listener", {"idea": "x"}), ("analyst", {"score": 7})]
+    assert follower_events[0][1] is not leader_events[0][1]   # followers get copies
+
+
+def test_failing_follower_callback_does_not_fail_the_run():
+    flights, joined = SingleFlight(), threading.Event()
+
+    def work():
+        joined.wait(5)
+        flights.publish("k", "event")
+        return 1
+
+    def boom(_):
+        raise RuntimeError("follower callback")
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.do("k", work)))
+    leader.start()
+    until(lambda: flights.stats()["in_flight"])
+    follower = threading.Thread(target=lambda: results.append(flights.do("k", work, on_event=boom)))
+    follower.start()
+    until(lambda: flights.joined)
+    joined.set()
+    leader.join(5), follower.join(5)
+    assert sorted(results) == [(1, False), (1, True)]
+
+
+def test_coalesced_validations_report_partial_results_to_every_job(monkeypatch):
+    gate = asyncio.Event()
+
+    async def fake_validate(raw_idea, agents, timeouts, bypass_cache, on_result=None):
+        on_result("listener", {"idea": raw_idea})
+        await gate.wait()
+        on_result("critic", {"ok": True})
+        return {"listener": {"idea": raw_idea}, "critic": {"ok": True}}, ["critic"]
+
+    monkeypatch.setattr(orchestrator, "_validate_async", fake_validate)
+    first, second = {}, {}
+
+    async def main():
+        a = asyncio.create_task(orchestrator.run_orchestrator_async("An idea", on_result=first.__setitem__))
+        await asyncio.sleep(0.05)
+        b = asyncio.create_task(orchestrator.run_orchestrator_async("an  IDEA", on_result=second.__setitem__))
+        await asyncio.sleep(0.05)
+        gate.set()
+        return await a, await b
+
+    ra, rb = asyncio.run(main())
+    assert ra == rb
+    assert first == second == {"listener": {"idea": "An idea"}, "critic": {"ok": True}}
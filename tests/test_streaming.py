@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+import streaming
+from instrumentation import collect, current_span
+
+
+def chat_event(content=None, usage=None):
+    delta = SimpleNamespace(content=content, tool_calls=None)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta)] if content else [], usage=usage,
+                           model="gpt-4.1-mini")
+
+
+class FakeCompletions:
+    def __init__(self, events):
+        self.events, self.span_at_request = events, "unset"
+
+    def create(self, **kwargs):
+        self.span_at_request = current_span()
+        return iter(self.events)
+
+
+def fake_openai(monkeypatch, events):
+    completions = FakeCompletions(events)
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    monkeypatch.setattr(streaming, "get_openai_client", lambda: client)
+    return completions
+
+
+def test_span_is_not_current_between_yields_and_gets_usage(monkeypatch):
+    usage = SimpleNamespace(prompt_tokens=30, completion_tokens=7, prompt_tokens_details=None)
+    completions = fake_openai(monkeypatch, [chat_event('{"market": '), chat_event('"big"}'), chat_event(usage=usage)])
+    request = {"model": "gpt-4.1-mini", "messages": [{"role": "user", "content": "hi"}]}
+
+    with collect() as run:
+        events = []
+        for event in streaming.stream_openai_chat(request, parse=lambda text: {"text": text}):
+            assert current_span() is None   # the consumer's own work is not timed as the LLM call
+            events.append(event)
+
+    assert events[-1] == ("done", {"text": '{"market": "big"}'})
+    assert ("field", ("market", "big")) in events
+    [s] = run.spans
+    assert completions.span_at_request is s   # the request itself is made inside the span
+    assert (s.input_tokens, s.output_tokens) == (30, 7)
+    assert s.attrs["streamed"] is True and not s.parse_error
+
+
+def test_abandoned_stream_records_span_and_clears_context(monkeypatch):
+    fake_openai(monkeypatch, [chat_event('{"a": 1, '), chat_event('"b": 2}')])
+    with collect() as run:
+        stream = streaming.stream_openai_chat({"model": "gpt-4.1-mini", "messages": []}, parse=dict)
+        next(stream)
+        stream.close()
+    assert current_span() is None
+    assert len(run.spans) == 1
@@ -0,0 +1,62 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import llm_cache
+import analyst_agent
+import structured_output
+from llm_cache import ResponseCache, make_key
+from output_models import AnalystReport
+from structured_output import call_structured, openai_output, StructuredOutputError
+
+VALID = {k: "ok" for k in AnalystReport.model_fields}
+
+
+def reply(text, finish_reason="stop"):
+    message = SimpleNamespace(content=text, tool_calls=None)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason=finish_reason)], usage=None)
+
+
+def scripted(*texts):
+    sent = []
+
+    def create(kwargs):
+        sent.append(kwargs)
+        return reply(texts[len(sent) - 1])
+    return create, sent
+
+
+KWARGS = {"model": "m", "messages": [{"role": "user", "content": "go"}]}
+
+
+def test_invalid_reply_gets_a_targeted_retry(monkeypatch):
+    monkeypatch.setattr(structured_output, "STRUCTURED_RETRIES", 1)
+    create, sent = scripted('{"market": "big"}', json.dumps(VALID))
+    assert json.loads(call_structured(KWARGS, AnalystReport, create, openai_output)) == VALID
+    assert "could not be used" in sent[1]["messages"][-1]["content"]
+
+
+def test_exhausted_retries_raise_instead_of_returning_the_raw_reply(monkeypatch):
+    monkeypatch.setattr(structured_output, "STRUCTURED_RETRIES", 1)
+    create, sent = scripted('{"market": "big"}', '{"market": "bigger"}')
+    with pytest.raises(StructuredOutputError) as info:
+        call_structured(KWARGS, AnalystReport, create, openai_output)
+    assert info.value.raw == '{"market": "bigger"}'
+    assert "validation" in info.value.reason
+    assert len(sent) == 2
+
+
+def test_agent_reports_the_failure_and_caches_nothing(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(llm_cache, "CACHE_DISABLED", False)
+    monkeypatch.setattr(llm_cache, "_cache", cache)
+
+    def route(*args):
+        raise StructuredOutputError("Output failed validation: competition: Field required", '{"market": "big"}')
+
+    monkeypatch.setattr(analyst_agent, "route", route)
+    report = analyst_agent.run_analyst_agent({"idea_title": "Greetings"})
+    assert report["raw"] == '{"market": "big"}' and "error" in report
+    kwargs = analyst_agent._request_kwargs({"idea_title": "Greetings"})
+    assert cache.get(make_key(provider="anthropic", **kwargs)) is None
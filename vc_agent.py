@@ -1,15 +1,16 @@
 import os
 import json
 from typing import Dict, Any
-from anthropic import Anthropic
-from dotenv import load_dotenv
-
-# Load environment variables (expects CLAUDE_API_KEY in .env or OS env)
-load_dotenv()
+import settings  # noqa: F401  (reads .env once per process)
+from llm_cache import cached_call, cached_call_async
+from streaming import stream_claude
+from output_models import VCReport, coerce, validator
+from model_router import route, route_async
+from structured_output import StructuredOutputError
+from prompt_prefix import panel_request
 
 # You can override the model via env VC_MODEL; otherwise use Sonnet 3.5
 CLAUDE_MODEL = os.getenv("VC_MODEL", "claude-3-5-sonnet-20240620")
-client = Anthropic(api_key=os.getenv("CLAUDE_API_KEY"))
 
 SYSTEM = """You are the VC Agent. Think like an early-stage venture capitalist.
 Given a startup's structured IdeaSchema, assess feasibility and fundability.
@@ -28,36 +29,55 @@ Rules:
 - If data is missing, make reasonable assumptions and mark them clearly.
 """
 
-def run_vc_agent(schema_json: Dict[str, Any]) -> Dict[str, Any]:
+def _request_kwargs(schema_json: Dict[str, Any]) -> Dict[str, Any]:
+    # Shares its cached prompt prefix (system prompts + common schema fields) with the other panel agents
+    return panel_request("vc", schema_json, model=CLAUDE_MODEL, max_tokens=1200, temperature=0.5)
+
+def _parse_response(text: str) -> Dict[str, Any]:
+    # Fences, trailing prose and truncated JSON are repaired locally before giving up
+    data, e = coerce(text, VCReport)
+    if data is not None:
+        return data
+    return {"error": f"Failed to parse VC Agent output: {e}", "raw": text}
+
+def run_vc_agent(schema_json: Dict[str, Any], bypass_cache: bool = False) -> Dict[str, Any]:
     """
     Takes the Listener's IdeaSchema dict and returns a VC-style feasibility assessment.
     """
-    user_prompt = f"""
-You are given this IdeaSchema for a startup:
+    kwargs = _request_kwargs(schema_json)
+    # Tool call (or text) is parsed, repaired and validated; one targeted retry only if that fails
+    try:
+        text = cached_call(
+            {"provider": "anthropic", **kwargs},
+            lambda: route("vc", "anthropic", kwargs, VCReport),
+            bypass=bypass_cache, validate=validator(VCReport), name="vc",
+        )
+    except StructuredOutputError as e:
+        text = e.raw   # never validated: reported as an error, not cached
+    return _parse_response(text)
 
-{json.dumps(schema_json, indent=2, ensure_ascii=False)}
+async def run_vc_agent_async(schema_json: Dict[str, Any], bypass_cache: bool = False) -> Dict[str, Any]:
+    """Async variant of run_vc_agent, used by the parallel orchestrator."""
+    kwargs = _request_kwargs(schema_json)
 
-Return ONLY the JSON object with the exact fields described by the system.
-"""
-    resp = client.messages.create(
-        model=CLAUDE_MODEL,
-        max_tokens=1200,
-        temperature=0.5,
-        system=SYSTEM,
-        messages=[{"role": "user", "content": user_prompt}]
-    )
+    async def fetch():
+        # Hedged against / fails over to the agent's other candidate models (model_router)
+        return await route_async("vc", "anthropic", kwargs, VCReport)
 
-    # Claude responses come as a list of content blocks; we expect text in [0].text
-    text = ""
     try:
-        text = resp.content[0].text
-        return json.loads(text)
-    except Exception as e:
-        # Safe fallback with raw response included for debugging
-        return {
-            "error": f"Failed to parse VC Agent output: {e}",
-            "raw": text or str(resp)
-        }
+        text = await cached_call_async({"provider": "anthropic", **kwargs}, fetch, bypass=bypass_cache,
+                                      validate=validator(VCReport), name="vc")
+    except StructuredOutputError as e:
+        text = e.raw
+    return _parse_response(text)
+
+def stream_vc_agent(schema_json: Dict[str, Any], bypass_cache: bool = False):
+    """
+    Streaming variant: yields ("token", text) as Claude writes, ("field", (key, value))
+    as each top-level field completes, then ("done", <same dict as run_vc_agent>).
+    """
+    yield from stream_claude(_request_kwargs(schema_json), _parse_response, bypass_cache, name="vc",
+                             validate=validator(VCReport))
 
 if __name__ == "__main__":
     # Quick test with your Greetings Generator idea
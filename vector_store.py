@@ -0,0 +1,237 @@
+import os
+import re
+import json
+import math
+import hashlib
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+import settings  # noqa: F401  (reads .env once per process)
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+    import msvcrt
+
+# Width of the local hashing embeddings (a store keeps the width it was created with)
+HASH_DIM = int(os.getenv("HASH_EMBED_DIM", "1024"))
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can for from has have in into is it its of on or so that the their them they "
+    "this to was we which who will with you your our us i".split())
+
+
+def _tokens(text: str) -> List[str]:
+    words = []
+    for w in _TOKEN.findall((text or "").casefold()):
+        if w in _STOPWORDS:
+            continue
+        if len(w) > 3 and w.endswith("s") and not w.endswith("ss"):
+            w = w[:-1]   # crude plural folding: "greetings" ~ "greeting"
+        words.append(w)
+    return words
+
+
+def hash_embed(text: str, dim: int = HASH_DIM) -> np.ndarray:
+    """
+    Local, deterministic text vector: signed feature hashing of words and word bigrams with
+    sublinear term frequency, L2-normalised (so a dot product is the cosine similarity).
+    """
+    words = _tokens(text)
+    vec = np.zeros(dim, dtype=np.float32)
+    for feature, count in Counter(words + [f"{a} {b}" for a, b in zip(words, words[1:])]).items():
+        h = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+        vec[h % dim] += (1.0 if h >> 63 else -1.0) * (1.0 + math.log(count))
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else vec
+
+
+@dataclass
+class Hit:
+    id: str
+    score: float
+    meta: Dict[str, Any]
+
+
+class VectorStore:
+    """
+    Append-only float32 matrix on disk (vectors.f32, memory-mapped for search) plus a JSONL
+    log of row metadata. add() appends; re-adding an id supersedes its old row and remove()
+    tombstones one, so nothing is rewritten until compact(). Several processes can share a
+    directory: writers take a file lock and readers pick up new rows on their next search.
+    """
+
+    def __init__(self, path: str, dim: int = HASH_DIM):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._log_path = os.path.join(path, "rows.jsonl")
+        header = os.path.join(path, "index.json")
+        if os.path.exists(header):
+            with open(header, encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+            if self.dim != dim:
+                raise ValueError(f"{path} holds {self.dim}-dim vectors, not {dim}")
+        else:
+            self.dim = dim
+            with open(header, "w", encoding="utf-8") as f:
+                json.dump({"dim": dim}, f)
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._log_offset = 0
+        self._rows: Dict[str, int] = {}          # id -> live row
+        self._meta: Dict[int, Dict[str, Any]] = {}
+        self._ids: Dict[int, str] = {}
+        self._matrix: Optional[np.memmap] = None
+        self._alive = np.zeros(0, dtype=bool)
+        self._generation = self._read_generation()
+
+    def _read_generation(self) -> int:
+        return os.stat(self._log_path).st_ino if os.path.exists(self._log_path) else 0
+
+    # ---- reading ----
+    def _refresh(self) -> None:
+        """Apply log lines written since the last look (by this or another process)."""
+        if self._read_generation() != self._generation:
+            self._reset()   # compacted elsewhere: start over
+        if not os.path.exists(self._log_path):
+            return
+        with open(self._log_path, "rb") as f:
+            f.seek(self._log_offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1   # ignore a half-written last line
+        if not end:
+            return
+        self._log_offset += end
+        for line in data[:end].splitlines():
+            entry = json.loads(line)
+            old = self._rows.pop(entry["id"], None)
+            if old is not None:
+                self._meta.pop(old, None)
+                self._ids.pop(old, None)
+            if "row" in entry:
+                self._rows[entry["id"]] = entry["row"]
+                self._meta[entry["row"]] = entry.get("meta") or {}
+                self._ids[entry["row"]] = entry["id"]
+        rows = os.path.getsize(self._vectors_path) // (4 * self.dim) if os.path.exists(self._vectors_path) else 0
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim)) if rows else None
+        self._alive = np.zeros(rows, dtype=bool)
+        live = [r for r in self._meta if r < rows]
+        self._alive[live] = True
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._rows)
+
+    def get(self, id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            row = self._rows.get(id)
+            return None if row is None else self._meta[row]
+
+    def vector(self, id: str) -> Optional[np.ndarray]:
+        """A copy of the stored vector for id (lets callers reuse an embedding instead of recomputing it)."""
+        with self._lock:
+            self._refresh()
+            row = self._rows.get(id)
+            if row is None or self._matrix is None or row >= len(self._matrix):
+                return None
+            return np.array(self._matrix[row])
+
+    def ids(self) -> List[str]:
+        with self._lock:
+            self._refresh()
+            return list(self._rows)
+
+    def search(self, query: np.ndarray, k: int = 5, where: Callable[[Dict[str, Any]], bool] = None) -> List[Hit]:
+        """Top-k live rows by dot product (cosine for normalised vectors), optionally filtered on metadata."""
+        with self._lock:
+            self._refresh()
+            if self._matrix is None or not self._alive.any():
+                return []
+            scores = np.asarray(self._matrix @ np.asarray(query, dtype=np.float32))
+            scores[~self._alive] = -np.inf
+            if where is not None:
+                for row in np.flatnonzero(self._alive):
+                    if not where(self._meta[row]):
+                        scores[row] = -np.inf
+            k = min(k, int(np.isfinite(scores).sum()))
+            if k <= 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [Hit(self._ids[r], float(scores[r]), self._meta[r]) for r in top]
+
+    # ---- writing ----
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        with open(os.path.join(self.path, ".lock"), "a+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def add(self, ids: Sequence[str], vectors: np.ndarray, metas: Sequence[Dict[str, Any]] = None) -> None:
+        """Append rows (one batch, one write); an id already present is replaced."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        metas = metas or [{}] * len(ids)
+        if not (len(ids) == len(vectors) == len(metas)):
+            raise ValueError("ids, vectors and metas must have the same length")
+        with self._lock, self._file_lock():
+            self._refresh()
+            first = os.path.getsize(self._vectors_path) // (4 * self.dim) if os.path.exists(self._vectors_path) else 0
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(first * 4 * self.dim)   # drop a torn row from a crashed writer
+                f.write(vectors.tobytes())
+            self._append_log({"id": id, "row": first + i, "meta": meta} for i, (id, meta) in enumerate(zip(ids, metas)))
+
+    def remove(self, ids: Sequence[str]) -> None:
+        with self._lock, self._file_lock():
+            self._refresh()
+            self._append_log({"id": id} for id in ids if id in self._rows)
+
+    def _append_log(self, entries) -> None:
+        lines = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries)
+        if lines:
+            with open(self._log_path, "a", encoding="utf-8") as f:
+                f.write(lines)
+        self._refresh()
+
+    def compact(self) -> int:
+        """Rewrite the files with live rows only; returns the number of rows dropped."""
+        with self._lock, self._file_lock():
+            self._refresh()
+            total = 0 if self._matrix is None else len(self._matrix)
+            live = sorted(self._meta)
+            vectors = np.array(self._matrix[live]) if live else np.zeros((0, self.dim), np.float32)
+            with open(self._vectors_path + ".tmp", "wb") as f:
+                f.write(vectors.tobytes())
+            with open(self._log_path + ".tmp", "w", encoding="utf-8") as f:
+                for new_row, row in enumerate(live):
+                    f.write(json.dumps({"id": self._ids[row], "row": new_row, "meta": self._meta[row]},
+                                       ensure_ascii=False) + "\n")
+            self._matrix = None
+            os.replace(self._vectors_path + ".tmp", self._vectors_path)
+            os.replace(self._log_path + ".tmp", self._log_path)
+            self._reset()
+            self._refresh()
+            return total - len(live)